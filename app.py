@@ -1,80 +1,224 @@
+import uuid
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+from backends import available_backends
+from charts import SCATTER_MODES, cluster_scatter, figure_payload_bytes
+from dataset_store import get_dataset_store
+from model_store import ModelStore
+from partitioned import segment_partitions
+from precompute import BackgroundPrecompute
+from profiling import PROCESS_WIDE_METRICS, StageProfiler, profile_stages, stage
+from rfm_index import RFMIndex
+from rolling_rfm import assign_snapshot_segments, compute_rolling_rfm, transition_matrix
+from sales_cube import SalesCube
+from scoring import SegmentScorer
+from segments import action_thresholds, build_cluster_info, compute_cluster_means
+from stability import cluster_stability
+from table_view import PagedTable, render_paged_table
 from utils import (
-    run_rfm_kmeans_pipeline,
-    clean_retail_data,
-    compute_rfm,
-    scale_rfm,
-    train_kmeans,
+    DEFAULT_K_RANGE,
+    clean_retail_data_cached,
+    compute_rfm_cached,
+    kmeans_sweep_cached,
+    sweep_summary,
 )
 
 st.set_page_config(page_title="RFM Clustering Demo", layout="wide")
 
+# Range of K offered by the AI tab slider; every K in it is fitted once and cached
+K_RANGE = DEFAULT_K_RANGE
+
+
+@st.cache_resource
+def get_model_store() -> ModelStore:
+    # Fitted scaler + K-Means survive page reloads and server restarts
+    return ModelStore(".model_store")
+
+
+@st.cache_resource
+def get_precompute() -> BackgroundPrecompute:
+    # One small thread pool per server process, shared by every session
+    return BackgroundPrecompute(max_workers=2)
+
+
+# Time granularity options of the revenue chart (see sales_cube.GRANULARITIES)
+GRANULARITY_LABELS = {"day": "ngày", "week": "tuần", "month": "tháng"}
+
+# Opt-in profiler mode: per-stage tracemalloc peaks and cProfile reports (slower)
+profile_mode = st.sidebar.checkbox("Chế độ profiler (bộ nhớ + cProfile, chậm hơn)", key="profile_mode")
+# Engine for clean + RFM when reading from a path (Polars / DuckDB are multi-threaded, if installed)
+rfm_backend = st.sidebar.selectbox("Engine làm sạch + RFM", available_backends(), key="rfm_backend")
+
+# Datasets are shared by every session of this server (one copy per distinct content)
+_store_stats = get_dataset_store().stats()
+st.sidebar.caption(
+    f"Dữ liệu dùng chung: {len(_store_stats)} bộ · ~{_store_stats['MB'].sum():,.0f} MB · "
+    f"{int(_store_stats['Refs'].sum())} lượt dùng"
+)
+# Identifies this browser session's references in the dataset store
+session_key = st.session_state.setdefault("session_key", uuid.uuid4().hex)
+
+
+def render_performance_panel(profiler: StageProfiler) -> None:
+    # Collapsible per-stage timings of this tab's run (data stages, charts, tables)
+    with st.expander(f"⏱️ Performance ({profiler.total_seconds():.2f}s)"):
+        process_wide = "Cả tiến trình: gồm cả việc của các phiên khác đang chạy cùng lúc"
+        st.dataframe(
+            profiler.to_frame(),
+            use_container_width=True,
+            hide_index=True,
+            column_config={col: st.column_config.NumberColumn(help=process_wide) for col in PROCESS_WIDE_METRICS},
+        )
+        st.caption("cpu_seconds, peak_mb, peak_rss_mb đo cả tiến trình (không tách theo phiên).")
+        for record in profiler.records:
+            if "profile" in record:
+                st.markdown(f"**cProfile: {record['stage']}**")
+                st.code(record["profile"])
+
 
-traditional_tab, ai_tab = st.tabs(["Phân tích Truyền thống", "Phân tích AI"])
+# =========================
+# Data steps shared by the tabs and the background precompute
+# (results live in the shared dataset store, keyed by the dataset content hash)
+# =========================
 
-def _name_and_actions_for_cluster(r: float, f: float, m: float, r_med: float, f_med: float, m_med: float):
+# Column names of the traditional tab's RFM table
+RFM_TABLE_COLUMNS = {'Recency': 'R_Recency', 'Frequency': 'F_Frequency', 'Monetary': 'M_Monetary'}
+
+
+def load_clean(source, fingerprint: str):
+    # Read-only view of the dataset's single cleaned copy; must not be modified in place
+    return clean_retail_data_cached(source, cache=get_dataset_store(), fingerprint=fingerprint, columnar_cache=True)
+
+
+def load_sales_cube(source, fingerprint: str) -> SalesCube:
+    # Revenue / quantity pre-aggregated once per dataset (by day, product, country)
+    df_clean = load_clean(source, fingerprint)
+    return get_dataset_store().get_or_compute(
+        ("sales_cube", fingerprint), lambda: SalesCube.from_transactions(df_clean)
+    )
+
+
+def load_rfm(source, fingerprint: str, backend: str):
+    return compute_rfm_cached(
+        source, cache=get_dataset_store(), fingerprint=fingerprint, columnar_cache=True, backend=backend
+    )
+
+
+def load_rfm_table(source, fingerprint: str, backend: str) -> PagedTable:
+    # Sorted once per dataset; each rerun only sends the visible page
+    rfm, _ = load_rfm(source, fingerprint, backend)
+    return get_dataset_store().get_or_compute(
+        ("paged_rfm", fingerprint), lambda: PagedTable(rfm.rename(columns=RFM_TABLE_COLUMNS))
+    )
+
+
+def load_rfm_index(source, fingerprint: str, backend: str) -> RFMIndex:
+    # Sorted R/F/M arrays + Customer ID hash index, built once per dataset
+    rfm, _ = load_rfm(source, fingerprint, backend)
+    return get_dataset_store().get_or_compute(("rfm_index", fingerprint), lambda: RFMIndex(rfm))
+
+
+def load_kmeans_sweep(source, fingerprint: str, backend: str, model_store: ModelStore) -> dict:
+    # K-Means is fitted once for every K in the slider range (in parallel) and cached
+    return kmeans_sweep_cached(
+        source, k_values=K_RANGE, model_store=model_store, cache=get_dataset_store(),
+        fingerprint=fingerprint, columnar_cache=True, backend=backend,
+    )
+
+
+def load_rolling_rfm(source, fingerprint: str):
+    # R/F/M at every month start, one pass over the transactions
+    df_clean = load_clean(source, fingerprint)
+    return get_dataset_store().get_or_compute(("rolling_rfm", fingerprint), lambda: compute_rolling_rfm(df_clean))
+
+
+def traditional_steps(source, fingerprint: str, backend: str) -> list:
+    return [
+        ("làm sạch dữ liệu", lambda: load_clean(source, fingerprint)),
+        ("tổng hợp doanh thu", lambda: load_sales_cube(source, fingerprint)),
+        ("tính RFM", lambda: load_rfm(source, fingerprint, backend)),
+        ("chỉ mục RFM", lambda: load_rfm_index(source, fingerprint, backend)),
+        ("sắp xếp bảng RFM", lambda: load_rfm_table(source, fingerprint, backend)),
+    ]
+
+
+def ai_steps(source, fingerprint: str, backend: str, model_store: ModelStore) -> list:
+    return [
+        ("tính RFM", lambda: load_rfm(source, fingerprint, backend)),
+        ("K-Means cho mọi K", lambda: load_kmeans_sweep(source, fingerprint, backend, model_store)),
+        ("RFM theo tháng", lambda: load_rolling_rfm(source, fingerprint)),
+    ]
+
+
+def resolve_source(uploaded_file, csv_path):
     """
-    Gán tên cụm + đề xuất hành động dựa trên trung vị toàn cục (median).
-    Quy ước:
-      - R thấp = mua gần đây (tốt), R cao = đã lâu không mua (xấu)
-      - F cao = mua thường xuyên
-      - M cao = chi tiêu nhiều
+    Nguồn dữ liệu của tab: file tải lên hoặc đường dẫn của chính tab; nếu tab chưa có
+    thì dùng lại dữ liệu đã tải gần nhất ở tab kia. Trả về (nguồn hoặc None, có dùng lại không).
     """
-    r_is_low = r <= r_med
-    f_is_high = f >= f_med
-    m_is_high = m >= m_med
-
-    if r_is_low and f_is_high and m_is_high:
-        return (
-            "Khách hàng VIP",
-            [
-                "Duy trì ưu đãi độc quyền và chăm sóc cá nhân hoá.",
-                "Chương trình tích điểm/tier cao, early-access sản phẩm mới.",
-            ],
-        )
-    if (not r_is_low) and (not f_is_high) and (not m_is_high):
-        return (
-            "Khách hàng Sắp mất",
-            [
-                "Kích hoạt lại bằng voucher mạnh/ưu đãi quay lại.",
-                "Gửi email/SMS nhắc nhớ + ưu đãi thời hạn ngắn.",
-            ],
-        )
-    if (not r_is_low) and (f_is_high or m_is_high):
-        return (
-            "Ngủ đông giá trị",
-            [
-                "Chiến dịch win-back nhắm đến nhóm có giá trị từng cao.",
-                "Ưu đãi cá nhân hoá theo lịch sử sản phẩm đã mua.",
-            ],
-        )
-    if r_is_low and (f_is_high or m_is_high):
-        return (
-            "Khách hàng Tiềm năng/Vừa quay lại",
-            [
-                "Upsell/cross-sell theo danh mục liên quan.",
-                "Tăng tần suất bằng combo/bundle hoặc free shipping.",
-            ],
-        )
-    if r_is_low and (not f_is_high) and (not m_is_high):
-        return (
-            "Khách hàng Mới",
-            [
-                "Onboarding: hướng dẫn, đề xuất danh mục, ưu đãi mua tiếp.",
-                "Khuyến khích lần mua 2 bằng mã giảm nhẹ.",
-            ],
+    if uploaded_file is not None or csv_path:
+        source = uploaded_file if uploaded_file is not None else csv_path
+        st.session_state["shared_source"] = source
+        return source, False
+    return st.session_state.get("shared_source"), True
+
+
+def dataset_fingerprint(source) -> str:
+    """
+    Hash nội dung của nguồn (xem `DatasetStore.fingerprint`). File tải lên chỉ được hash một lần,
+    nhớ trong session theo (file_id, kích thước), thay vì hash lại toàn bộ byte mỗi lần rerun.
+    """
+    file_id = getattr(source, "file_id", None)
+    if file_id is None:
+        return get_dataset_store().fingerprint(source)
+    digests = st.session_state.setdefault("upload_digests", {})
+    key = (file_id, source.size)
+    if key not in digests:
+        digests[key] = get_dataset_store().fingerprint(source)
+        # Only the latest uploads of the two tabs are still in use
+        while len(digests) > 4:
+            digests.pop(next(iter(digests)))
+    return digests[key]
+
+
+def start_precompute(tab: str, source, fingerprint: str):
+    """
+    Gửi các bước nặng của cả hai tab cho thread nền (tab đang mở trước) và trả về job của
+    tab đang mở. Bước nào đã có trong cache thì job chỉ tra cứu.
+    """
+    precompute = get_precompute()
+    jobs = {
+        "traditional": (("traditional", fingerprint, rfm_backend), traditional_steps(source, fingerprint, rfm_backend)),
+        "ai": (("ai", fingerprint, rfm_backend), ai_steps(source, fingerprint, rfm_backend, get_model_store())),
+    }
+    own = precompute.submit(*jobs.pop(tab))
+    others = [precompute.submit(key, steps) for key, steps in jobs.values()]
+    # The dataset must not be evicted while its jobs are still writing results into the store
+    for job in (own, *others):
+        get_dataset_store().hold_until(fingerprint, job.future)
+    return own
+
+
+def wait_for_precompute(job) -> None:
+    # Progress bar while this tab's data steps finish in the background
+    if job.done:
+        return
+    progress = st.progress(0.0)
+    while not job.wait(timeout=0.2):
+        progress.progress(
+            job.completed / max(job.total, 1),
+            text=f"Đang chuẩn bị dữ liệu: {job.current or '...'} ({job.completed}/{job.total})",
         )
-    return (
-        "Nhóm Cần kích hoạt",
-        [
-            "A/B test thông điệp và ưu đãi khác nhau.",
-            "Remarketing đa kênh (email/Zalo/advertising).",
-        ],
-    )
+    progress.empty()
 
-with traditional_tab:
+
+# Only the selected tab runs on a rerun (switching tabs reruns the app);
+# the other tab's data is computed in the background meanwhile
+traditional_tab, ai_tab = st.tabs(["Phân tích Truyền thống", "Phân tích AI"], key="active_tab", on_change="rerun")
+
+def render_traditional_tab() -> None:
     st.header("Phân tích truyền thống")
     st.caption("Tải dữ liệu")
     # file uploader and path input for the traditional tab (unique keys)
@@ -85,68 +229,82 @@ with traditional_tab:
         "Hoặc nhập đường dẫn tới CSV trên máy",
         value="",
         placeholder="VD: D:\\data\\online_retail_II.csv",
-        key="csv_path_tradition",
+        key="csv_path_tradition", persist_state="session",
     )
 
-    if uploaded_file_tradition is None and not csv_path_tradition:
+    source_tradition, shared = resolve_source(uploaded_file_tradition, csv_path_tradition)
+    if source_tradition is None:
         st.warning("Vui lòng tải CSV hoặc nhập đường dẫn để bắt đầu phân tích.")
+        return
+    if shared:
+        st.caption("Đang dùng dữ liệu đã tải ở tab Phân tích AI.")
     try:
-        if uploaded_file_tradition is not None:
-            df_raw = pd.read_csv(uploaded_file_tradition)
-        else:
-            df_raw = pd.read_csv(csv_path_tradition)
-
-
-        # Clean the raw data to remove returns / negative quantities before aggregations
-        df_clean = clean_retail_data(df_raw)
+        fingerprint_tradition = dataset_fingerprint(source_tradition)
+        get_dataset_store().acquire(fingerprint_tradition, owner=(session_key, "traditional"))
+        wait_for_precompute(start_precompute("traditional", source_tradition, fingerprint_tradition))
+
+        # Clean the raw data to remove returns / negative quantities before aggregations.
+        # One copy per dataset content, shared with the AI tab, other sessions and reruns.
+        df_clean = load_clean(source_tradition, fingerprint_tradition)
+
+        # Changing granularity, country or N below never touches the transactions again
+        with stage("agg: sales cube", rows_in=len(df_clean)):
+            cube = load_sales_cube(source_tradition, fingerprint_tradition)
+        countries = cube.by_country()["Country"].tolist()
+        country = st.selectbox(
+            "Quốc gia", [None] + countries, format_func=lambda c: "Tất cả" if c is None else c,
+            key="sales_country", persist_state="session",
+        )
 
         st.subheader("Doanh thu")
-        df_clean['InvoiceDate'] = pd.to_datetime(df_clean['InvoiceDate'])
-        # snapshot_date used to compute recency (use one day after last invoice in data)
-        snapshot_date = df_clean['InvoiceDate'].max() + pd.Timedelta(days=1)
-        df_clean['Month'] = df_clean['InvoiceDate'].dt.strftime('%Y-%m')
-        # TotalPrice already created in clean_retail_data; use cleaned frame for revenue
-        revenue_per_month = (
-            df_clean.groupby('Month')['TotalPrice'].sum().reset_index()
+        granularity = st.radio(
+            "Theo",
+            list(GRANULARITY_LABELS),
+            index=2,
+            format_func=GRANULARITY_LABELS.get,
+            horizontal=True,
+            key="revenue_granularity", persist_state="session",
         )
-        fig_revenue = px.line(
-            revenue_per_month,
-            x='Month',
-            y='TotalPrice',
-            title='Doanh thu theo tháng (không tính đơn trả/hủy)',
-            labels={'TotalPrice': 'Doanh thu', 'Month': 'Tháng'},
-            template='plotly_white',
-        )
-        fig_revenue.update_traces(line_color='#1f77b4')
-        st.plotly_chart(fig_revenue, use_container_width=True)
+        revenue_over_time = cube.revenue_over_time(granularity, country=country)
+        with stage("chart: doanh thu theo thời gian"):
+            fig_revenue = px.line(
+                revenue_over_time,
+                x='PeriodStart',
+                y='TotalPrice',
+                title=f'Doanh thu theo {GRANULARITY_LABELS[granularity]} (không tính đơn trả/hủy)',
+                labels={'TotalPrice': 'Doanh thu', 'PeriodStart': GRANULARITY_LABELS[granularity].capitalize()},
+                template='plotly_white',
+            )
+            fig_revenue.update_traces(line_color='#1f77b4')
+        with stage("render: doanh thu theo thời gian"):
+            st.plotly_chart(fig_revenue, use_container_width=True)
 
         st.subheader("Sản phẩm bán chạy")
-        top_products = (
-            df_clean.groupby('Description')['Quantity'].sum().reset_index()
-            .sort_values(by='Quantity', ascending=False)
-            .head(5)
-        )
-        fig_top_products = px.bar(
-            top_products,
-            x='Description',
-            y='Quantity',
-            title='Top 5 sản phẩm bán chạy (không tính đơn trả/hủy)',
-            labels={'Description': 'Sản phẩm', 'Quantity': 'Số lượng bán'},
-            template='plotly_white',
-            color='Description',
-            color_discrete_sequence=px.colors.qualitative.Set2,
+        top_n = st.number_input(
+            "Số sản phẩm (N)", min_value=1, max_value=50, value=5, step=1,
+            key="top_n_products", persist_state="session",
         )
-        fig_top_products.update_layout(showlegend=False)
-        st.plotly_chart(fig_top_products, use_container_width=True)
+        top_products = cube.top_products(int(top_n), by='Quantity', country=country)
+        with stage("chart: top sản phẩm"):
+            fig_top_products = px.bar(
+                top_products,
+                x='Description',
+                y='Quantity',
+                title=f'Top {int(top_n)} sản phẩm bán chạy (không tính đơn trả/hủy)',
+                labels={'Description': 'Sản phẩm', 'Quantity': 'Số lượng bán'},
+                template='plotly_white',
+                color='Description',
+                color_discrete_sequence=px.colors.qualitative.Set2,
+            )
+            fig_top_products.update_layout(showlegend=False)
+        with stage("render: top sản phẩm"):
+            st.plotly_chart(fig_top_products, use_container_width=True)
 
         st.subheader("Khách hàng")
 
-        # Nhóm theo Customer ID và tính R, F, M (dùng dữ liệu đã làm sạch để loại đơn trả)
-        rfm_df = df_clean.groupby('Customer ID').agg(
-            R_Recency=('InvoiceDate', lambda x: (snapshot_date - x.max()).days),
-            F_Frequency=('Invoice', 'nunique'),
-            M_Monetary=('TotalPrice', 'sum')
-        ).reset_index() # Chuyển customer_id từ index thành cột
+        # R, F, M theo Customer ID (dùng chung kết quả đã cache với tab AI)
+        rfm_cached, snapshot_date = load_rfm(source_tradition, fingerprint_tradition, rfm_backend)
+        rfm_df = rfm_cached.rename(columns=RFM_TABLE_COLUMNS)
         
         # Filter controls for RFM
         col1, col2 = st.columns(2)
@@ -155,36 +313,58 @@ with traditional_tab:
                 "Monetary ≥ (Tối thiểu)",
                 value=0.0,
                 step=10.0,
-                key="min_monetary_filter"
+                key="min_monetary_filter", persist_state="session"
             )
         with col2:
             max_recency = st.number_input(
                 "Recency ≤ (Tối đa ngày)",
                 value=999,
                 step=10,
-                key="max_recency_filter"
+                key="max_recency_filter", persist_state="session"
             )
+        monetary_band = st.radio(
+            "Dải Monetary (phân vị 0.33 / 0.66)",
+            [None, "low", "mid", "high"],
+            format_func=lambda b: {None: "Tất cả", "low": "Thấp", "mid": "Giữa", "high": "Cao"}[b],
+            horizontal=True,
+            key="monetary_band_filter", persist_state="session",
+        )
             
         run_filter = st.button("Lọc", key="run_rfm_filter")
-        
-        # Apply filters only when button is clicked
+
+        # Remember the applied filter so paging/sorting keeps it after the click rerun
         if run_filter:
-            filtered_rfm = rfm_df[
-                (rfm_df['M_Monetary'] >= min_monetary) & 
-                (rfm_df['R_Recency'] <= max_recency)
-            ]
-            
-            st.caption(f"Hiển thị {len(filtered_rfm)} / {len(rfm_df)} khách hàng")
-            st.dataframe(filtered_rfm, use_container_width=True)
-        else:
-            st.caption(f"Nhấn nút 'Lọc' để tìm kiếm khách hàng")
-            st.dataframe(rfm_df, use_container_width=True)
+            st.session_state["rfm_filter_applied"] = (fingerprint_tradition, min_monetary, max_recency, monetary_band)
+        applied = st.session_state.get("rfm_filter_applied")
+        if applied is not None and applied[0] != fingerprint_tradition:
+            applied = None
+
+        # Each filter click is a few binary searches on the index instead of a scan over rfm_df
+        with stage("index: chỉ mục RFM", rows_in=len(rfm_cached)):
+            rfm_index = load_rfm_index(source_tradition, fingerprint_tradition, rfm_backend)
+
+        with stage("table: sắp xếp bảng RFM", rows_in=len(rfm_df)):
+            rfm_table = load_rfm_table(source_tradition, fingerprint_tradition, rfm_backend)
+        with stage("render: bảng RFM", rows_in=len(rfm_df)):
+            if applied is not None:
+                _, applied_min_monetary, applied_max_recency, applied_band = applied
+                filter_mask = rfm_index.mask(rfm_index.query(
+                    Monetary=(applied_min_monetary, None),
+                    Recency=(None, applied_max_recency),
+                ))
+                if applied_band is not None:
+                    filter_mask &= rfm_index.mask(rfm_index.band("Monetary", applied_band))
+                st.caption(f"Hiển thị {int(filter_mask.sum())} / {len(rfm_df)} khách hàng")
+                render_paged_table(rfm_table, key="rfm_table", row_mask=filter_mask)
+            else:
+                st.caption(f"Nhấn nút 'Lọc' để tìm kiếm khách hàng")
+                render_paged_table(rfm_table, key="rfm_table")
 
     except Exception as e:
         st.error(f"Lỗi khi tải dữ liệu: {e}")
 
 
-with ai_tab:
+def render_ai_tab() -> None:
     st.header("Phân tích AI: Phân cụm khách hàng theo RFM")
     st.caption("Tải dữ liệu, chọn số cụm K, xem phân tán theo cụm, bảng trung bình R-F-M và diễn giải.")
 
@@ -198,75 +378,101 @@ with ai_tab:
             "Hoặc nhập đường dẫn tới CSV trên máy",
             value="",
             placeholder="VD: D:\\data\\online_retail_II.csv",
-            key="csv_path_ai",
+            key="csv_path_ai", persist_state="session",
         )
     with col_right:
-        k = st.slider("Chọn số cụm (K)", min_value=2, max_value=6, value=4, step=1)
+        k = st.slider(
+            "Chọn số cụm (K)", min_value=K_RANGE.start, max_value=K_RANGE.stop - 1, value=4, step=1,
+            key="k_slider", persist_state="session",
+        )
 
-    if uploaded_file_ai is None and not csv_path_ai:
+    source_ai, shared = resolve_source(uploaded_file_ai, csv_path_ai)
+    if source_ai is None:
         st.warning("Vui lòng tải CSV hoặc nhập đường dẫn để bắt đầu phân tích.")
-        st.stop()
+        return
+    if shared:
+        st.caption("Đang dùng dữ liệu đã tải ở tab Phân tích Truyền thống.")
 
     try:
-        if uploaded_file_ai is not None:
-            df_raw = pd.read_csv(uploaded_file_ai)
-            df_clean = clean_retail_data(df_raw)
-            rfm, snapshot_date = compute_rfm(df_clean)
-            X_scaled, scaler = scale_rfm(rfm)
-            kmeans_model = train_kmeans(X_scaled, n_clusters=k)
-            rfm = rfm.copy()
-            rfm["Cluster"] = kmeans_model.labels_
-        else:
-            result = run_rfm_kmeans_pipeline(csv_path_ai, n_clusters=k)
-            rfm = result["rfm"]
+        fingerprint_ai = dataset_fingerprint(source_ai)
+        get_dataset_store().acquire(fingerprint_ai, owner=(session_key, "ai"))
+        wait_for_precompute(start_precompute("ai", source_ai, fingerprint_ai))
+        # load → clean → RFM and the K sweep are cached, so moving the slider is a lookup
+        rfm, snapshot_date = load_rfm(source_ai, fingerprint_ai, rfm_backend)
+        sweep_result = load_kmeans_sweep(source_ai, fingerprint_ai, rfm_backend, get_model_store())
+        sweep = sweep_result["sweep"]
+        rfm = rfm.copy()
+        rfm["Cluster"] = sweep[k]["labels"]
+
+        st.subheader("Chọn K theo dữ liệu (Elbow & Silhouette)")
+        sweep_df = sweep_summary(sweep)
+        col_elbow, col_sil = st.columns(2)
+        with col_elbow:
+            with stage("chart: elbow"):
+                fig_elbow = px.line(
+                    sweep_df,
+                    x="K",
+                    y="Inertia",
+                    markers=True,
+                    title="Elbow: Inertia theo K (↓ tốt, tìm điểm gãy)",
+                    template='plotly_white',
+                )
+            with stage("render: elbow"):
+                st.plotly_chart(fig_elbow, use_container_width=True)
+        with col_sil:
+            with stage("chart: silhouette"):
+                fig_sil = px.line(
+                    sweep_df,
+                    x="K",
+                    y="Silhouette",
+                    markers=True,
+                    title="Silhouette theo K (↑ tốt)",
+                    template='plotly_white',
+                )
+            with stage("render: silhouette"):
+                st.plotly_chart(fig_sil, use_container_width=True)
 
         st.subheader("Biểu đồ phân tán theo cụm")
-        # Three scatter plots: R-F, R-M, F-M
+        scatter_mode = st.selectbox(
+            "Chế độ vẽ",
+            SCATTER_MODES,
+            index=0,
+            format_func=lambda m: {
+                "auto": "Tự động theo số khách hàng",
+                "svg": "Tất cả điểm (SVG)",
+                "webgl": "Tất cả điểm (WebGL)",
+                "sample": "Mẫu theo cụm, giữ ngoại lai (WebGL)",
+                "density": "Mật độ theo lưới",
+            }[m],
+            key="scatter_mode", persist_state="session",
+        )
+        # Three scatter plots: R-F, R-M, F-M. Payload is bounded for large customer
+        # counts (WebGL, then cluster-stratified sampling or binned density).
         col_a, col_b = st.columns(2)
         with col_a:
-            fig_rf = px.scatter(
-                rfm,
-                x="Recency",
-                y="Frequency",
-                color="Cluster",
-                color_discrete_sequence=px.colors.qualitative.Set2,
-                hover_data=["Customer ID", "Recency", "Frequency", "Monetary"],
-                title="Recency vs Frequency",
-                template='plotly_white',
-            )
-            st.plotly_chart(fig_rf, use_container_width=True)
+            with stage("chart: scatter R-F", rows_in=len(rfm)):
+                fig_rf, used_mode = cluster_scatter(rfm, "Recency", "Frequency", "Recency vs Frequency", mode=scatter_mode)
+            with stage("render: scatter R-F"):
+                st.plotly_chart(fig_rf, use_container_width=True)
         with col_b:
-            fig_rm = px.scatter(
-                rfm,
-                x="Recency",
-                y="Monetary",
-                color="Cluster",
-                color_discrete_sequence=px.colors.qualitative.Set2,
-                hover_data=["Customer ID", "Recency", "Frequency", "Monetary"],
-                title="Recency vs Monetary",
-                template='plotly_white',
-            )
-            st.plotly_chart(fig_rm, use_container_width=True)
-
-        fig_fm = px.scatter(
-            rfm,
-            x="Frequency",
-            y="Monetary",
-            color="Cluster",
-            color_discrete_sequence=px.colors.qualitative.Set2,
-            hover_data=["Customer ID", "Recency", "Frequency", "Monetary"],
-            title="Frequency vs Monetary",
-            template='plotly_white',
-        )
-        st.plotly_chart(fig_fm, use_container_width=True)
+            with stage("chart: scatter R-M", rows_in=len(rfm)):
+                fig_rm, _ = cluster_scatter(rfm, "Recency", "Monetary", "Recency vs Monetary", mode=scatter_mode)
+            with stage("render: scatter R-M"):
+                st.plotly_chart(fig_rm, use_container_width=True)
+
+        with stage("chart: scatter F-M", rows_in=len(rfm)):
+            fig_fm, _ = cluster_scatter(rfm, "Frequency", "Monetary", "Frequency vs Monetary", mode=scatter_mode)
+        with stage("render: scatter F-M"):
+            st.plotly_chart(fig_fm, use_container_width=True)
+        scatter_caption = f"Chế độ vẽ: {used_mode} · {len(rfm):,} khách hàng"
+        if profile_mode:
+            # Serializing the figures to measure them is not free: only in profiler mode
+            payload_kb = sum(figure_payload_bytes(f) for f in (fig_rf, fig_rm, fig_fm)) / 1024
+            scatter_caption += f" · ~{payload_kb:,.0f} KB dữ liệu biểu đồ"
+        st.caption(scatter_caption)
 
         st.subheader("R-F-M trung bình theo cụm")
-        cluster_means = (
-            rfm.groupby("Cluster")[["Recency", "Frequency", "Monetary"]]
-            .mean()
-            .round(2)
-            .sort_index()
-        )
+        cluster_means = compute_cluster_means(rfm)
         st.dataframe(cluster_means, use_container_width=True)
 
         # Bar chart: number of customers by cluster
@@ -277,101 +483,80 @@ with ai_tab:
             .reset_index(name="Số khách hàng")
             .sort_values("Cluster")
         )
-        fig_cluster_counts = px.bar(
-            customers_per_cluster,
-            x="Cluster",
-            y="Số khách hàng",
-            color="Cluster",
-            color_discrete_sequence=px.colors.qualitative.Set2,
-            title="Số khách hàng theo từng cụm (K)",
-            labels={"Cluster": "Cụm", "Số khách hàng": "Số khách hàng"},
-            template='plotly_white',
-            text="Số khách hàng",
-        )
-        fig_cluster_counts.update_traces(textposition="outside")
-        st.plotly_chart(fig_cluster_counts, use_container_width=True)
+        with stage("chart: số khách hàng theo cụm"):
+            fig_cluster_counts = px.bar(
+                customers_per_cluster,
+                x="Cluster",
+                y="Số khách hàng",
+                color="Cluster",
+                color_discrete_sequence=px.colors.qualitative.Set2,
+                title="Số khách hàng theo từng cụm (K)",
+                labels={"Cluster": "Cụm", "Số khách hàng": "Số khách hàng"},
+                template='plotly_white',
+                text="Số khách hàng",
+            )
+            fig_cluster_counts.update_traces(textposition="outside")
+        with stage("render: số khách hàng theo cụm"):
+            st.plotly_chart(fig_cluster_counts, use_container_width=True)
 
-        # Customer IDs and details per cluster
+        # Customer IDs and details per cluster: grouped/sorted once per (dataset, K),
+        # only the selected cluster's visible page is rendered
         st.subheader("Khách hàng theo từng cụm")
-        clusters = sorted(rfm["Cluster"].unique().tolist())
-        cluster_tabs = st.tabs([f"Cụm {cid}" for cid in clusters])
-        for idx, cid in enumerate(clusters):
-            with cluster_tabs[idx]:
-                rfm_cluster = rfm[rfm["Cluster"] == cid]
-                ids_df = (
-                    rfm_cluster[["Customer ID"]]
-                    .drop_duplicates()
-                    .sort_values("Customer ID")
-                    .reset_index(drop=True)
-                )
-                st.caption(f"Số khách hàng trong cụm {cid}: {len(ids_df)}")
-
-                st.markdown("**Bảng R-F-M của cụm:**")
-                st.dataframe(
-                    rfm_cluster[["Customer ID", "Recency", "Frequency", "Monetary"]]
-                    .sort_values("Customer ID")
-                    .reset_index(drop=True),
-                    use_container_width=True,
-                )
+        with stage("table: nhóm bảng theo cụm", rows_in=len(rfm)):
+            cluster_table = get_dataset_store().get_or_compute(
+                ("paged_clusters", fingerprint_ai, k),
+                lambda: PagedTable(rfm[["Customer ID", "Recency", "Frequency", "Monetary", "Cluster"]], group_col="Cluster"),
+            )
+        cid = st.radio(
+            "Cụm",
+            cluster_table.groups,
+            format_func=lambda c: f"Cụm {c}",
+            horizontal=True,
+            key="cluster_table_group", persist_state="session",
+        )
+        # Per-cluster sorted R/F/M arrays + Customer ID hash index, once per (dataset, K)
+        with stage("index: chỉ mục RFM theo cụm", rows_in=len(rfm)):
+            cluster_index = get_dataset_store().get_or_compute(
+                ("rfm_index", fingerprint_ai, k), lambda: RFMIndex(rfm)
+            )
+        st.caption(f"Số khách hàng trong cụm {cid}: {cluster_index.cluster_size(cid)}")
+        st.markdown("**Bảng R-F-M của cụm:**")
+        with stage("render: bảng khách hàng của cụm"):
+            render_paged_table(
+                cluster_table,
+                key="cluster_table",
+                group=cid,
+                sort_columns=["Customer ID", "Recency", "Frequency", "Monetary"],
+                columns=["Customer ID", "Recency", "Frequency", "Monetary"],
+            )
 
-        r_med = rfm["Recency"].median()
-        f_med = rfm["Frequency"].median()
-        m_med = rfm["Monetary"].median()
-
-        # Quantiles for more differentiated actions
-        r_q = {"low": rfm["Recency"].quantile(0.33), "high": rfm["Recency"].quantile(0.66)}
-        f_q = {"low": rfm["Frequency"].quantile(0.33), "high": rfm["Frequency"].quantile(0.66)}
-        m_q = {"low": rfm["Monetary"].quantile(0.33), "high": rfm["Monetary"].quantile(0.66)}
-
-        def suggest_actions(r: float, f: float, m: float):
-            actions: list[str] = []
-            # Recency: lower is better
-            if r <= r_q["low"]:
-                actions.append("Upsell/cross-sell theo lịch sử sản phẩm vừa mua.")
-            elif r >= r_q["high"]:
-                actions.append("Kích hoạt lại bằng email/SMS kèm ưu đãi quay lại thời hạn ngắn.")
-            else:
-                actions.append("Nhắc nhớ nhẹ nhàng và gợi ý sản phẩm liên quan.")
-            # Frequency: higher is better
-            if f >= f_q["high"]:
-                actions.append("Tăng quyền lợi loyalty/tier; chương trình dành riêng.")
-            elif f <= f_q["low"]:
-                actions.append("Khuyến khích mua lại bằng voucher nhỏ hoặc freeship ngưỡng thấp.")
-            else:
-                actions.append("Bundle/combo để tăng tần suất.")
-            # Monetary: higher is better
-            if m >= m_q["high"]:
-                actions.append("Đề xuất sản phẩm cao cấp/độc quyền; chăm sóc ưu tiên.")
-            elif m <= m_q["low"]:
-                actions.append("Đề xuất sản phẩm giá hợp lý; tối ưu chi phí vận chuyển.")
-            else:
-                actions.append("Gợi ý nâng giá trị giỏ bằng phụ kiện/phụ trợ.")
-            return actions
-
-        # Rank clusters into customer tiers (1 = best)
-        r_min, r_max = cluster_means['Recency'].min(), cluster_means['Recency'].max()
-        f_min, f_max = cluster_means['Frequency'].min(), cluster_means['Frequency'].max()
-        m_min, m_max = cluster_means['Monetary'].min(), cluster_means['Monetary'].max()
-        def norm(val: float, vmin: float, vmax: float) -> float:
-            return 0.0 if vmax == vmin else (val - vmin) / (vmax - vmin)
-
-        rank_df = []
-        for cid, row in cluster_means.iterrows():
-            score = (1 - norm(row['Recency'], r_min, r_max)) + \
-                    norm(row['Frequency'], f_min, f_max) + \
-                    norm(row['Monetary'], m_min, m_max)
-            rank_df.append({'Cluster': cid, 'Score': score})
-        rank_df = pd.DataFrame(rank_df).sort_values('Score', ascending=False).reset_index(drop=True)
-        rank_df['Rank'] = rank_df.index + 1
-        cluster_to_rank = dict(zip(rank_df['Cluster'], rank_df['Rank']))
-
-        # Build tiered names and actions per cluster
-        cluster_info = []
-        for cid, row in cluster_means.iterrows():
-            rank = cluster_to_rank[cid]
-            name = f"Khách hạng {rank}"
-            actions = suggest_actions(row['Recency'], row['Frequency'], row['Monetary'])
-            cluster_info.append({"Cluster": cid, "Hạng": rank, "Tên nhóm": name, "Actions": actions})
+        col_top, col_lookup = st.columns(2)
+        with col_top:
+            top_n_cluster = st.number_input(
+                "Top khách hàng theo Monetary trong cụm", min_value=1, max_value=100, value=10, step=1,
+                key="cluster_top_n", persist_state="session",
+            )
+            top_rows = cluster_index.rfm.iloc[cluster_index.top_n("Monetary", int(top_n_cluster), cluster=cid)]
+            st.dataframe(
+                top_rows[["Customer ID", "Recency", "Frequency", "Monetary"]],
+                use_container_width=True,
+                hide_index=True,
+            )
+        with col_lookup:
+            lookup_id = st.text_input(
+                "Tra cứu Customer ID", value="", key="cluster_lookup_id", persist_state="session"
+            )
+            if lookup_id.strip():
+                # Text that is not a valid Customer ID (e.g. "abc", "1e30", "inf") is simply not found
+                pos = cluster_index.lookup([lookup_id.strip()])[0]
+                if pos < 0:
+                    st.info(f"Không tìm thấy khách hàng {lookup_id.strip()}")
+                else:
+                    st.dataframe(cluster_index.rfm.iloc[[pos]], use_container_width=True, hide_index=True)
+
+        # Quantile thresholds, cluster ranks and actions (shared with the scoring API)
+        thresholds = action_thresholds(rfm)
+        cluster_info = build_cluster_info(cluster_means, thresholds)
 
         st.caption(f"Có {k} loại khách hàng: từ Khách hạng 1 đến {k}.")
         st.dataframe(
@@ -395,5 +580,182 @@ with ai_tab:
                 for act in actions:
                     st.write(f"- {act}")
 
+        # Opt-in: K-Means re-fitted on many subsamples (in parallel), labels aligned to the
+        # current model by centroid matching; cached per (dataset, K, number of runs)
+        st.subheader("Độ ổn định của phân cụm")
+        if st.checkbox(
+            "Kiểm tra độ ổn định (K-Means lặp lại trên các mẫu con)", key="stability_mode", persist_state="session"
+        ):
+            n_runs = st.select_slider(
+                "Số lần lặp", options=[10, 20, 30, 50], value=20, key="stability_runs", persist_state="session"
+            )
+            with stage("model: độ ổn định", rows_in=len(rfm)):
+                stability = get_dataset_store().get_or_compute(
+                    ("stability", fingerprint_ai, k, n_runs),
+                    lambda: cluster_stability(
+                        sweep_result["X_scaled"], sweep[k]["labels"], sweep[k]["centroids"], n_runs=n_runs
+                    ),
+                )
+            rank_of = {c["Cluster"]: c["Hạng"] for c in cluster_info}
+            stability_table = stability["clusters"].copy()
+            stability_table.insert(0, "Hạng", stability_table["Cluster"].map(rank_of))
+            stability_table = stability_table.sort_values("Hạng")
+            confidence = stability["confidence"]
+            st.caption(
+                f"{n_runs} lần lặp · {(confidence >= 0.9).mean():.1%} khách hàng được gán cùng cụm "
+                f"ở ít nhất 90% số lần lặp · Jaccard 1 = cụm giữ nguyên hoàn toàn."
+            )
+            col_jaccard, col_confidence = st.columns(2)
+            with col_jaccard:
+                with stage("chart: jaccard theo cụm"):
+                    fig_jaccard = px.bar(
+                        stability_table,
+                        x=stability_table["Hạng"].map(lambda r: f"Hạng {r}"),
+                        y="JaccardMean",
+                        error_y=stability_table["JaccardMean"] - stability_table["JaccardP10"],
+                        error_y_minus=stability_table["JaccardMean"] - stability_table["JaccardP10"],
+                        title="Jaccard trung bình theo cụm (thanh lỗi tới phân vị 10%)",
+                        labels={"x": "Cụm", "JaccardMean": "Jaccard"},
+                        template='plotly_white',
+                    )
+                    fig_jaccard.update_yaxes(range=[0, 1.05])
+                with stage("render: jaccard theo cụm"):
+                    st.plotly_chart(fig_jaccard, use_container_width=True)
+            with col_confidence:
+                # Histogram pre-binned with numpy: the chart carries 20 bars, not one point per customer
+                counts, edges = np.histogram(confidence, bins=20, range=(0, 1))
+                with stage("chart: độ tin cậy khách hàng"):
+                    fig_confidence = px.bar(
+                        x=edges[:-1] + 0.025,
+                        y=counts,
+                        title="Phân bố độ tin cậy gán cụm của khách hàng",
+                        labels={"x": "Tỉ lệ lần lặp giữ đúng cụm", "y": "Số khách hàng"},
+                        template='plotly_white',
+                    )
+                with stage("render: độ tin cậy khách hàng"):
+                    st.plotly_chart(fig_confidence, use_container_width=True)
+            st.dataframe(
+                stability_table[
+                    ["Hạng", "Cluster", "Customers", "JaccardMean", "JaccardMin", "CentroidShift", "StableShare"]
+                ].round(3),
+                use_container_width=True,
+                hide_index=True,
+            )
+            # Least stable customers: they sit between clusters and flip between runs
+            unstable = np.argsort(confidence, kind="stable")[:20]
+            st.markdown("**Khách hàng kém ổn định nhất:**")
+            st.dataframe(
+                rfm.iloc[unstable][["Customer ID", "Recency", "Frequency", "Monetary", "Cluster"]].assign(
+                    Confidence=confidence[unstable], ModalCluster=stability["modal_label"][unstable]
+                ),
+                use_container_width=True,
+                hide_index=True,
+            )
+
+        # Month-by-month segment migration: R/F/M at every month start in one pass over the
+        # transactions (cached per dataset), labelled with the current K's fitted model
+        st.subheader("Chuyển nhóm khách hàng theo tháng")
+        df_clean_ai = load_clean(source_ai, fingerprint_ai)
+        rolling = load_rolling_rfm(source_ai, fingerprint_ai)
+        with stage("agg: gán nhóm theo mốc", rows_in=len(rolling)):
+            assigned = get_dataset_store().get_or_compute(
+                ("rolling_segments", fingerprint_ai, k),
+                lambda: assign_snapshot_segments(
+                    rolling, SegmentScorer.from_rfm(rfm, sweep_result["scaler"], sweep[k]["model"])
+                ),
+            )
+        snapshot_dates = sorted(assigned["Snapshot"].unique())
+        transition_mode = st.radio(
+            "So sánh",
+            ["consecutive", "range"],
+            format_func=lambda m: {"consecutive": "Từng tháng liên tiếp (cộng dồn)", "range": "Giữa hai mốc"}[m],
+            horizontal=True,
+            key="transition_mode", persist_state="session",
+        )
+        if transition_mode == "range" and len(snapshot_dates) >= 2:
+            start_date, end_date = st.select_slider(
+                "Từ mốc / đến mốc",
+                options=snapshot_dates,
+                value=(snapshot_dates[-2], snapshot_dates[-1]),
+                format_func=lambda d: pd.Timestamp(d).strftime("%Y-%m-%d"),
+                key="transition_range", persist_state="session",
+            )
+            transitions = transition_matrix(assigned, start_date, end_date, normalize=True)
+        else:
+            transitions = transition_matrix(assigned, normalize=True)
+        col_matrix, col_sizes = st.columns(2)
+        with col_matrix:
+            with stage("chart: ma trận chuyển nhóm"):
+                fig_transitions = px.imshow(
+                    transitions.to_numpy(),
+                    x=[f"Hạng {r}" for r in transitions.columns],
+                    y=[r if r == "Mới" else f"Hạng {r}" for r in transitions.index],
+                    labels={"x": "Đến", "y": "Từ", "color": "Tỉ lệ"},
+                    text_auto=".0%",
+                    color_continuous_scale="Blues",
+                    zmin=0,
+                    zmax=1,
+                    title="Tỉ lệ chuyển nhóm (mỗi dòng cộng lại 100%)",
+                    template='plotly_white',
+                )
+            with stage("render: ma trận chuyển nhóm"):
+                st.plotly_chart(fig_transitions, use_container_width=True)
+        with col_sizes:
+            segment_sizes = assigned.groupby(["Snapshot", "Rank"]).size().reset_index(name="Số khách hàng")
+            segment_sizes["Rank"] = "Hạng " + segment_sizes["Rank"].astype(str)
+            with stage("chart: quy mô nhóm theo mốc"):
+                fig_sizes = px.bar(
+                    segment_sizes,
+                    x="Snapshot",
+                    y="Số khách hàng",
+                    color="Rank",
+                    color_discrete_sequence=px.colors.qualitative.Set2,
+                    title="Số khách hàng mỗi hạng theo tháng",
+                    labels={"Snapshot": "Mốc", "Rank": "Hạng"},
+                    template='plotly_white',
+                )
+            with stage("render: quy mô nhóm theo mốc"):
+                st.plotly_chart(fig_sizes, use_container_width=True)
+
+        # Separate K-Means per country (one global model is dominated by the UK);
+        # partitions run in parallel worker processes, cached per (dataset, K)
+        st.subheader("Phân cụm riêng theo quốc gia")
+        if st.checkbox("Phân cụm riêng cho từng quốc gia", key="partition_mode", persist_state="session"):
+            partitioned = get_dataset_store().get_or_compute(
+                ("partitioned", fingerprint_ai, k, "Country"),
+                lambda: segment_partitions(df_clean_ai, key="Country", n_clusters=k),
+            )
+            partitions = partitioned["partitions"]
+            st.caption(
+                f"{len(partitions)} quốc gia · {len(partitioned['rfm']):,} cặp (quốc gia, khách hàng) · "
+                f"tổng thời gian phân cụm {partitions['Seconds'].sum():.2f}s"
+            )
+            with stage("render: bảng phân vùng", rows_in=len(partitions)):
+                st.dataframe(partitions, use_container_width=True, hide_index=True)
+            partition = st.selectbox(
+                "Quốc gia", partitions["Partition"].tolist(), key="partition_country", persist_state="session"
+            )
+            partition_clusters = partitioned["clusters"]
+            st.dataframe(
+                partition_clusters[partition_clusters["Partition"] == partition].drop(columns="Partition"),
+                use_container_width=True,
+                hide_index=True,
+            )
+
     except Exception as e:
         st.error(f"Lỗi khi xử lý dữ liệu: {e}")
+
+
+with traditional_tab:
+    if traditional_tab.open:
+        perf_tradition = StageProfiler(trace_memory=profile_mode, profile_calls=profile_mode)
+        with profile_stages(perf_tradition):
+            render_traditional_tab()
+            render_performance_panel(perf_tradition)
+
+with ai_tab:
+    if ai_tab.open:
+        perf_ai = StageProfiler(trace_memory=profile_mode, profile_calls=profile_mode)
+        with profile_stages(perf_ai):
+            render_ai_tab()
+            render_performance_panel(perf_ai)
@@ -0,0 +1,269 @@
+# backends.py
+
+import importlib.util
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from profiling import instrumented
+from utils import (
+    INVOICE_DATE_FORMAT,
+    RFM_COLUMNS,
+    _is_sidecar_fresh,
+    _parquet_sidecar_path,
+    _parse_invoice_date,
+    clean_retail_data,
+    compute_rfm,
+    load_raw_data,
+    rfm_from_partials,
+)
+
+
+# =========================
+# Backend thực thi cho làm sạch + RFM (pandas / Polars / DuckDB)
+# =========================
+
+# pandas là bản tham chiếu; Polars (lazy) và DuckDB (in-process) là tuỳ chọn, chạy đa luồng
+RFM_BACKENDS = ("pandas", "polars", "duckdb")
+
+# Schema cố định khi đọc CSV, giống `utils.RETAIL_CSV_DTYPES`
+# (Customer ID dạng "13085.0" nên đọc số thực; InvoiceDate đọc chuỗi rồi parse theo format)
+_RETAIL_CSV_TYPES = {
+    "Invoice": "VARCHAR",
+    "StockCode": "VARCHAR",
+    "Description": "VARCHAR",
+    "Quantity": "BIGINT",
+    "InvoiceDate": "VARCHAR",
+    "Price": "DOUBLE",
+    "Customer ID": "DOUBLE",
+    "Country": "VARCHAR",
+}
+
+
+def available_backends() -> list[str]:
+    """
+    Các backend dùng được trong môi trường hiện tại (polars / duckdb là tuỳ chọn).
+    """
+    return [b for b in RFM_BACKENDS if b == "pandas" or importlib.util.find_spec(b) is not None]
+
+
+def _scan_source(path, columnar: bool) -> tuple[str, str]:
+    """
+    ("parquet" | "csv", đường dẫn) cần quét. Với columnar=True dùng file Parquet đi kèm
+    nếu còn mới (xem `utils.load_raw_data(columnar_cache=True)`).
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        raise TypeError("Backend polars / duckdb cần đường dẫn file, không nhận file-like")
+    if columnar:
+        sidecar = _parquet_sidecar_path(path)
+        if sidecar is not None and _is_sidecar_fresh(path, sidecar):
+            return "parquet", sidecar
+    return "csv", os.fspath(path)
+
+
+def _date_lookup(date_strings) -> pd.DataFrame:
+    """
+    Bảng (InvoiceDate chuỗi -> ParsedDate) cho file khác định dạng ngày: chỉ parse
+    các giá trị khác nhau (cỡ số hoá đơn) bằng đúng luật của nhánh pandas.
+    """
+    values = pd.Series(pd.unique(np.asarray(date_strings, dtype=object)), dtype=object).dropna()
+    return pd.DataFrame({"InvoiceDate": values.astype(str), "ParsedDate": _parse_invoice_date(values)})
+
+
+def _partials_to_rfm(partials: pd.DataFrame, snapshot_date: pd.Timestamp | None):
+    """
+    Bảng tổng hợp từ engine ngoài -> cùng kiểu dữ liệu với nhánh pandas rồi `rfm_from_partials`.
+    """
+    partials = partials.astype({"Customer ID": "int64", "Frequency": "int64", "Monetary": "float64"})
+    partials["LastPurchase"] = pd.to_datetime(partials["LastPurchase"])
+    return rfm_from_partials(partials.set_index("Customer ID").sort_index(), snapshot_date)
+
+
+def _rfm_polars(path, snapshot_date, columnar, drop_missing_customer, filter_positive_quantity,
+                filter_positive_price, drop_duplicates):
+    import polars as pl
+
+    kind, scan_path = _scan_source(path, columnar)
+    if kind == "parquet":
+        lf = pl.scan_parquet(scan_path)
+    else:
+        schema = {col: pl.Int64 if t == "BIGINT" else pl.Float64 if t == "DOUBLE" else pl.String
+                  for col, t in _RETAIL_CSV_TYPES.items()}
+        lf = pl.scan_csv(scan_path, schema_overrides=schema)
+
+    # Các điều kiện lọc được Polars đẩy xuống bước quét file (predicate pushdown)
+    conditions = []
+    if drop_missing_customer:
+        conditions.append(pl.col("Customer ID").is_not_null())
+    if filter_positive_quantity:
+        conditions.append(pl.col("Quantity") > 0)
+    if filter_positive_price:
+        conditions.append(pl.col("Price") > 0)
+    if conditions:
+        lf = lf.filter(pl.all_horizontal(conditions))
+    # Không xoá trùng thì chỉ cần các cột RFM (projection pushdown)
+    lf = lf.unique() if drop_duplicates else lf.select(RFM_COLUMNS)
+
+    def aggregate(invoice_date):
+        return (
+            lf.group_by("Customer ID")
+            .agg(
+                invoice_date.max().alias("LastPurchase"),
+                pl.col("Invoice").n_unique().alias("Frequency"),
+                (pl.col("Quantity") * pl.col("Price")).sum().alias("Monetary"),
+            )
+            .collect()
+            .to_pandas()
+        )
+
+    if lf.collect_schema()["InvoiceDate"] != pl.String:
+        return _partials_to_rfm(aggregate(pl.col("InvoiceDate")), snapshot_date)
+    try:
+        partials = aggregate(pl.col("InvoiceDate").str.to_datetime(INVOICE_DATE_FORMAT))
+    except (pl.exceptions.ComputeError, pl.exceptions.InvalidOperationError):
+        # File export khác định dạng -> parse các giá trị ngày khác nhau bằng pandas rồi join lại
+        dates = lf.select(pl.col("InvoiceDate").unique()).collect().to_series().to_list()
+        lookup = pl.from_pandas(_date_lookup(dates)).lazy()
+        lf = lf.join(lookup, on="InvoiceDate", how="left")
+        partials = aggregate(pl.col("ParsedDate"))
+    return _partials_to_rfm(partials, snapshot_date)
+
+
+def _rfm_duckdb(path, snapshot_date, columnar, drop_missing_customer, filter_positive_quantity,
+                filter_positive_price, drop_duplicates):
+    import duckdb
+
+    kind, scan_path = _scan_source(path, columnar)
+    conditions = [
+        cond for enabled, cond in (
+            (drop_missing_customer, '"Customer ID" IS NOT NULL'),
+            (filter_positive_quantity, "Quantity > 0"),
+            (filter_positive_price, "Price > 0"),
+        ) if enabled
+    ]
+    where = " AND ".join(conditions) or "TRUE"
+    columns = "*" if drop_duplicates else ", ".join(f'"{c}"' for c in RFM_COLUMNS)
+    distinct = "DISTINCT" if drop_duplicates else ""
+
+    if kind == "parquet":
+        scan = "read_parquet($path)"
+    else:
+        struct = ", ".join(f"'{col}': '{t}'" for col, t in _RETAIL_CSV_TYPES.items())
+        scan = f"read_csv($path, header = true, types = {{{struct}}})"
+
+    def query(con, last_purchase: str, join: str = "") -> pd.DataFrame:
+        # Điều kiện WHERE được DuckDB đẩy xuống bước quét file
+        sql = f"""
+            WITH cleaned AS (
+                SELECT {distinct} {columns} FROM {scan} WHERE {where}
+            )
+            SELECT
+                CAST("Customer ID" AS BIGINT) AS "Customer ID",
+                max({last_purchase}) AS LastPurchase,
+                count(DISTINCT Invoice) AS Frequency,
+                sum(Quantity * Price) AS Monetary
+            FROM cleaned {join}
+            GROUP BY 1
+        """
+        return con.execute(sql, {"path": scan_path}).df()
+
+    with duckdb.connect() as con:
+        if kind == "parquet":
+            return _partials_to_rfm(query(con, "InvoiceDate"), snapshot_date)
+        try:
+            partials = query(con, f"strptime(InvoiceDate, '{INVOICE_DATE_FORMAT}')")
+        except duckdb.Error:
+            # File export khác định dạng -> parse các giá trị ngày khác nhau bằng pandas rồi join lại
+            dates = con.execute(f"SELECT DISTINCT InvoiceDate FROM {scan}", {"path": scan_path}).df()
+            date_lookup = _date_lookup(dates["InvoiceDate"])
+            con.register("date_lookup", date_lookup)
+            partials = query(con, "date_lookup.ParsedDate", "JOIN date_lookup USING (InvoiceDate)")
+    return _partials_to_rfm(partials, snapshot_date)
+
+
+@instrumented
+def compute_rfm_backend(
+    path,
+    backend: str = "pandas",
+    snapshot_date: pd.Timestamp | None = None,
+    columnar: bool = False,
+    drop_missing_customer: bool = True,
+    filter_positive_quantity: bool = True,
+    filter_positive_price: bool = True,
+    drop_duplicates: bool = True,
+):
+    """
+    load → `clean_retail_data` → `compute_rfm` trên backend được chọn, cùng luật làm sạch
+    và cùng kết quả (rfm, snapshot_date) như nhánh pandas:
+        - "pandas": bản tham chiếu (load_raw_data + clean_retail_data + compute_rfm)
+        - "polars": lazy frame, lọc được đẩy xuống bước quét CSV/Parquet, đa luồng
+        - "duckdb": một truy vấn SQL trong tiến trình, đa luồng
+    `columnar=True` quét file Parquet đi kèm nếu có (xem `load_raw_data`).
+    Monetary có thể lệch ở chữ số thập phân cuối do thứ tự cộng khác nhau
+    (xem `check_backend_conformance`).
+    """
+    flags = {
+        "drop_missing_customer": drop_missing_customer,
+        "filter_positive_quantity": filter_positive_quantity,
+        "filter_positive_price": filter_positive_price,
+        "drop_duplicates": drop_duplicates,
+    }
+    if backend == "pandas":
+        df_clean = clean_retail_data(load_raw_data(path, columnar_cache=columnar), **flags)
+        return compute_rfm(df_clean, snapshot_date=snapshot_date)
+    if backend == "polars":
+        return _rfm_polars(path, snapshot_date, columnar, **flags)
+    if backend == "duckdb":
+        return _rfm_duckdb(path, snapshot_date, columnar, **flags)
+    raise ValueError(f"backend phải là một trong {RFM_BACKENDS}, nhận được {backend!r}")
+
+
+def check_backend_conformance(
+    path,
+    backends=None,
+    columnar: bool = False,
+    rtol: float = 1e-9,
+    **clean_kwargs,
+) -> pd.DataFrame:
+    """
+    Chạy `compute_rfm_backend` trên mọi backend và so với bản pandas:
+    Customer ID / Recency / Frequency phải bằng hệt, Monetary lệch tương đối <= rtol,
+    snapshot_date phải trùng. Trả về bảng Backend, Seconds, Customers, MaxMonetaryRelDiff, Conforms.
+    """
+    backends = [b for b in (backends or available_backends()) if b != "pandas"]
+    rows = []
+    start = time.perf_counter()
+    reference, ref_snapshot = compute_rfm_backend(path, "pandas", columnar=columnar, **clean_kwargs)
+    rows.append({
+        "Backend": "pandas",
+        "Seconds": round(time.perf_counter() - start, 3),
+        "Customers": len(reference),
+        "MaxMonetaryRelDiff": 0.0,
+        "Conforms": True,
+    })
+
+    for backend in backends:
+        start = time.perf_counter()
+        rfm, snapshot = compute_rfm_backend(path, backend, columnar=columnar, **clean_kwargs)
+        seconds = time.perf_counter() - start
+        same_shape = len(rfm) == len(reference) and list(rfm.columns) == list(reference.columns)
+        exact = same_shape and snapshot == ref_snapshot and all(
+            np.array_equal(rfm[col].to_numpy(), reference[col].to_numpy())
+            for col in ("Customer ID", "Recency", "Frequency")
+        )
+        if same_shape:
+            ref_monetary = reference["Monetary"].to_numpy()
+            scale = np.maximum(np.abs(ref_monetary), 1.0)
+            rel_diff = float(np.max(np.abs(rfm["Monetary"].to_numpy() - ref_monetary) / scale, initial=0.0))
+        else:
+            rel_diff = float("inf")
+        rows.append({
+            "Backend": backend,
+            "Seconds": round(seconds, 3),
+            "Customers": len(rfm),
+            "MaxMonetaryRelDiff": rel_diff,
+            "Conforms": bool(exact and rel_diff <= rtol),
+        })
+    return pd.DataFrame(rows)
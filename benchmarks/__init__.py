@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Các script đo hiệu năng cho utils.py. Chạy từ thư mục gốc dự án:
+#     python -m benchmarks.ingestion data/online_retail_II.csv
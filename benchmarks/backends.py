@@ -0,0 +1,82 @@
+# benchmarks/backends.py
+"""
+So sánh các backend làm sạch + RFM (xem backends.py): pandas (tham chiếu), Polars, DuckDB.
+Mỗi backend chạy trong một tiến trình riêng, đo thời gian thực, thời gian CPU (> thời gian
+thực nghĩa là chạy đa luồng) và mức tăng RSS (tracemalloc không thấy bộ nhớ của
+Polars/DuckDB). Sau đó kiểm tra kết quả rfm của mọi backend trùng với pandas.
+
+    python -m benchmarks.backends data/online_retail_II.csv
+    python -m benchmarks.backends data/online_retail_II.csv --columnar
+"""
+
+import argparse
+import json
+import os
+import time
+
+from benchmarks.common import peak_rss_mb, run_isolated
+
+
+def _run_backend(path: str, backend: str, columnar: bool) -> dict:
+    from backends import compute_rfm_backend
+
+    rss_before = peak_rss_mb()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    rfm, _ = compute_rfm_backend(path, backend=backend, columnar=columnar)
+    seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - cpu_start
+    rss_after = peak_rss_mb()
+    return {
+        "backend": backend,
+        "seconds": round(seconds, 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "rss_growth_mb": None if rss_before is None else round(rss_after - rss_before, 1),
+        "customers": len(rfm),
+    }
+
+
+def run(path: str, backends=None, columnar: bool = False) -> dict:
+    from backends import available_backends, check_backend_conformance
+
+    backends = list(backends or available_backends())
+    if columnar:
+        # Tạo sẵn file Parquet đi kèm để mọi backend cùng quét Parquet
+        from utils import load_raw_data
+
+        load_raw_data(path, columnar_cache=True)
+    timings = [run_isolated(_run_backend, path, backend, columnar) for backend in backends]
+    conformance = check_backend_conformance(path, backends=backends, columnar=columnar)
+    return {
+        "cpu_count": os.cpu_count(),
+        "timings": timings,
+        "conformance": conformance.to_dict(orient="records"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="Đường dẫn tới CSV Online Retail II")
+    parser.add_argument("--backends", default=None, help="vd. pandas,polars,duckdb (mặc định: mọi backend có sẵn)")
+    parser.add_argument("--columnar", action="store_true", help="Quét file Parquet đi kèm thay vì CSV")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    backends = None if args.backends is None else [b.strip() for b in args.backends.split(",")]
+    report = run(args.path, backends, columnar=args.columnar)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"CPU: {report['cpu_count']}")
+    print(f"{'backend':<10}{'seconds':>10}{'cpu_s':>10}{'rss+MB':>10}{'customers':>12}")
+    for r in report["timings"]:
+        if "error" in r:
+            print(f"{r.get('backend', '?'):<10} lỗi: {r['error']}")
+            continue
+        print(f"{r['backend']:<10}{r['seconds']:>10.3f}{r['cpu_seconds']:>10.3f}{r['rss_growth_mb']:>10.1f}{r['customers']:>12,}")
+    print("\nConformance (so với pandas):")
+    for r in report["conformance"]:
+        print(f"  {r['Backend']:<8} {'OK' if r['Conforms'] else 'KHÁC'}  max Monetary rel diff = {r['MaxMonetaryRelDiff']:.1e}")
+
+
+if __name__ == "__main__":
+    main()
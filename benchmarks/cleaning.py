@@ -0,0 +1,127 @@
+# benchmarks/cleaning.py
+"""
+So sánh `clean_retail_data` hiện tại (một mask, copy một lần) với bản cũ
+(copy sau mỗi bước lọc) và chế độ compact, trên cùng dữ liệu đầu vào:
+thời gian, bộ nhớ cấp phát đỉnh (tracemalloc), RSS tăng thêm và kích thước kết quả.
+Đồng thời kiểm tra kết quả của bản mới giống hệt bản cũ.
+
+    python -m benchmarks.cleaning data/online_retail_II.csv
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import measure, peak_rss_mb, run_isolated
+
+
+SCENARIOS = ("legacy", "single_mask", "compact")
+
+
+def clean_retail_data_legacy(
+    df: pd.DataFrame,
+    drop_missing_customer: bool = True,
+    filter_positive_quantity: bool = True,
+    filter_positive_price: bool = True,
+    drop_duplicates: bool = True
+) -> pd.DataFrame:
+    """
+    Bản `clean_retail_data` trước khi tối ưu, giữ lại làm mốc so sánh.
+    """
+    df_clean = df.copy()
+
+    if not pd.api.types.is_datetime64_any_dtype(df_clean["InvoiceDate"]):
+        df_clean["InvoiceDate"] = pd.to_datetime(df_clean["InvoiceDate"])
+
+    if drop_missing_customer:
+        df_clean = df_clean[df_clean["Customer ID"].notna()].copy()
+
+    if filter_positive_quantity:
+        df_clean = df_clean[df_clean["Quantity"] > 0].copy()
+
+    if filter_positive_price:
+        df_clean = df_clean[df_clean["Price"] > 0].copy()
+
+    if drop_duplicates:
+        df_clean = df_clean.drop_duplicates().copy()
+
+    df_clean["Customer ID"] = df_clean["Customer ID"].astype(int)
+    df_clean["TotalPrice"] = df_clean["Quantity"] * df_clean["Price"]
+
+    return df_clean
+
+
+def _run_scenario(path: str, scenario: str, columnar: bool) -> dict:
+    from utils import clean_retail_data, load_raw_data
+
+    df_raw = load_raw_data(path, columnar_cache=columnar)
+    rss_before = peak_rss_mb()
+    if scenario == "legacy":
+        df_clean, stats = measure(clean_retail_data_legacy, df_raw)
+    elif scenario == "compact":
+        df_clean, stats = measure(clean_retail_data, df_raw, compact=True)
+    else:
+        df_clean, stats = measure(clean_retail_data, df_raw)
+
+    rss_after = stats["peak_rss_mb"]
+    return {
+        "scenario": scenario,
+        **stats,
+        "rss_growth_mb": None if rss_after is None else round(rss_after - rss_before, 1),
+        "rows_in": len(df_raw),
+        "rows_out": len(df_clean),
+        "input_mb": round(df_raw.memory_usage(deep=True).sum() / 1024**2, 1),
+        "output_mb": round(df_clean.memory_usage(deep=True).sum() / 1024**2, 1),
+    }
+
+
+def _check_identical(path: str, columnar: bool) -> dict:
+    from utils import clean_retail_data, load_raw_data
+
+    df_raw = load_raw_data(path, columnar_cache=columnar)
+    expected = clean_retail_data_legacy(df_raw)
+    actual = clean_retail_data(df_raw)
+    try:
+        pd.testing.assert_frame_equal(expected, actual)
+        identical = True
+    except AssertionError:
+        identical = False
+    compact = clean_retail_data(df_raw, compact=True)
+    monetary_gap = np.abs(
+        expected["TotalPrice"].to_numpy() - compact["TotalPrice"].to_numpy(dtype="float64")
+    ).max() if len(expected) else 0.0
+    return {"identical": identical, "compact_max_totalprice_diff": float(monetary_gap)}
+
+
+def run(path: str, columnar: bool = False, scenarios=SCENARIOS) -> dict:
+    return {
+        "results": [run_isolated(_run_scenario, path, s, columnar) for s in scenarios],
+        "check": run_isolated(_check_identical, path, columnar),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="Đường dẫn tới CSV Online Retail II")
+    parser.add_argument("--columnar", action="store_true", help="Đọc dữ liệu qua Parquet (schema cố định)")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    report = run(args.path, columnar=args.columnar)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    header = f"{'scenario':<13}{'seconds':>9}{'traced MB':>11}{'RSS +MB':>9}{'out MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in report["results"]:
+        growth = "-" if r["rss_growth_mb"] is None else f"{r['rss_growth_mb']:.1f}"
+        print(f"{r['scenario']:<13}{r['seconds']:>9.3f}{r['traced_peak_mb']:>11.1f}{growth:>9}{r['output_mb']:>8.1f}")
+    print(f"\nKết quả giống bản cũ: {report['check']['identical']}; "
+          f"compact lệch TotalPrice tối đa {report['check']['compact_max_totalprice_diff']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
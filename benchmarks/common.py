@@ -0,0 +1,69 @@
+# benchmarks/common.py
+"""
+Tiện ích dùng chung cho các script benchmark: chạy một hàm trong tiến trình
+riêng và đo thời gian + bộ nhớ đỉnh của riêng bước đó.
+"""
+
+import multiprocessing as mp
+import queue as queue_module
+import time
+import tracemalloc
+
+from profiling import peak_rss_mb
+
+
+def measure(fn, *args, **kwargs) -> tuple:
+    """
+    Gọi fn(*args, **kwargs), trả về (kết quả, số đo) với số đo gồm
+    seconds, traced_peak_mb (tracemalloc) và peak_rss_mb của tiến trình.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = peak_rss_mb()
+    return result, {
+        "seconds": round(elapsed, 3),
+        "traced_peak_mb": round(traced_peak / 1024**2, 1),
+        "peak_rss_mb": None if rss is None else round(rss, 1),
+    }
+
+
+def _child(target, args, queue) -> None:
+    try:
+        queue.put(target(*args))
+    except Exception as e:  # trả lỗi về tiến trình cha thay vì treo
+        queue.put({"error": repr(e)})
+
+
+def run_isolated(target, *args, timeout: float | None = None, poll_seconds: float = 1.0) -> dict:
+    """
+    Chạy target(*args) trong tiến trình mới (spawn) và trả về dict kết quả của nó.
+    target phải là hàm cấp module để pickle được.
+    Nếu tiến trình con chết mà không trả kết quả (vd. bị OOM killer dừng) hoặc chạy quá
+    `timeout` giây, trả về {"error": ...} thay vì chờ mãi.
+    """
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(target, args, queue))
+    proc.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                return queue.get(timeout=poll_seconds)
+            except queue_module.Empty:
+                pass
+            if not proc.is_alive():
+                # Kết quả có thể đến ngay trước khi tiến trình thoát
+                try:
+                    return queue.get(timeout=poll_seconds)
+                except queue_module.Empty:
+                    return {"error": f"tiến trình con thoát (exitcode={proc.exitcode}) mà không trả kết quả"}
+            if deadline is not None and time.monotonic() > deadline:
+                proc.terminate()
+                return {"error": f"quá thời gian {timeout}s"}
+    finally:
+        proc.join()
@@ -0,0 +1,58 @@
+# benchmarks/compare.py
+"""
+So sánh hai file kết quả của `benchmarks.run` (vd. trước/sau một commit) theo từng
+(quy mô, bước): thời gian và bộ nhớ cấp phát đỉnh. Trả về mã lỗi 1 nếu có bước
+chậm hơn / tốn bộ nhớ hơn quá ngưỡng, dùng được trong CI.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return {(r["rows"], r["stage"]): r for r in report["results"] if "error" not in r}
+
+
+def compare(old: dict, new: dict, threshold: float = 0.10) -> list[dict]:
+    rows = []
+    for key in sorted(set(old) & set(new)):
+        o, n = old[key], new[key]
+        time_ratio = n["seconds"] / o["seconds"] if o["seconds"] else float("inf")
+        mem_ratio = n["traced_peak_mb"] / o["traced_peak_mb"] if o["traced_peak_mb"] else float("inf")
+        rows.append({
+            "rows": key[0],
+            "stage": key[1],
+            "old_seconds": o["seconds"],
+            "new_seconds": n["seconds"],
+            "time_ratio": time_ratio,
+            "old_peak_mb": o["traced_peak_mb"],
+            "new_peak_mb": n["traced_peak_mb"],
+            "mem_ratio": mem_ratio,
+            "regression": time_ratio > 1 + threshold or mem_ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("old", help="File JSON mốc")
+    parser.add_argument("new", help="File JSON cần so sánh")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Ngưỡng chậm/tốn hơn coi là regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    rows = compare(load(args.old), load(args.new), args.threshold)
+    print(f"{'rows':>12} {'stage':<34}{'old s':>9}{'new s':>9}{'x':>7}{'old MB':>9}{'new MB':>9}{'x':>7}")
+    for r in rows:
+        flag = "  <-- regression" if r["regression"] else ""
+        print(f"{r['rows']:>12,} {r['stage']:<34}{r['old_seconds']:>9.3f}{r['new_seconds']:>9.3f}"
+              f"{r['time_ratio']:>7.2f}{r['old_peak_mb']:>9.1f}{r['new_peak_mb']:>9.1f}{r['mem_ratio']:>7.2f}{flag}")
+    sys.exit(1 if any(r["regression"] for r in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/dataset_store.py
+"""
+RSS khi nhiều session cùng mở một bộ dữ liệu: mỗi session giữ df_clean + rfm của riêng nó
+(cache theo session) so với `DatasetStore` dùng chung (một bản cho mọi session, mỗi session
+chỉ giữ view). Mỗi cấu hình chạy trong tiến trình riêng; một nửa số session đọc từ đường dẫn,
+nửa còn lại "tải lên" cùng nội dung (bytes), nên kho dùng chung phải nhận ra là một bộ dữ liệu.
+
+    python -m benchmarks.dataset_store data/online_retail_II.csv --sessions 1,5,30
+"""
+
+import argparse
+import io
+import time
+
+import pandas as pd
+
+from benchmarks.common import run_isolated
+from profiling import peak_rss_mb
+
+
+def _session_sources(path: str, n_sessions: int) -> list:
+    with open(path, "rb") as f:
+        content = f.read()
+    return [path if i % 2 == 0 else io.BytesIO(content) for i in range(n_sessions)]
+
+
+def simulate(path: str, n_sessions: int, mode: str) -> dict:
+    """
+    Chạy trong tiến trình con: n_sessions session lần lượt mở dữ liệu và giữ kết quả tới cuối.
+    """
+    from dataset_store import DatasetStore
+    from utils import LRUCache, compute_rfm_cached, fingerprint_source
+
+    sources = _session_sources(path, n_sessions)
+    store = DatasetStore(reap_interval=None) if mode == "shared" else None
+    start = time.perf_counter()
+    sessions = []
+    for i, source in enumerate(sources):
+        if store is None:
+            cache = LRUCache(maxsize=8)
+            fingerprint = fingerprint_source(source)
+        else:
+            cache = store
+            fingerprint = store.fingerprint(source)
+            store.acquire(fingerprint, owner=i)
+        rfm, _ = compute_rfm_cached(source, cache=cache, fingerprint=fingerprint, columnar_cache=True)
+        sessions.append((cache, rfm))
+    return {
+        "Mode": mode,
+        "Sessions": n_sessions,
+        "Datasets": len({id(cache) for cache, _ in sessions}) if store is None else len(store.stats()),
+        "Seconds": round(time.perf_counter() - start, 2),
+        "PeakRSSMB": round(peak_rss_mb() or 0, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="Đường dẫn tới CSV Online Retail II")
+    parser.add_argument("--sessions", default="1,5,30", help="Số session, phân tách bằng dấu phẩy")
+    args = parser.parse_args()
+
+    rows = []
+    for n in (int(x) for x in args.sessions.split(",")):
+        for mode in ("per_session", "shared"):
+            rows.append(run_isolated(simulate, args.path, n, mode))
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/ingestion.py
+"""
+So sánh thời gian đọc & bộ nhớ đỉnh của `load_raw_data`:
+    - csv:            đường cũ (read_csv tự suy kiểu + to_datetime)
+    - columnar_cold:  đọc CSV theo schema cố định + ghi file Parquet đi kèm
+    - columnar_warm:  đọc lại từ Parquet
+    - columnar_rfm:   đọc từ Parquet, chỉ các cột RFM_COLUMNS
+
+Mỗi kịch bản chạy trong một tiến trình riêng để bộ nhớ đỉnh không lẫn nhau.
+
+    python -m benchmarks.ingestion data/online_retail_II.csv
+"""
+
+import argparse
+import json
+import os
+
+from benchmarks.common import measure, peak_rss_mb, run_isolated
+
+
+SCENARIOS = ("csv", "columnar_cold", "columnar_warm", "columnar_rfm")
+
+
+def _run_scenario(path: str, scenario: str) -> dict:
+    from utils import RFM_COLUMNS, load_raw_data
+
+    sidecar = f"{path}.parquet"
+    if scenario == "columnar_cold" and os.path.exists(sidecar):
+        os.remove(sidecar)
+
+    rss_before = peak_rss_mb()
+    if scenario == "csv":
+        df, stats = measure(load_raw_data, path)
+    elif scenario == "columnar_rfm":
+        df, stats = measure(load_raw_data, path, columns=RFM_COLUMNS, columnar_cache=True)
+    else:
+        df, stats = measure(load_raw_data, path, columnar_cache=True)
+
+    return {
+        "scenario": scenario,
+        **stats,
+        "rows": len(df),
+        "columns": len(df.columns),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 1024**2, 1),
+        "rss_before_mb": None if rss_before is None else round(rss_before, 1),
+    }
+
+
+def run(path: str, scenarios=SCENARIOS) -> list[dict]:
+    return [run_isolated(_run_scenario, path, scenario) for scenario in scenarios]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="Đường dẫn tới CSV Online Retail II")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    results = run(args.path)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    header = f"{'scenario':<15}{'seconds':>9}{'frame MB':>10}{'traced MB':>11}{'peak RSS MB':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        rss = "-" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.1f}"
+        print(f"{r['scenario']:<15}{r['seconds']:>9.3f}{r['frame_mb']:>10.1f}"
+              f"{r['traced_peak_mb']:>11.1f}{rss:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# benchmarks/kmeans_engines.py
+"""
+So sánh các engine phân cụm của `train_kmeans` (kmeans / minibatch / sample)
+trên RFM của một file CSV: thời gian fit, inertia và độ khớp nhãn với KMeans đầy đủ.
+
+    python -m benchmarks.kmeans_engines data/online_retail_II.csv --k 4 --replicate 20
+"""
+
+import argparse
+
+import numpy as np
+
+from utils import compare_kmeans_engines, compute_rfm, clean_retail_data, load_raw_data, scale_rfm
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="Đường dẫn tới CSV Online Retail II")
+    parser.add_argument("--k", type=int, default=4, help="Số cụm")
+    parser.add_argument("--sample-size", type=int, default=50_000, help="Cỡ mẫu cho engine 'sample'")
+    parser.add_argument(
+        "--replicate", type=int, default=1,
+        help="Nhân bản RFM (kèm nhiễu nhỏ) để giả lập số khách hàng lớn hơn",
+    )
+    args = parser.parse_args()
+
+    rfm, _ = compute_rfm(clean_retail_data(load_raw_data(args.path, columnar_cache=True)))
+    X_scaled, _ = scale_rfm(rfm)
+    if args.replicate > 1:
+        rng = np.random.default_rng(0)
+        X_scaled = np.vstack(
+            [X_scaled] + [X_scaled + rng.normal(0, 0.01, X_scaled.shape) for _ in range(args.replicate - 1)]
+        )
+
+    print(f"{len(X_scaled):,} khách hàng, K = {args.k}")
+    print(compare_kmeans_engines(X_scaled, n_clusters=args.k, sample_size=args.sample_size).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/rfm_index.py
+"""
+So sánh truy vấn trên `RFMIndex` với quét mask pandas trên bảng rfm: lọc theo khoảng,
+dải phân vị, top-N theo Monetary trong cụm và tra cứu Customer ID (kết quả phải trùng nhau).
+
+    python -m benchmarks.rfm_index data/online_retail_II.csv --replicate 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from rfm_index import RFMIndex
+from segments import action_thresholds
+from utils import clean_retail_data, compute_rfm, load_raw_data
+
+
+def _best_of(fn, repeat: int = 5) -> tuple:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run(rfm: pd.DataFrame) -> pd.DataFrame:
+    index, build_seconds = _best_of(lambda: RFMIndex(rfm), repeat=1)
+    rfm = index.rfm
+    thresholds = action_thresholds(rfm)
+    m_high = thresholds["Monetary"]["high"]
+    lookup_ids = rfm["Customer ID"].sample(50, replace=True, random_state=0).to_numpy()
+
+    cases = {
+        "Monetary >= 5000 & Recency <= 30": (
+            lambda: np.flatnonzero(((rfm["Monetary"] >= 5000) & (rfm["Recency"] <= 30)).to_numpy()),
+            lambda: index.query(Monetary=(5000, None), Recency=(None, 30)),
+        ),
+        "Frequency in [3, 5]": (
+            lambda: np.flatnonzero(rfm["Frequency"].between(3, 5).to_numpy()),
+            lambda: index.query(Frequency=(3, 5)),
+        ),
+        "Monetary dải cao (>= phân vị 0.66)": (
+            lambda: np.flatnonzero((rfm["Monetary"] >= rfm["Monetary"].quantile(0.66)).to_numpy()),
+            lambda: np.sort(index.band("Monetary", "high")),
+        ),
+        "Monetary >= phân vị 0.66 & Cluster 0": (
+            lambda: np.flatnonzero(((rfm["Monetary"] >= m_high) & (rfm["Cluster"] == 0)).to_numpy()),
+            lambda: index.query(cluster=0, Monetary=(m_high, None)),
+        ),
+        "top 20 Monetary trong Cluster 0": (
+            lambda: rfm[rfm["Cluster"] == 0].sort_values("Monetary", ascending=False, kind="stable").index[:20].to_numpy(),
+            lambda: index.top_n("Monetary", 20, cluster=0),
+        ),
+        "tra cứu 50 Customer ID": (
+            lambda: np.array([np.flatnonzero(rfm["Customer ID"].to_numpy() == cid)[0] for cid in lookup_ids]),
+            lambda: index.lookup(lookup_ids),
+        ),
+    }
+    rows = [{"Query": "dựng chỉ mục", "ScanSeconds": None, "IndexSeconds": round(build_seconds, 4), "Rows": len(rfm)}]
+    for name, (scan, indexed) in cases.items():
+        expected, scan_seconds = _best_of(scan)
+        got, index_seconds = _best_of(indexed)
+        if not np.array_equal(expected, got):
+            raise AssertionError(f"Kết quả khác nhau: {name}")
+        rows.append({
+            "Query": name,
+            "ScanSeconds": round(scan_seconds, 5),
+            "IndexSeconds": round(index_seconds, 5),
+            "Rows": len(got),
+        })
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="Đường dẫn tới CSV Online Retail II")
+    parser.add_argument("--k", type=int, default=4, help="Số cụm (nhãn giả lập đều cho phần benchmark theo cụm)")
+    parser.add_argument("--replicate", type=int, default=1, help="Nhân bản RFM để giả lập số khách hàng lớn hơn")
+    args = parser.parse_args()
+
+    rfm, _ = compute_rfm(clean_retail_data(load_raw_data(args.path, columnar_cache=True)))
+    if args.replicate > 1:
+        rfm = pd.concat([rfm] * args.replicate, ignore_index=True)
+        rfm["Customer ID"] = np.arange(len(rfm))
+    rfm["Cluster"] = np.random.default_rng(0).integers(0, args.k, len(rfm))
+
+    print(f"{len(rfm):,} khách hàng")
+    print(run(rfm).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
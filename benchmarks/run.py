@@ -0,0 +1,212 @@
+# benchmarks/run.py
+"""
+Bộ benchmark theo từng bước của utils.py trên dữ liệu giả lập (benchmarks.synthetic):
+load_raw_data, clean_retail_data, compute_rfm, scale_rfm, train_kmeans,
+run_rfm_kmeans_pipeline (thường + theo chunk), segment_partitions (theo Country),
+compute_rolling_rfm (RFM tại mọi mốc đầu tháng) và cluster_stability (K-Means lặp lại
+trên mẫu con, ghép nhãn theo tâm cụm). Mỗi bước chạy trong tiến trình riêng,
+đo thời gian, bộ nhớ cấp phát đỉnh (tracemalloc) và RSS; kết quả ghi ra JSON để so
+sánh giữa các commit bằng `python -m benchmarks.compare`.
+
+    python -m benchmarks.run --scales 100k,1m
+    python -m benchmarks.run --scales 10m,50m --stages run_rfm_kmeans_pipeline_chunked
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+from benchmarks.common import measure, peak_rss_mb, run_isolated
+from benchmarks.synthetic import parse_rows, write_synthetic_csv
+
+
+STAGES = (
+    "load_raw_data",
+    "clean_retail_data",
+    "compute_rfm",
+    "scale_rfm",
+    "train_kmeans",
+    "run_rfm_kmeans_pipeline",
+    "run_rfm_kmeans_pipeline_chunked",
+    "segment_partitions",
+    "compute_rolling_rfm",
+    "cluster_stability",
+)
+DEFAULT_SCALES = "100k,1m"
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def dataset_path(n_rows: int, seed: int) -> str:
+    """
+    Sinh file giả lập nếu chưa có (file được giữ lại cho các lần chạy sau).
+    """
+    path = os.path.join(DATA_DIR, f"synthetic_{n_rows}_s{seed}.csv")
+    if not os.path.exists(path):
+        write_synthetic_csv(path, n_rows, seed=seed)
+    return path
+
+
+def _run_stage(path: str, stage: str, n_clusters: int, columnar: bool, chunksize: int) -> dict:
+    import utils
+
+    # Chuẩn bị đầu vào của bước cần đo (không tính vào số đo)
+    args, kwargs = (), {}
+    if stage == "load_raw_data":
+        fn, args, kwargs = utils.load_raw_data, (path,), {"columnar_cache": columnar}
+        if columnar:
+            utils.load_raw_data(path, columnar_cache=True)  # đo bản warm (đã có Parquet)
+    elif stage == "run_rfm_kmeans_pipeline":
+        fn, args, kwargs = utils.run_rfm_kmeans_pipeline, (path,), {"n_clusters": n_clusters, "columnar_cache": columnar}
+    elif stage == "run_rfm_kmeans_pipeline_chunked":
+        fn, args, kwargs = utils.run_rfm_kmeans_pipeline, (path,), {"n_clusters": n_clusters, "chunksize": chunksize}
+    else:
+        df_raw = utils.load_raw_data(path, columnar_cache=columnar)
+        if stage == "clean_retail_data":
+            fn, args = utils.clean_retail_data, (df_raw,)
+        else:
+            df_clean = utils.clean_retail_data(df_raw)
+            del df_raw
+            if stage == "compute_rfm":
+                fn, args = utils.compute_rfm, (df_clean,)
+            elif stage == "segment_partitions":
+                from partitioned import segment_partitions
+
+                fn, args, kwargs = segment_partitions, (df_clean,), {"n_clusters": n_clusters}
+            elif stage == "compute_rolling_rfm":
+                from rolling_rfm import compute_rolling_rfm
+
+                fn, args = compute_rolling_rfm, (df_clean,)
+            else:
+                rfm, _ = utils.compute_rfm(df_clean)
+                del df_clean
+                if stage == "scale_rfm":
+                    fn, args = utils.scale_rfm, (rfm,)
+                elif stage == "train_kmeans":
+                    X_scaled, _ = utils.scale_rfm(rfm)
+                    fn, args, kwargs = utils.train_kmeans, (X_scaled,), {"n_clusters": n_clusters}
+                elif stage == "cluster_stability":
+                    from stability import cluster_stability
+
+                    X_scaled, _ = utils.scale_rfm(rfm)
+                    model = utils.train_kmeans(X_scaled, n_clusters=n_clusters)
+                    fn, args = cluster_stability, (X_scaled, model.labels_, model.cluster_centers_)
+                else:
+                    raise ValueError(f"Bước không hợp lệ: {stage}")
+
+    rows_in = len(args[0]) if args and hasattr(args[0], "__len__") and not isinstance(args[0], str) else None
+    rss_before = peak_rss_mb()
+    result, stats = measure(fn, *args, **kwargs)
+    rows_out = _rows_out(result)
+    return {
+        "stage": stage,
+        **stats,
+        "rss_growth_mb": None if rss_before is None else round(stats["peak_rss_mb"] - rss_before, 1),
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+    }
+
+
+def _rows_out(result):
+    if isinstance(result, dict):
+        if "confidence" in result:
+            return len(result["confidence"])  # cluster_stability
+        return len(result["rfm"])  # pipeline / segment_partitions
+    if isinstance(result, tuple):
+        result = result[0]
+    if hasattr(result, "labels_"):
+        return len(result.labels_)
+    return len(result) if hasattr(result, "__len__") else None
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> dict:
+    import numpy
+    import pandas
+    import sklearn
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+
+
+def run(scales, stages=STAGES, seed: int = 0, n_clusters: int = 4, columnar: bool = False,
+        chunksize: int = 200_000, repeat: int = 1) -> dict:
+    results = []
+    for n_rows in scales:
+        path = dataset_path(n_rows, seed)
+        for stage in stages:
+            runs = [run_isolated(_run_stage, path, stage, n_clusters, columnar, chunksize) for _ in range(repeat)]
+            errors = [r for r in runs if "error" in r]
+            if errors:
+                results.append({"rows": n_rows, "stage": stage, "error": errors[0]["error"]})
+                continue
+            # Lấy lần chạy nhanh nhất để giảm nhiễu
+            best = min(runs, key=lambda r: r["seconds"])
+            results.append({"rows": n_rows, **best})
+            print(f"{n_rows:>12,} {stage:<34} {best['seconds']:>9.3f}s {best['traced_peak_mb']:>9.1f} MB")
+    return {
+        "meta": {
+            **_environment(),
+            "seed": seed,
+            "n_clusters": n_clusters,
+            "columnar": columnar,
+            "chunksize": chunksize,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="Các quy mô, vd. 100k,1m,10m,50m")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Các bước cần đo, cách nhau bởi dấu phẩy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=4, help="Số cụm cho train_kmeans / pipeline")
+    parser.add_argument("--columnar", action="store_true", help="Đọc dữ liệu qua Parquet (load_raw_data columnar_cache)")
+    parser.add_argument("--chunksize", type=int, default=200_000, help="chunksize cho pipeline theo chunk")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần chạy mỗi bước (lấy lần nhanh nhất)")
+    parser.add_argument("--out", default=None, help="File JSON kết quả (mặc định benchmarks/results/<thời điểm>_<commit>.json)")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Bước không hợp lệ: {sorted(unknown)}")
+    scales = [parse_rows(s) for s in args.scales.split(",") if s.strip()]
+
+    report = run(scales, stages, seed=args.seed, n_clusters=args.k, columnar=args.columnar,
+                 chunksize=args.chunksize, repeat=args.repeat)
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}_{report['meta']['commit'] or 'nocommit'}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nĐã ghi kết quả: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# benchmarks/scoring.py
+"""
+Đo thông lượng / độ trễ của scoring API (scoring.py):
+    - api:  SegmentScorer.score_records theo lô (gọi trực tiếp trong Python)
+    - http: HTTP service chạy nội bộ, nhiều client đồng thời (keep-alive), mỗi
+            request một lô khách hàng; báo p50 / p95 / p99, request/s và khách hàng/s
+
+    python -m benchmarks.scoring models/scorer.joblib
+    python -m benchmarks.scoring data/online_retail_II.csv --k 4     # tạo scorer từ CSV trước
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+API_BATCH_SIZES = (1, 10, 100, 1_000, 10_000, 100_000)
+HTTP_BATCH_SIZES = (1, 100, 1_000)
+HTTP_CONCURRENCY = (1, 4, 16)
+
+
+def make_records(n: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    recency = rng.integers(1, 700, n)
+    frequency = rng.geometric(0.2, n)
+    monetary = np.round(rng.lognormal(6.5, 1.2, n), 2)
+    return [
+        {"customer_id": i, "recency": int(r), "frequency": int(f), "monetary": float(m)}
+        for i, (r, f, m) in enumerate(zip(recency, frequency, monetary))
+    ]
+
+
+def _percentiles(latencies_s: list[float]) -> dict:
+    ms = np.asarray(latencies_s) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 3) for q in (50, 95, 99)}
+
+
+def bench_api(scorer, batch_sizes=API_BATCH_SIZES, min_seconds: float = 0.5) -> list[dict]:
+    results = []
+    for batch in batch_sizes:
+        records = make_records(batch)
+        latencies = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_seconds or len(latencies) < 3:
+            t = time.perf_counter()
+            scorer.score_records(records)
+            latencies.append(time.perf_counter() - t)
+        total = sum(latencies)
+        results.append({
+            "batch": batch,
+            "calls": len(latencies),
+            **_percentiles(latencies),
+            "customers_per_s": round(batch * len(latencies) / total),
+        })
+    return results
+
+
+def _client(port: int, body: bytes, n_requests: int) -> list[float]:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    try:
+        for _ in range(n_requests):
+            t = time.perf_counter()
+            conn.request("POST", "/score", body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}")
+            latencies.append(time.perf_counter() - t)
+    finally:
+        conn.close()
+    return latencies
+
+
+def bench_http(scorer, batch_sizes=HTTP_BATCH_SIZES, concurrency=HTTP_CONCURRENCY, requests_per_client: int = 200) -> list[dict]:
+    from scoring import make_server
+
+    server = make_server(scorer, port=0)
+    port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    results = []
+    try:
+        for batch in batch_sizes:
+            body = json.dumps({"customers": make_records(batch)}).encode()
+            n_requests = max(10, requests_per_client // max(1, batch // 100))
+            for clients in concurrency:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=clients) as pool:
+                    parts = list(pool.map(lambda _: _client(port, body, n_requests), range(clients)))
+                elapsed = time.perf_counter() - start
+                latencies = [lat for part in parts for lat in part]
+                results.append({
+                    "batch": batch,
+                    "clients": clients,
+                    "requests": len(latencies),
+                    **_percentiles(latencies),
+                    "requests_per_s": round(len(latencies) / elapsed, 1),
+                    "customers_per_s": round(batch * len(latencies) / elapsed),
+                })
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def main() -> None:
+    from scoring import SegmentScorer, build_scorer
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="File scorer (.joblib) hoặc CSV Online Retail II")
+    parser.add_argument("--k", type=int, default=4, help="Số cụm khi tạo scorer từ CSV")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    if args.source.endswith(".joblib"):
+        scorer = SegmentScorer.load(args.source)
+    else:
+        scorer = build_scorer(args.source, n_clusters=args.k, model_store_root=None)
+
+    report = {"api": bench_api(scorer), "http": bench_http(scorer)}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print("Python API (score_records)")
+    print(f"{'batch':>8}{'p50 ms':>10}{'p99 ms':>10}{'khách/s':>14}")
+    for r in report["api"]:
+        print(f"{r['batch']:>8,}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['customers_per_s']:>14,}")
+    print("\nHTTP /score")
+    print(f"{'batch':>8}{'clients':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'khách/s':>14}")
+    for r in report["http"]:
+        print(f"{r['batch']:>8,}{r['clients']:>9}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['requests_per_s']:>10.1f}{r['customers_per_s']:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# benchmarks/synthetic.py
+"""
+Sinh dữ liệu giả lập theo đúng schema Online Retail II (Kaggle), có tính tất định
+(cùng n_rows + seed -> cùng file) để đo hiệu năng `utils.py` ở nhiều quy mô.
+
+Dữ liệu có các đặc điểm của file thật:
+    - Hoá đơn trả hàng (Invoice bắt đầu bằng "C", Quantity âm)
+    - Dòng có Price = 0, hoá đơn không có Customer ID (khách vãng lai)
+    - Dòng trùng hoàn toàn nằm liền nhau
+    - Phân bố lệch kiểu Pareto: ~20% khách hàng / sản phẩm chiếm ~70% giao dịch
+    - Các dòng của một hoá đơn nằm liền nhau, hoá đơn tăng dần theo thời gian
+
+    python -m benchmarks.synthetic data/synthetic_1m.csv --rows 1000000
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = ["Invoice", "StockCode", "Description", "Quantity", "InvoiceDate", "Price", "Customer ID", "Country"]
+COUNTRIES = [
+    "United Kingdom", "EIRE", "Germany", "France", "Netherlands", "Spain",
+    "Switzerland", "Belgium", "Portugal", "Australia", "Norway", "Sweden",
+]
+START_DATE = pd.Timestamp("2009-12-01")
+SPAN_DAYS = 730
+
+MEAN_LINES_PER_INVOICE = 20
+RETURN_RATE = 0.02          # tỉ lệ hoá đơn trả hàng
+GUEST_RATE = 0.2            # tỉ lệ hoá đơn không có Customer ID
+ZERO_PRICE_RATE = 0.003     # tỉ lệ dòng có Price = 0
+DUPLICATE_RATE = 0.01       # tỉ lệ dòng bị ghi trùng
+ZIPF_OFFSET = 0.005         # trọng số ~ 1/(hạng + 0.5% số phần tử): 20% đầu chiếm ~70% lượt chọn
+
+
+def default_sizes(n_rows: int) -> tuple[int, int]:
+    """
+    Số khách hàng và sản phẩm mặc định theo quy mô (xấp xỉ tỉ lệ của file thật,
+    ~1M dòng có ~6k khách hàng và ~5k sản phẩm).
+    """
+    n_customers = max(100, n_rows // 170)
+    n_products = int(min(50_000, max(500, 5 * np.sqrt(n_rows))))
+    return n_customers, n_products
+
+
+def _pareto_cdf(n_items: int) -> np.ndarray:
+    """
+    Hàm phân phối tích luỹ kiểu Zipf có dịch chuyển: chỉ số nhỏ được chọn nhiều hơn,
+    nhưng không phần tử nào chiếm quá vài % tổng số lượt.
+    """
+    weights = 1.0 / (np.arange(n_items) + max(1.0, n_items * ZIPF_OFFSET))
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _pareto_choice(rng, cdf: np.ndarray, size: int) -> np.ndarray:
+    return np.minimum(np.searchsorted(cdf, rng.random(size), side="right"), len(cdf) - 1)
+
+
+class _Catalog:
+    """
+    Thuộc tính cố định của sản phẩm và khách hàng (sinh một lần từ seed).
+    """
+
+    def __init__(self, n_customers: int, n_products: int, seed: int):
+        rng = np.random.default_rng([seed, 0])
+        self.n_customers = n_customers
+        self.n_products = n_products
+        self.customer_cdf = _pareto_cdf(n_customers)
+        self.product_cdf = _pareto_cdf(n_products)
+        self.stock_codes = np.array([f"{20000 + i}" for i in range(n_products)], dtype=object)
+        self.descriptions = np.array([f"PRODUCT {i:05d}" for i in range(n_products)], dtype=object)
+        self.prices = np.round(rng.lognormal(mean=1.0, sigma=0.8, size=n_products), 2)
+        self.customer_ids = 12346 + rng.permutation(n_customers)
+        country_idx = np.where(
+            rng.random(n_customers) < 0.9, 0, rng.integers(1, len(COUNTRIES), n_customers)
+        )
+        self.customer_countries = np.array(COUNTRIES, dtype=object)[country_idx]
+
+
+def _generate_chunk(catalog: _Catalog, n_rows: int, first_invoice: int, invoice_offset: int, total_invoices: int, rng) -> tuple[pd.DataFrame, int]:
+    # Số dòng mỗi hoá đơn ~ phân bố hình học, cắt cho đủ n_rows
+    sizes = rng.geometric(1.0 / MEAN_LINES_PER_INVOICE, size=n_rows // MEAN_LINES_PER_INVOICE * 2 + 10)
+    cum = np.cumsum(sizes)
+    n_invoices = int(np.searchsorted(cum, n_rows) + 1)
+    sizes = sizes[:n_invoices]
+    sizes[-1] -= cum[n_invoices - 1] - n_rows
+
+    invoice_no = first_invoice + np.arange(n_invoices)
+    is_return = rng.random(n_invoices) < RETURN_RATE
+    customer_idx = _pareto_choice(rng, catalog.customer_cdf, n_invoices)
+    is_guest = rng.random(n_invoices) < GUEST_RATE
+
+    # Hoá đơn tăng dần theo thời gian, trải đều trong SPAN_DAYS ngày
+    progress = np.minimum((invoice_no - invoice_offset) / max(total_invoices, 1), 1.0)
+    seconds = (progress * SPAN_DAYS * 86400).astype(np.int64)
+    # Giờ bán hàng 8h-18h trong ngày
+    seconds = seconds // 86400 * 86400 + 8 * 3600 + rng.integers(0, 10 * 3600, n_invoices)
+    invoice_dates = (START_DATE + pd.to_timedelta(seconds, unit="s")).strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+
+    line_invoice = np.repeat(np.arange(n_invoices), sizes)
+    # Dịch chỉ số sản phẩm theo vị trí dòng trong hoá đơn để một hoá đơn ít khi
+    # lặp lại cùng sản phẩm (trùng lặp chỉ đến từ DUPLICATE_RATE)
+    line_in_invoice = np.arange(n_rows) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    product = (_pareto_choice(rng, catalog.product_cdf, n_rows) + line_in_invoice) % catalog.n_products
+    quantity = rng.geometric(0.15, n_rows).astype(np.int64)
+    quantity = np.where(is_return[line_invoice], -quantity, quantity)
+    price = np.where(rng.random(n_rows) < ZERO_PRICE_RATE, 0.0, catalog.prices[product])
+
+    invoice_labels = np.char.add(np.where(is_return, "C", ""), invoice_no.astype(str))
+    customer = np.where(is_guest, np.nan, catalog.customer_ids[customer_idx].astype(np.float64))
+    country = np.where(is_guest, "United Kingdom", catalog.customer_countries[customer_idx])
+
+    df = pd.DataFrame({
+        "Invoice": invoice_labels[line_invoice],
+        "StockCode": catalog.stock_codes[product],
+        "Description": catalog.descriptions[product],
+        "Quantity": quantity,
+        "InvoiceDate": invoice_dates[line_invoice],
+        "Price": price,
+        "Customer ID": customer[line_invoice],
+        "Country": country[line_invoice],
+    }, columns=COLUMNS)
+
+    # Ghi trùng một số dòng ngay sau dòng gốc
+    dup = rng.random(n_rows) < DUPLICATE_RATE
+    if dup.any():
+        order = np.concatenate([np.arange(n_rows), np.flatnonzero(dup)])
+        df = df.iloc[np.sort(order, kind="stable")].reset_index(drop=True)
+    return df, first_invoice + n_invoices
+
+
+def generate_transactions(
+    n_rows: int,
+    seed: int = 0,
+    n_customers: int | None = None,
+    n_products: int | None = None,
+    chunk_rows: int = 1_000_000,
+):
+    """
+    Sinh dữ liệu theo từng chunk (iterator các DataFrame) để tạo được file rất lớn
+    mà không cần giữ hết trong RAM. Số dòng thực tế lớn hơn n_rows ~DUPLICATE_RATE
+    do có dòng trùng.
+    """
+    default_customers, default_products = default_sizes(n_rows)
+    catalog = _Catalog(n_customers or default_customers, n_products or default_products, seed)
+    total_invoices = max(1, n_rows // MEAN_LINES_PER_INVOICE)
+    invoice_offset = 489434  # số hoá đơn đầu tiên của file thật
+    next_invoice = invoice_offset
+
+    produced = 0
+    chunk_index = 0
+    while produced < n_rows:
+        rows = min(chunk_rows, n_rows - produced)
+        rng = np.random.default_rng([seed, 1, chunk_index])
+        df, next_invoice = _generate_chunk(catalog, rows, next_invoice, invoice_offset, total_invoices, rng)
+        yield df
+        produced += rows
+        chunk_index += 1
+
+
+def write_synthetic_csv(path: str, n_rows: int, seed: int = 0, chunk_rows: int = 1_000_000, **kwargs) -> str:
+    """
+    Ghi dữ liệu giả lập ra CSV (ghi từng chunk). Trả về đường dẫn file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    for i, chunk in enumerate(generate_transactions(n_rows, seed=seed, chunk_rows=chunk_rows, **kwargs)):
+        chunk.to_csv(tmp, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def parse_rows(text: str) -> int:
+    """
+    "100k" -> 100_000, "1m" -> 1_000_000, "50M" -> 50_000_000.
+    """
+    text = text.strip().lower().replace("_", "")
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="File CSV đầu ra")
+    parser.add_argument("--rows", default="1m", help="Số dòng, vd. 100k, 1m, 50m")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_synthetic_csv(args.path, parse_rows(args.rows), seed=args.seed)
+    print(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# charts.py
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+
+# =========================
+# Biểu đồ phân tán theo cụm cho số khách hàng lớn
+# =========================
+
+# Dưới ngưỡng này vẽ SVG như cũ; từ ngưỡng này trở lên chuyển sang WebGL
+WEBGL_THRESHOLD = 5_000
+# Số điểm tối đa gửi xuống trình duyệt; vượt ngưỡng thì lấy mẫu hoặc gộp mật độ
+MAX_POINTS = 30_000
+# Số ô lưới mỗi chiều khi gộp mật độ
+DENSITY_BINS = 60
+# Số điểm ngoại lai luôn giữ lại cho mỗi cụm khi lấy mẫu
+OUTLIERS_PER_CLUSTER = 200
+
+SCATTER_MODES = ("auto", "svg", "webgl", "sample", "density")
+HOVER_COLUMNS = ["Customer ID", "Recency", "Frequency", "Monetary"]
+
+
+def choose_scatter_mode(
+    n_points: int,
+    webgl_threshold: int = WEBGL_THRESHOLD,
+    max_points: int = MAX_POINTS,
+    large_mode: str = "sample",
+) -> str:
+    """
+    Chọn cách vẽ theo số điểm: svg -> webgl -> `large_mode` ("sample" hoặc "density").
+    """
+    if n_points < webgl_threshold:
+        return "svg"
+    if n_points <= max_points:
+        return "webgl"
+    return large_mode
+
+
+def stratified_outlier_sample(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    max_points: int = MAX_POINTS,
+    outliers_per_cluster: int = OUTLIERS_PER_CLUSTER,
+    cluster_col: str = "Cluster",
+    random_state: int = 42,
+) -> pd.DataFrame:
+    """
+    Lấy mẫu theo cụm (tỉ lệ với kích thước cụm, mỗi cụm ít nhất vài điểm) và luôn
+    giữ các điểm xa tâm cụm nhất theo (x, y) để hình dạng và ngoại lai không bị mất.
+    """
+    if len(df) <= max_points:
+        return df
+
+    rng = np.random.default_rng(random_state)
+    xy = df[[x, y]].to_numpy(dtype="float64")
+    clusters = df[cluster_col].to_numpy()
+    keep = np.zeros(len(df), dtype=bool)
+
+    # Khoảng cách chuẩn hoá theo median/IQR của từng cụm
+    for cid in np.unique(clusters):
+        idx = np.flatnonzero(clusters == cid)
+        pts = xy[idx]
+        med = np.median(pts, axis=0)
+        iqr = np.subtract(*np.percentile(pts, [75, 25], axis=0))
+        iqr[iqr == 0] = 1.0
+        dist = np.abs((pts - med) / iqr).max(axis=1)
+        n_out = min(outliers_per_cluster, len(idx))
+        keep[idx[np.argpartition(dist, -n_out)[-n_out:]]] = True
+
+    budget = max(max_points - int(keep.sum()), 0)
+    rest = np.flatnonzero(~keep)
+    if budget and len(rest):
+        # Chia ngân sách theo tỉ lệ kích thước cụm
+        rest_clusters = clusters[rest]
+        cids, counts = np.unique(rest_clusters, return_counts=True)
+        quotas = np.maximum(1, np.floor(counts / counts.sum() * budget).astype(int))
+        for cid, quota in zip(cids, quotas):
+            pool = rest[rest_clusters == cid]
+            keep[rng.choice(pool, size=min(quota, len(pool)), replace=False)] = True
+
+    return df[keep]
+
+
+def density_bins(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    bins: int = DENSITY_BINS,
+    cluster_col: str = "Cluster",
+) -> pd.DataFrame:
+    """
+    Gộp điểm vào lưới bins x bins (chung cho mọi cụm) và đếm số khách hàng mỗi ô
+    theo cụm. Kết quả có tối đa K * bins^2 dòng, không phụ thuộc số khách hàng.
+    """
+    xv = df[x].to_numpy(dtype="float64")
+    yv = df[y].to_numpy(dtype="float64")
+    x_edges = np.linspace(xv.min(), xv.max(), bins + 1)
+    y_edges = np.linspace(yv.min(), yv.max(), bins + 1)
+    xi = np.clip(np.searchsorted(x_edges, xv, side="right") - 1, 0, bins - 1)
+    yi = np.clip(np.searchsorted(y_edges, yv, side="right") - 1, 0, bins - 1)
+
+    binned = (
+        pd.DataFrame({cluster_col: df[cluster_col].to_numpy(), "xi": xi, "yi": yi})
+        .groupby([cluster_col, "xi", "yi"])
+        .size()
+        .reset_index(name="Count")
+    )
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    binned[x] = x_centers[binned["xi"]]
+    binned[y] = y_centers[binned["yi"]]
+    return binned.drop(columns=["xi", "yi"])
+
+
+def cluster_scatter(
+    rfm: pd.DataFrame,
+    x: str,
+    y: str,
+    title: str,
+    mode: str = "auto",
+    webgl_threshold: int = WEBGL_THRESHOLD,
+    max_points: int = MAX_POINTS,
+    large_mode: str = "sample",
+    density_bins_per_axis: int = DENSITY_BINS,
+):
+    """
+    Biểu đồ phân tán x-y tô màu theo cụm, tự giới hạn kích thước payload:
+        - "svg":     px.scatter như cũ (mọi điểm, đủ hover)
+        - "webgl":   như svg nhưng render bằng WebGL
+        - "sample":  WebGL trên mẫu theo cụm (giữ ngoại lai), tối đa max_points điểm
+        - "density": gộp theo lưới, mỗi ô là một điểm có kích thước theo số khách hàng
+        - "auto":    chọn theo số khách hàng (xem `choose_scatter_mode`)
+    Trả về (fig, mode thực tế đã dùng).
+    """
+    if mode not in SCATTER_MODES:
+        raise ValueError(f"mode phải là một trong {SCATTER_MODES}, nhận được {mode!r}")
+    if mode == "auto":
+        mode = choose_scatter_mode(len(rfm), webgl_threshold, max_points, large_mode)
+
+    if mode == "density":
+        return _density_scatter(rfm, x, y, title, density_bins_per_axis), mode
+
+    data = rfm
+    if mode == "sample":
+        data = stratified_outlier_sample(rfm, x, y, max_points=max_points)
+        title = f"{title} (mẫu {len(data):,}/{len(rfm):,} khách hàng)"
+
+    fig = px.scatter(
+        data,
+        x=x,
+        y=y,
+        color="Cluster",
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        hover_data=HOVER_COLUMNS,
+        title=title,
+        template='plotly_white',
+        render_mode="svg" if mode == "svg" else "webgl",
+    )
+    return fig, mode
+
+
+def _density_scatter(rfm: pd.DataFrame, x: str, y: str, title: str, bins: int):
+    binned = density_bins(rfm, x, y, bins=bins)
+    palette = px.colors.qualitative.Set2
+    max_count = max(int(binned["Count"].max()), 1) if len(binned) else 1
+
+    fig = go.Figure()
+    for i, (cid, part) in enumerate(binned.groupby("Cluster", sort=True)):
+        fig.add_trace(go.Scattergl(
+            x=part[x],
+            y=part[y],
+            mode="markers",
+            name=f"Cụm {cid}",
+            marker={
+                "color": palette[i % len(palette)],
+                # Kích thước theo log số khách hàng trong ô
+                "size": 4 + 16 * np.log1p(part["Count"]) / np.log1p(max_count),
+                "opacity": 0.7,
+            },
+            customdata=part[["Count"]],
+            hovertemplate=f"{x}: %{{x:.1f}}<br>{y}: %{{y:.1f}}<br>Số khách hàng: %{{customdata[0]}}<extra>Cụm {cid}</extra>",
+        ))
+    fig.update_layout(
+        title=f"{title} (mật độ, {len(rfm):,} khách hàng)",
+        template='plotly_white',
+        xaxis_title=x,
+        yaxis_title=y,
+        legend_title_text="Cluster",
+    )
+    return fig
+
+
+def figure_payload_bytes(fig) -> int:
+    """
+    Kích thước JSON của biểu đồ (xấp xỉ lượng dữ liệu gửi xuống trình duyệt).
+    """
+    return len(fig.to_json())
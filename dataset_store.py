@@ -0,0 +1,311 @@
+# dataset_store.py
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import LRUCache, content_fingerprint, fingerprint_source
+
+
+# =========================
+# Kho dữ liệu dùng chung toàn server (mọi session Streamlit)
+# =========================
+
+def freeze(value):
+    """
+    Khoá ghi các mảng numpy trong kết quả (kể cả lồng trong tuple / list / dict) trước khi
+    dùng chung. DataFrame / Series không cần: với copy-on-write của pandas, mỗi session
+    nhận bản `copy(deep=False)` và mọi thao tác ghi chỉ sao chép cột bị ghi.
+    """
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            freeze(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            freeze(item)
+    return value
+
+
+def readonly_view(value):
+    """
+    View không sao chép dữ liệu của một kết quả dùng chung (DataFrame / Series: bản
+    `copy(deep=False)`; tuple: view của từng phần tử; đối tượng khác giữ nguyên).
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(readonly_view(item) for item in value)
+    return value
+
+
+def estimate_nbytes(value) -> int:
+    """
+    Ước lượng bộ nhớ của một kết quả (không tính object Python; mảng dùng chung giữa
+    nhiều kết quả bị đếm lặp).
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(item) for item in value.values())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if hasattr(value, "__dict__"):
+        # PagedTable, SalesCube, model sklearn, ...: chỉ tính các mảng / bảng là thuộc tính trực tiếp
+        return sum(
+            estimate_nbytes(attr) for attr in vars(value).values()
+            if isinstance(attr, (np.ndarray, pd.DataFrame, pd.Series))
+        )
+    return 0
+
+
+class _DatasetEntry:
+    def __init__(self, max_artifacts: int):
+        self.artifacts = LRUCache(maxsize=max_artifacts)
+        self.leases: dict = {}  # owner -> lần cuối owner dùng bộ dữ liệu
+        self.pending: set = set()  # future (job tính trước) chưa xong đang ghi vào bộ dữ liệu
+        self.last_used = time.monotonic()
+
+
+class DatasetStore:
+    """
+    Kho kết quả theo bộ dữ liệu, dùng chung toàn tiến trình: mỗi bộ dữ liệu (theo hash
+    nội dung) chỉ có một bản df_clean / rfm / K-Means / ... cho mọi session.
+        - Dùng thay `LRUCache` cho các hàm `*_cached` (tham số `cache=`) và các bước của app:
+          key là tuple (tên bước, fingerprint, ...), kết quả được gom theo fingerprint.
+        - Kết quả được khoá ghi khi lưu (`freeze`), mỗi lần đọc trả về view không sao chép
+          (`readonly_view`). Các bước trong `transient_stages` (mặc định "raw": bảng thô
+          chỉ cần để làm sạch) không được giữ lại.
+        - Đếm tham chiếu: mỗi session / tab gọi `acquire(fingerprint, owner)` mỗi lần chạy;
+          đổi sang bộ dữ liệu khác thì tham chiếu cũ được trả, session đã đóng (không gọi
+          lại trong `lease_seconds`) thì tham chiếu tự hết hạn.
+        - Bộ dữ liệu không còn tham chiếu và không được đọc trong `idle_seconds` bị loại
+          (`evict_idle`, chạy mỗi lần acquire và trên thread nền mỗi `reap_interval` giây),
+          trừ khi còn job tính trước đang chạy cho nó (`hold_until`).
+    Bộ nhớ vì vậy tăng theo số bộ dữ liệu khác nhau đang dùng, không theo số session.
+    """
+
+    def __init__(
+        self,
+        idle_seconds: float = 900,
+        lease_seconds: float | None = None,
+        max_artifacts: int = 64,
+        transient_stages=("raw",),
+        reap_interval: float | None = 60,
+    ):
+        self.idle_seconds = idle_seconds
+        self.lease_seconds = idle_seconds if lease_seconds is None else lease_seconds
+        self.max_artifacts = max_artifacts
+        self.transient_stages = frozenset(transient_stages)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: dict = {}
+        self._owners: dict = {}  # owner -> fingerprint đang giữ
+        self._content_keys: dict = {}  # fingerprint đường dẫn (path + mtime + size) -> hash nội dung
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        if reap_interval:
+            threading.Thread(
+                target=self._reap, args=(reap_interval,), name="dataset-store-reaper", daemon=True
+            ).start()
+
+    # ---- fingerprint & tham chiếu
+
+    def fingerprint(self, source) -> str:
+        """
+        Hash nội dung của nguồn (`utils.content_fingerprint`). Với đường dẫn, hash được nhớ
+        theo (đường dẫn, mtime, kích thước) nên mỗi phiên bản file chỉ đọc để hash một lần.
+        """
+        if not isinstance(source, (str, os.PathLike)):
+            return content_fingerprint(source)
+        path_key = fingerprint_source(source)
+        with self._lock:
+            cached = self._content_keys.get(path_key)
+        if cached is None:
+            cached = content_fingerprint(source)
+            with self._lock:
+                self._content_keys[path_key] = cached
+        return cached
+
+    def acquire(self, fingerprint: str, owner) -> None:
+        """
+        `owner` (vd. (session, tab)) đang dùng bộ dữ liệu `fingerprint`; trả tham chiếu cũ
+        nếu owner vừa đổi bộ dữ liệu. Gọi lại mỗi lần rerun để gia hạn.
+        """
+        now = time.monotonic()
+        with self._lock:
+            previous = self._owners.get(owner)
+            if previous is not None and previous != fingerprint:
+                self._drop_lease(previous, owner, now)
+            entry = self._entry(fingerprint)
+            entry.leases[owner] = now
+            entry.last_used = now
+            self._owners[owner] = fingerprint
+        self.evict_idle(now)
+
+    def release(self, owner) -> None:
+        with self._lock:
+            fingerprint = self._owners.pop(owner, None)
+            if fingerprint is not None:
+                self._drop_lease(fingerprint, owner, time.monotonic())
+
+    def refcount(self, fingerprint: str) -> int:
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            return 0 if entry is None else len(entry.leases)
+
+    def hold_until(self, fingerprint: str, future) -> None:
+        """
+        Không loại bộ dữ liệu `fingerprint` khi `future` (vd. job tính trước) chưa xong, để
+        kết quả đang tính không bị bỏ rồi tính lại; thời gian chờ loại tính từ lúc future xong.
+        """
+        with self._lock:
+            entry = self._entry(fingerprint)
+            if future in entry.pending:
+                return
+            entry.pending.add(future)
+        future.add_done_callback(lambda done: self._release_hold(fingerprint, done))
+
+    def _release_hold(self, fingerprint: str, future) -> None:
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None and future in entry.pending:
+                entry.pending.discard(future)
+                entry.last_used = time.monotonic()
+
+    def _drop_lease(self, fingerprint: str, owner, now: float) -> None:
+        entry = self._entries.get(fingerprint)
+        if entry is not None and entry.leases.pop(owner, None) is not None:
+            # Thời gian chờ loại tính từ lúc tham chiếu cuối được trả
+            entry.last_used = now
+
+    def _entry(self, fingerprint: str) -> _DatasetEntry:
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            entry = self._entries[fingerprint] = _DatasetEntry(self.max_artifacts)
+        return entry
+
+    # ---- loại bộ dữ liệu không dùng
+
+    def evict_idle(self, now: float | None = None) -> list:
+        """
+        Hết hạn các tham chiếu không gia hạn trong `lease_seconds`, rồi loại các bộ dữ liệu
+        không còn tham chiếu và không được đọc trong `idle_seconds`. Trả về các fingerprint bị loại.
+        """
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            for fingerprint, entry in list(self._entries.items()):
+                for owner, seen in list(entry.leases.items()):
+                    if now - seen > self.lease_seconds:
+                        del entry.leases[owner]
+                        self._owners.pop(owner, None)
+                if not entry.leases and not entry.pending and now - entry.last_used > self.idle_seconds:
+                    del self._entries[fingerprint]
+                    evicted.append(fingerprint)
+            self.evictions += len(evicted)
+        return evicted
+
+    def _reap(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    # ---- giao diện giống LRUCache (cho `cache=` của utils.*_cached)
+
+    def get_or_compute(self, key, compute):
+        """
+        Kết quả của bước `key` = (tên bước, fingerprint, ...), tính đúng một lần cho mọi session.
+        """
+        stage_name, fingerprint = key[0], key[1]
+        if stage_name in self.transient_stages:
+            return compute()
+        with self._lock:
+            entry = self._entry(fingerprint)
+            entry.last_used = time.monotonic()
+            found = key in entry.artifacts
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        value = entry.artifacts.get_or_compute(key, lambda: freeze(compute()))
+        return readonly_view(value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key[1])
+            if entry is None or key not in entry.artifacts:
+                return default
+            entry.last_used = time.monotonic()
+            return readonly_view(entry.artifacts.get(key))
+
+    def put(self, key, value) -> None:
+        if key[0] in self.transient_stages:
+            return
+        with self._lock:
+            self._entry(key[1]).artifacts.put(key, freeze(value))
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key[1])
+            return entry is not None and key in entry.artifacts
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(entry.artifacts) for entry in self._entries.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._owners.clear()
+            self.hits = 0
+            self.misses = 0
+
+    # ---- theo dõi
+
+    def stats(self) -> pd.DataFrame:
+        """
+        Mỗi bộ dữ liệu một dòng: số tham chiếu, số kết quả, bộ nhớ ước lượng, số giây từ lần dùng cuối.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._entries.items())
+        rows = []
+        for fingerprint, entry in entries:
+            artifacts = entry.artifacts.values()
+            rows.append({
+                "Dataset": fingerprint[:12],
+                "Refs": len(entry.leases),
+                "Artifacts": len(artifacts),
+                "MB": round(sum(estimate_nbytes(value) for value in artifacts) / 1e6, 1),
+                "IdleSeconds": round(now - entry.last_used, 1),
+            })
+        return pd.DataFrame(rows, columns=["Dataset", "Refs", "Artifacts", "MB", "IdleSeconds"])
+
+
+_DATASET_STORE = None
+_DATASET_STORE_LOCK = threading.Lock()
+
+
+def get_dataset_store() -> DatasetStore:
+    """
+    Kho dùng chung của tiến trình (tạo ở lần gọi đầu).
+    """
+    global _DATASET_STORE
+    with _DATASET_STORE_LOCK:
+        if _DATASET_STORE is None:
+            _DATASET_STORE = DatasetStore()
+        return _DATASET_STORE
@@ -0,0 +1,260 @@
+# model_store.py
+
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from utils import fingerprint_rfm, sampled_silhouette, scale_rfm, sweep_entry, sweep_kmeans, train_kmeans
+
+
+# =========================
+# Kho model (scaler + K-Means) lưu trên đĩa
+# =========================
+
+RFM_FEATURES = ("Recency", "Frequency", "Monetary")
+
+
+def rfm_stats(rfm: pd.DataFrame, features=RFM_FEATURES) -> dict:
+    """
+    Thống kê tóm tắt của bảng RFM, dùng để đo dữ liệu đã thay đổi bao nhiêu.
+    """
+    X = rfm[list(features)].to_numpy(dtype="float64")
+    return {
+        "n_samples": int(len(X)),
+        "mean": X.mean(axis=0).tolist(),
+        "std": X.std(axis=0).tolist(),
+    }
+
+
+def drift_between(old: dict, new: dict) -> float:
+    """
+    Mức thay đổi giữa hai bộ thống kê: max của độ lệch trung bình (tính theo số lần
+    độ lệch chuẩn cũ) và tỉ lệ thay đổi số khách hàng.
+    """
+    old_std = np.where(np.asarray(old["std"]) > 0, old["std"], 1.0)
+    mean_shift = np.abs(np.asarray(new["mean"]) - np.asarray(old["mean"])) / old_std
+    size_change = abs(new["n_samples"] - old["n_samples"]) / max(old["n_samples"], 1)
+    return float(max(mean_shift.max(), size_change))
+
+
+class ModelStore:
+    """
+    Lưu scaler + K-Means đã huấn luyện (joblib) kèm metadata (JSON) trên đĩa.
+    Khoá = fingerprint dữ liệu RFM + K + random_state + engine.
+    Khi tổng dung lượng vượt `max_bytes`, các model lâu không dùng nhất bị xoá.
+    """
+
+    def __init__(self, root: str = ".model_store", max_bytes: int = 500 * 1024**2):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(rfm_fingerprint: str, n_clusters: int, random_state: int, engine: str) -> str:
+        raw = f"{rfm_fingerprint}|k={int(n_clusters)}|rs={int(random_state)}|engine={engine}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    def _model_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.joblib")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        """
+        Nạp {"scaler", "kmeans_model", "meta"} nếu có, ngược lại None.
+        """
+        path = self._model_path(key)
+        try:
+            entry = joblib.load(path)
+            # Cập nhật thời điểm dùng gần nhất cho việc xoá LRU
+            os.utime(path)
+        except FileNotFoundError:
+            # Chưa có, hoặc vừa bị `evict` xoá
+            return None
+        except Exception:
+            # File hỏng / không nạp được (vd. ghi bởi phiên bản thư viện khác): coi như chưa có
+            # và xoá để lần sau huấn luyện lại
+            self._remove(key)
+            return None
+        if not isinstance(entry, dict) or not {"scaler", "kmeans_model", "meta"} <= entry.keys():
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key: str) -> None:
+        for path in (self._model_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def put(self, key: str, scaler, kmeans_model, meta: dict) -> None:
+        meta = {**meta, "key": key, "saved_at": time.time()}
+        entry = {"scaler": scaler, "kmeans_model": kmeans_model, "meta": meta}
+
+        # Ghi ra file tạm rồi đổi tên để không ai đọc phải file ghi dở
+        tmp = f"{self._model_path(key)}.tmp"
+        joblib.dump(entry, tmp)
+        os.replace(tmp, self._model_path(key))
+        with open(f"{self._meta_path(key)}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{self._meta_path(key)}.tmp", self._meta_path(key))
+
+        self.evict(keep=key)
+
+    def entries(self) -> list[dict]:
+        """
+        Metadata của mọi model đang lưu.
+        """
+        metas = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, name), encoding="utf-8") as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return metas
+
+    def evict(self, keep: str | None = None) -> None:
+        """
+        Xoá model ít dùng gần đây nhất cho tới khi tổng dung lượng <= max_bytes.
+        """
+        files = []
+        for name in os.listdir(self.root):
+            if name.endswith(".joblib"):
+                path = os.path.join(self.root, name)
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, name[: -len(".joblib")]))
+        total = sum(size for _, size, _ in files)
+        for _, size, key in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            total -= size
+
+    def find_warm_start(self, stats: dict, n_clusters: int, random_state: int, engine: str, tolerance: float):
+        """
+        Tìm model cùng K / random_state / engine có dữ liệu gần nhất với `stats`
+        (drift <= tolerance). Trả về entry hoặc None.
+        """
+        candidates = [
+            m for m in self.entries()
+            if m.get("n_clusters") == n_clusters
+            and m.get("random_state") == random_state
+            and m.get("engine") == engine
+        ]
+        best = min(candidates, key=lambda m: drift_between(m["stats"], stats), default=None)
+        if best is None or drift_between(best["stats"], stats) > tolerance:
+            return None
+        return self.get(best["key"])
+
+    def _warm_start_init(self, entry: dict, scaler):
+        """
+        Đưa tâm cụm đã lưu (theo scaler cũ) sang không gian chuẩn hoá của scaler mới.
+        """
+        centers = entry["kmeans_model"].cluster_centers_
+        return scaler.transform(entry["scaler"].inverse_transform(centers))
+
+    def fit_or_load(
+        self,
+        rfm: pd.DataFrame,
+        n_clusters: int = 4,
+        random_state: int = 42,
+        engine: str = "kmeans",
+        features=RFM_FEATURES,
+        warm_start_tolerance: float = 0.1,
+    ) -> dict:
+        """
+        Trả về {"X_scaled", "scaler", "kmeans_model", "source"} với source là:
+            - "store":      dữ liệu khớp hoàn toàn, nạp model đã lưu
+            - "warm_start": dữ liệu thay đổi ít, huấn luyện từ tâm cụm đã lưu (n_init=1)
+            - "fit":        huấn luyện từ đầu
+        Model mới huấn luyện được lưu lại vào store.
+        """
+        fp = fingerprint_rfm(rfm, features)
+        key = self.make_key(fp, n_clusters, random_state, engine)
+        entry = self.get(key)
+        if entry is not None:
+            X_scaled = entry["scaler"].transform(rfm[list(features)].values)
+            return {"X_scaled": X_scaled, "scaler": entry["scaler"], "kmeans_model": entry["kmeans_model"], "source": "store"}
+
+        X_scaled, scaler = scale_rfm(rfm, features)
+        stats = rfm_stats(rfm, features)
+        warm = self.find_warm_start(stats, n_clusters, random_state, engine, warm_start_tolerance)
+        init = None if warm is None else self._warm_start_init(warm, scaler)
+        model = train_kmeans(X_scaled, n_clusters=n_clusters, random_state=random_state, engine=engine, init=init)
+
+        self.put(key, scaler, model, self._meta(fp, n_clusters, random_state, engine, stats, model))
+        return {
+            "X_scaled": X_scaled,
+            "scaler": scaler,
+            "kmeans_model": model,
+            "source": "fit" if warm is None else "warm_start",
+        }
+
+    def load_or_sweep(
+        self,
+        rfm: pd.DataFrame,
+        X_scaled,
+        scaler,
+        k_values,
+        random_state: int = 42,
+        engine: str = "kmeans",
+        features=RFM_FEATURES,
+        warm_start_tolerance: float = 0.1,
+    ) -> dict:
+        """
+        Như `utils.sweep_kmeans` nhưng nạp các K đã có trong store, chỉ huấn luyện
+        (song song, có warm-start nếu được) các K còn thiếu rồi lưu lại.
+        """
+        fp = fingerprint_rfm(rfm, features)
+        sweep = {}
+        for k in k_values:
+            entry = self.get(self.make_key(fp, k, random_state, engine))
+            if entry is None:
+                continue
+            silhouette = entry["meta"].get("silhouette")
+            if silhouette is None:
+                # Model lưu từ pipeline (không qua sweep) chưa có silhouette
+                silhouette = sampled_silhouette(X_scaled, entry["kmeans_model"].labels_, random_state=random_state)
+            sweep[k] = sweep_entry(entry["kmeans_model"], silhouette)
+
+        missing = [k for k in k_values if k not in sweep]
+        if not missing:
+            return sweep
+
+        stats = rfm_stats(rfm, features)
+        inits = {}
+        for k in missing:
+            warm = self.find_warm_start(stats, k, random_state, engine, warm_start_tolerance)
+            if warm is not None:
+                inits[k] = self._warm_start_init(warm, scaler)
+
+        fitted = sweep_kmeans(X_scaled, k_values=missing, random_state=random_state, engine=engine, inits=inits)
+        for k, result in fitted.items():
+            meta = self._meta(fp, k, random_state, engine, stats, result["model"])
+            meta["silhouette"] = result["silhouette"]
+            self.put(self.make_key(fp, k, random_state, engine), scaler, result["model"], meta)
+        sweep.update(fitted)
+        return dict(sorted(sweep.items()))
+
+    @staticmethod
+    def _meta(fp: str, n_clusters: int, random_state: int, engine: str, stats: dict, model) -> dict:
+        return {
+            "rfm_fingerprint": fp,
+            "n_clusters": int(n_clusters),
+            "random_state": int(random_state),
+            "engine": engine,
+            "stats": stats,
+            "inertia": float(model.inertia_),
+        }
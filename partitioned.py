@@ -0,0 +1,269 @@
+# partitioned.py
+
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from profiling import instrumented, stage
+from segments import compute_cluster_means, rank_clusters, segment_name
+from utils import (
+    _limit_threads,
+    _parallel_plan,
+    _process_pool,
+    compute_rfm,
+    sampled_silhouette,
+    scale_rfm,
+    train_kmeans,
+)
+
+
+# =========================
+# Phân cụm RFM theo từng phân vùng (quốc gia, cửa hàng, ...) song song
+# =========================
+
+class PartitionedTransactions:
+    """
+    Giao dịch đã làm sạch, xếp theo phân vùng chỉ trong một lần duyệt:
+    chỉ giữ các cột RFM cần, mỗi cột là một mảng số (Invoice mã hoá thành int64,
+    InvoiceDate lưu int64 theo đơn vị gốc), phân vùng i nằm ở [offsets[i], offsets[i+1]).
+    `to_shared_memory` chép các mảng vào một khối shared memory duy nhất để các tiến trình
+    con đọc trực tiếp (không pickle DataFrame); chỉ mô tả vị trí các cột được gửi đi.
+    """
+
+    def __init__(self, labels: pd.Index, offsets: np.ndarray, columns: dict, date_unit: str):
+        self.labels = labels
+        self.offsets = offsets
+        self.columns = columns
+        self.date_unit = date_unit
+        self._shm = None
+        self._layout = None
+
+    @classmethod
+    def from_transactions(cls, df_clean: pd.DataFrame, key: str = "Country") -> "PartitionedTransactions":
+        """
+        Dòng có `key` bị thiếu không thuộc phân vùng nào và bị bỏ qua.
+        """
+        codes, labels = pd.factorize(df_clean[key], sort=True)
+        order = np.argsort(codes, kind="stable")
+        order = order[np.searchsorted(codes[order], 0):]  # bỏ mã -1 (thiếu key)
+        counts = np.bincount(codes[order], minlength=len(labels))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        dates = df_clean["InvoiceDate"].to_numpy()
+        date_unit = np.datetime_data(dates.dtype)[0]
+        sources = {
+            "Customer ID": df_clean["Customer ID"].to_numpy(dtype="int64"),
+            "Invoice": pd.factorize(df_clean["Invoice"])[0].astype(np.int64),
+            "InvoiceDate": dates.view("int64"),
+            "TotalPrice": df_clean["TotalPrice"].to_numpy(dtype="float64"),
+        }
+        columns = {col: np.take(values, order) for col, values in sources.items()}
+        return cls(pd.Index(labels, name=key), offsets, columns, date_unit)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def partition_frame(self, i: int) -> pd.DataFrame:
+        """
+        Giao dịch của phân vùng i dưới dạng DataFrame (cột như `compute_rfm` cần).
+        """
+        return _frame_from_columns(self.columns, self.offsets[i], self.offsets[i + 1], self.date_unit)
+
+    def to_shared_memory(self) -> dict:
+        """
+        Chép các cột vào shared memory (một lần) và trả về mô tả (tên khối, vị trí từng cột) cho tiến trình con.
+        Gọi `release()` khi xong để giải phóng khối nhớ.
+        """
+        if self._shm is None:
+            total = sum(a.nbytes for a in self.columns.values())
+            self._shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+            layout, offset = [], 0
+            for col, values in self.columns.items():
+                view = np.ndarray(values.shape, dtype=values.dtype, buffer=self._shm.buf, offset=offset)
+                view[:] = values
+                layout.append((col, values.dtype.str, offset, len(values)))
+                offset += values.nbytes
+                del view
+            self._layout = layout
+        return {"name": self._shm.name, "layout": self._layout, "date_unit": self.date_unit}
+
+    def release(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+def _frame_from_columns(columns: dict, start: int, stop: int, date_unit: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Customer ID": columns["Customer ID"][start:stop],
+        "Invoice": columns["Invoice"][start:stop],
+        "InvoiceDate": columns["InvoiceDate"][start:stop].view(f"datetime64[{date_unit}]"),
+        "TotalPrice": columns["TotalPrice"][start:stop],
+    })
+
+
+def _segment_partition(
+    label,
+    df_part: pd.DataFrame,
+    snapshot_date: pd.Timestamp,
+    n_clusters: int,
+    engine: str,
+    random_state: int,
+    silhouette_sample_size: int | None,
+) -> dict:
+    """
+    RFM + chuẩn hoá + K-Means cho một phân vùng (giống `run_rfm_kmeans_pipeline` trên
+    riêng các giao dịch của phân vùng, nhưng Recency tính theo snapshot_date chung).
+    K = min(n_clusters, số khách hàng) để phân vùng nhỏ vẫn phân cụm được.
+    """
+    start = time.perf_counter()
+    rfm, _ = compute_rfm(df_part, snapshot_date=snapshot_date)
+    X_scaled, scaler = scale_rfm(rfm)
+    k = min(n_clusters, len(rfm))
+    kmeans_model = train_kmeans(X_scaled, n_clusters=k, random_state=random_state, engine=engine)
+    rfm["Cluster"] = kmeans_model.labels_
+
+    means = compute_cluster_means(rfm)
+    ranks = rank_clusters(means)
+    rfm["Rank"] = rfm["Cluster"].map(ranks).astype("int64")
+    rfm["Segment"] = rfm["Rank"].map(segment_name)
+    rfm.insert(0, "Partition", label)
+
+    clusters = means.reset_index()
+    clusters.insert(0, "Partition", label)
+    clusters.insert(2, "Rank", clusters["Cluster"].map(ranks).astype("int64"))
+    clusters.insert(3, "Segment", clusters["Rank"].map(segment_name))
+    clusters.insert(4, "Customers", clusters["Cluster"].map(rfm["Cluster"].value_counts()).astype("int64"))
+
+    summary = {
+        "Partition": label,
+        "Rows": len(df_part),
+        "Customers": len(rfm),
+        "Revenue": float(df_part["TotalPrice"].sum()),
+        "K": k,
+        "Inertia": float(kmeans_model.inertia_),
+        "Silhouette": sampled_silhouette(X_scaled, kmeans_model.labels_, silhouette_sample_size, random_state),
+        "Seconds": round(time.perf_counter() - start, 3),
+    }
+    return {
+        "rfm": rfm,
+        "clusters": clusters,
+        "summary": summary,
+        "scaler": scaler,
+        "kmeans_model": kmeans_model,
+    }
+
+
+def _segment_shared_partition(spec: dict, start: int, stop: int, label, n_threads: int, *args) -> dict:
+    """
+    Chạy trong tiến trình con: gắn vào khối shared memory, đọc lát [start, stop) của
+    từng cột (không chép dữ liệu qua pickle) rồi gọi `_segment_partition`.
+    """
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    try:
+        columns = {
+            col: np.ndarray((n,), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for col, dtype, offset, n in spec["layout"]
+        }
+        df_part = _frame_from_columns(columns, start, stop, spec["date_unit"])
+        with _limit_threads(n_threads):
+            return _segment_partition(label, df_part, *args)
+    finally:
+        df_part = columns = None
+        shm.close()
+
+
+@instrumented
+def segment_partitions(
+    df_clean: pd.DataFrame,
+    key: str = "Country",
+    n_clusters: int = 4,
+    engine: str = "kmeans",
+    random_state: int = 42,
+    n_jobs: int | None = None,
+    snapshot_date: pd.Timestamp | None = None,
+    silhouette_sample_size: int | None = 2_000,
+) -> dict:
+    """
+    Phân cụm RFM riêng cho từng giá trị của cột `key` (vd. "Country"): chia giao dịch
+    một lần (`PartitionedTransactions`), rồi RFM + chuẩn hoá + K-Means cho mỗi phân vùng
+    song song trên `n_jobs` tiến trình, dữ liệu truyền qua shared memory.
+    Phân vùng lớn được giao trước để tiến trình không phải chờ phân vùng lớn nhất ở cuối.
+    Recency của mọi phân vùng tính theo cùng snapshot_date (mặc định ngày cuối + 1).
+    Silhouette của mỗi phân vùng tính trên mẫu `silhouette_sample_size` điểm (chỉ để tham khảo,
+    mẫu lớn tốn O(n^2) và lấn át thời gian phân cụm).
+    Trả về dict:
+        - "rfm":       bảng gộp Partition, Customer ID, R, F, M, Cluster, Rank, Segment
+                       (khách mua ở nhiều phân vùng có một dòng cho mỗi phân vùng;
+                       Cluster / Rank chỉ có nghĩa trong phân vùng của nó)
+        - "partitions": mỗi phân vùng một dòng: Rows, Customers, Revenue, K, Inertia,
+                       Silhouette, Seconds (giảm dần theo Revenue)
+        - "clusters":  R-F-M trung bình của từng cụm trong từng phân vùng + Rank, Segment, Customers
+        - "models":    {phân vùng: {"scaler", "kmeans_model"}}
+        - "snapshot_date"
+    """
+    if snapshot_date is None:
+        snapshot_date = df_clean["InvoiceDate"].max() + pd.Timedelta(days=1)
+    with stage("partition: split", rows_in=len(df_clean)):
+        parts = PartitionedTransactions.from_transactions(df_clean, key=key)
+
+    task_args = (snapshot_date, n_clusters, engine, random_state, silhouette_sample_size)
+    sizes = parts.sizes()
+    order = [int(i) for i in np.argsort(-sizes, kind="stable") if sizes[i] > 0]
+    n_jobs, n_threads = _parallel_plan(len(order), n_jobs)
+
+    with stage("partition: segment", rows_in=len(df_clean)):
+        if n_jobs <= 1:
+            results = [_segment_partition(parts.labels[i], parts.partition_frame(i), *task_args) for i in order]
+        else:
+            spec = parts.to_shared_memory()
+            try:
+                with _process_pool(n_jobs) as pool:
+                    futures = [
+                        pool.submit(
+                            _segment_shared_partition, spec, int(parts.offsets[i]), int(parts.offsets[i + 1]),
+                            parts.labels[i], n_threads, *task_args,
+                        )
+                        for i in order
+                    ]
+                    results = [f.result() for f in futures]
+            finally:
+                parts.release()
+
+    return combine_partition_results(results, snapshot_date)
+
+
+def combine_partition_results(results: list[dict], snapshot_date: pd.Timestamp) -> dict:
+    """
+    Gộp kết quả của từng phân vùng thành các bảng của `segment_partitions`.
+    """
+    if not results:
+        raise ValueError("Không có giao dịch nào thuộc phân vùng nào")
+    rfm = pd.concat([r["rfm"] for r in results], ignore_index=True)
+    partitions = (
+        pd.DataFrame([r["summary"] for r in results])
+        .sort_values(["Revenue", "Partition"], ascending=[False, True])
+        .reset_index(drop=True)
+    )
+    clusters = (
+        pd.concat([r["clusters"] for r in results], ignore_index=True)
+        .sort_values(["Partition", "Rank"])
+        .reset_index(drop=True)
+    )
+    models = {
+        r["summary"]["Partition"]: {"scaler": r["scaler"], "kmeans_model": r["kmeans_model"]}
+        for r in results
+    }
+    return {
+        "rfm": rfm,
+        "partitions": partitions,
+        "clusters": clusters,
+        "models": models,
+        "snapshot_date": snapshot_date,
+    }
@@ -0,0 +1,106 @@
+# precompute.py
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# =========================
+# Tính trước trong nền (thread) các bước nặng của từng tab
+# =========================
+
+class PrecomputeJob:
+    """
+    Một chuỗi bước chạy tuần tự trên thread nền: danh sách (nhãn, hàm không tham số).
+    Các hàm nên ghi kết quả vào kho dùng chung (vd. `dataset_store.get_dataset_store()`), nên khi
+    giao diện gọi lại cùng bước thì chỉ còn là tra cứu (hoặc chờ bước đang tính dở).
+    Theo dõi tiến độ qua `completed`, `current`, `done`, `error`.
+    """
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.completed = 0
+        self.current = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def total(self) -> int:
+        return len(self.steps)
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def run(self) -> None:
+        self.started_at = time.perf_counter()
+        try:
+            for label, fn in self.steps:
+                self.current = label
+                fn()
+                self.completed += 1
+        except Exception as e:  # lỗi được giao diện báo lại khi tự chạy bước đó
+            self.error = e
+        finally:
+            self.current = None
+            self.finished_at = time.perf_counter()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Chờ xong (tối đa `timeout` giây); trả về True nếu đã xong.
+        """
+        if self.future is None:
+            return False
+        try:
+            self.future.result(timeout=timeout)
+        except TimeoutError:
+            return False
+        return True
+
+
+class BackgroundPrecompute:
+    """
+    Thread pool nhỏ dùng chung toàn tiến trình (mọi session), chạy các `PrecomputeJob`.
+    Mỗi key (vd. ("ai", fingerprint)) chỉ có một job; gửi lại cùng key khi job đang chạy
+    hoặc đã xong trả về job cũ, job lỗi thì được gửi lại. Giữ tối đa `max_jobs` job gần nhất.
+    """
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 32):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precompute")
+        self._jobs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key, steps) -> PrecomputeJob:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.failed:
+                self._jobs.move_to_end(key)
+                return job
+            job = PrecomputeJob(steps)
+            job.future = self._executor.submit(job.run)
+            self._jobs[key] = job
+            self._prune()
+            return job
+
+    def get(self, key) -> PrecomputeJob | None:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _prune(self) -> None:
+        # Chỉ bỏ các job đã xong; job đang chạy luôn được giữ để theo dõi tiến độ
+        for key in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[key].done:
+                del self._jobs[key]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
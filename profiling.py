@@ -0,0 +1,281 @@
+# profiling.py
+
+import contextvars
+import cProfile
+import functools
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# =========================
+# Đo thời gian / bộ nhớ theo từng bước
+# =========================
+
+# Profiler đang hoạt động của luồng / phiên hiện tại (None = không đo)
+_ACTIVE_PROFILER = contextvars.ContextVar("stage_profiler", default=None)
+
+# Số hàm hiển thị trong báo cáo cProfile của mỗi bước
+TOP_FUNCTIONS = 15
+
+# Các số đo tính cho cả tiến trình (gồm cả việc của phiên / luồng khác chạy cùng lúc)
+PROCESS_WIDE_METRICS = ("cpu_seconds", "peak_mb", "peak_rss_mb")
+
+# tracemalloc dùng chung cả tiến trình: đếm số profiler đang cần nó, chỉ bật ở profiler đầu tiên
+# và chỉ tắt khi profiler cuối cùng xong (không tắt giữa chừng khi phiên khác vẫn đang đo)
+_TRACE_LOCK = threading.Lock()
+_TRACE_USERS = 0
+_TRACE_STARTED = False
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Bộ nhớ RSS đỉnh của tiến trình hiện tại (MB), None nếu hệ điều hành không hỗ trợ.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def count_rows(obj) -> int | None:
+    """
+    Số dòng của đầu vào / kết quả một bước (DataFrame, mảng, (rfm, snapshot_date),
+    model đã fit, dict kết quả pipeline...), None nếu không xác định được.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)) and obj:
+        return count_rows(obj[0])
+    if isinstance(obj, dict):
+        for key in ("rfm", "X_scaled"):
+            if key in obj:
+                return count_rows(obj[key])
+        return None
+    if hasattr(obj, "labels_"):
+        return len(obj.labels_)
+    return None
+
+
+class StageProfiler:
+    """
+    Ghi lại mỗi bước một bản ghi gồm: thời gian thực, thời gian CPU (cả tiến trình,
+    gồm các luồng BLAS/OpenMP), số dòng vào/ra, RSS đỉnh của tiến trình và độ sâu
+    lồng nhau (bước gọi bước con).
+    Chế độ profiler (tuỳ chọn, chậm hơn):
+        - trace_memory:  bộ nhớ cấp phát đỉnh trong từng bước (tracemalloc)
+        - profile_calls: cProfile cho các bước ngoài cùng, lưu top hàm theo cumtime
+    Chỉ seconds và rows_in / rows_out là của riêng bước. cpu_seconds, peak_mb và peak_rss_mb
+    (`PROCESS_WIDE_METRICS`) đo cả tiến trình: khi nhiều phiên Streamlit cùng chạy, chúng
+    gồm cả việc của các phiên khác.
+    """
+
+    def __init__(self, trace_memory: bool = False, profile_calls: bool = False, top_functions: int = TOP_FUNCTIONS):
+        self.trace_memory = trace_memory
+        self.profile_calls = profile_calls
+        self.top_functions = top_functions
+        self.records: list[dict] = []
+        self._stack: list[dict] = []
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int | None = None):
+        """
+        Đo một bước. Yield bản ghi để bên trong có thể đặt thêm "rows_out".
+        Các lần gọi liên tiếp cùng một bước (vd. làm sạch từng chunk) được gộp thành
+        một bản ghi với "calls" là số lần gọi.
+        """
+        previous = self.records[-1] if self.records else None
+        record = {
+            "stage": name,
+            "depth": len(self._stack),
+            "calls": 1,
+            "seconds": None,
+            "cpu_seconds": None,
+            "rows_in": rows_in,
+            "rows_out": None,
+            "peak_mb": None,
+            "peak_rss_mb": None,
+        }
+        self.records.append(record)
+
+        frame = {"start": 0, "peak": 0}
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame = {"start": current, "peak": current}
+        self._stack.append(frame)
+
+        profiler = None
+        if self.profile_calls and record["depth"] == 0:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # đã có profiler khác đang chạy
+                profiler = None
+
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            record["cpu_seconds"] = round(time.process_time() - cpu_start, 4)
+            if profiler is not None:
+                profiler.disable()
+                record["profile"] = self._format_profile(profiler)
+
+            self._stack.pop()
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                stage_peak = max(frame["peak"], peak)
+                record["peak_mb"] = round((stage_peak - frame["start"]) / 1024**2, 1)
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"], stage_peak)
+                tracemalloc.reset_peak()
+            rss = peak_rss_mb()
+            record["peak_rss_mb"] = None if rss is None else round(rss, 1)
+            if self._can_merge(previous, record):
+                self._merge(previous, record)
+
+    def _can_merge(self, previous: dict | None, record: dict) -> bool:
+        return (
+            previous is not None
+            and self.records[-1] is record
+            and previous["stage"] == record["stage"]
+            and previous["depth"] == record["depth"]
+            and previous["seconds"] is not None
+            and "profile" not in previous
+            and "profile" not in record
+        )
+
+    def _merge(self, previous: dict, record: dict) -> None:
+        self.records.pop()
+        previous["calls"] += 1
+        for key in ("seconds", "cpu_seconds"):
+            previous[key] = round(previous[key] + record[key], 4)
+        for key in ("rows_in", "rows_out"):
+            if previous[key] is not None and record[key] is not None:
+                previous[key] += record[key]
+            else:
+                previous[key] = None
+        for key in ("peak_mb", "peak_rss_mb"):
+            if record[key] is not None:
+                previous[key] = max(previous[key] or 0.0, record[key])
+
+    def _format_profile(self, profiler) -> str:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(self.top_functions)
+        return out.getvalue()
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Bảng các bước (tên bước thụt lề theo độ sâu), không gồm báo cáo cProfile.
+        """
+        df = pd.DataFrame(self.records, columns=[
+            "stage", "depth", "calls", "seconds", "cpu_seconds", "rows_in", "rows_out", "peak_mb", "peak_rss_mb",
+        ])
+        df["stage"] = ["  " * d + s for s, d in zip(df["stage"], df["depth"])]
+        return df.drop(columns="depth")
+
+    def total_seconds(self) -> float:
+        """
+        Tổng thời gian của các bước ngoài cùng.
+        """
+        return sum(r["seconds"] or 0.0 for r in self.records if r["depth"] == 0)
+
+
+def current_profiler() -> StageProfiler | None:
+    return _ACTIVE_PROFILER.get()
+
+
+@contextmanager
+def profile_stages(profiler: StageProfiler | None = None, trace_memory: bool = False, profile_calls: bool = False):
+    """
+    Bật đo cho mọi bước (`stage` / hàm có `@instrumented`) chạy bên trong khối with:
+
+        with profile_stages(trace_memory=True) as prof:
+            run_rfm_kmeans_pipeline(path)
+        prof.to_frame()
+    """
+    if profiler is None:
+        profiler = StageProfiler(trace_memory=trace_memory, profile_calls=profile_calls)
+    if profiler.trace_memory:
+        _acquire_tracing()
+    token = _ACTIVE_PROFILER.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _ACTIVE_PROFILER.reset(token)
+        if profiler.trace_memory:
+            _release_tracing()
+
+
+def _acquire_tracing() -> None:
+    global _TRACE_USERS, _TRACE_STARTED
+    with _TRACE_LOCK:
+        if _TRACE_USERS == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _TRACE_STARTED = True
+        _TRACE_USERS += 1
+
+
+def _release_tracing() -> None:
+    global _TRACE_USERS, _TRACE_STARTED
+    with _TRACE_LOCK:
+        _TRACE_USERS -= 1
+        if _TRACE_USERS == 0 and _TRACE_STARTED:
+            # Chỉ tắt tracemalloc nếu chính profiler đã bật nó (không tắt khi bật bằng -X tracemalloc)
+            tracemalloc.stop()
+            _TRACE_STARTED = False
+
+
+@contextmanager
+def stage(name: str, rows_in: int | None = None):
+    """
+    Đo một bước bằng profiler đang hoạt động; không làm gì nếu không có profiler.
+    """
+    profiler = _ACTIVE_PROFILER.get()
+    if profiler is None:
+        yield {}
+        return
+    with profiler.stage(name, rows_in=rows_in) as record:
+        yield record
+
+
+def instrumented(fn=None, *, name: str | None = None):
+    """
+    Decorator cho các hàm xử lý: khi có profiler đang hoạt động, ghi lại một bước
+    với rows_in = số dòng của đối số đầu tiên, rows_out = số dòng của kết quả.
+    Không có profiler thì gọi thẳng hàm (gần như không tốn thêm chi phí).
+    """
+    if fn is None:
+        return functools.partial(instrumented, name=name)
+    stage_name = name or fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiler = _ACTIVE_PROFILER.get()
+        if profiler is None:
+            return fn(*args, **kwargs)
+        first = args[0] if args else next(iter(kwargs.values()), None)
+        with profiler.stage(stage_name, rows_in=count_rows(first)) as record:
+            result = fn(*args, **kwargs)
+            record["rows_out"] = count_rows(result)
+        return result
+
+    return wrapper
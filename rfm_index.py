@@ -0,0 +1,205 @@
+# rfm_index.py
+
+import numpy as np
+import pandas as pd
+
+from segments import ACTION_QUANTILES, RFM_FEATURES
+
+
+# =========================
+# Chỉ mục RFM cho lọc / tra cứu nhanh
+# =========================
+
+# `query` lấy dòng từ chỉ mục khi khoảng hẹp nhất chứa <= 1/_SCAN_FRACTION số dòng,
+# rộng hơn thì quét mask trên cả mảng
+_SCAN_FRACTION = 32
+
+
+class RFMIndex:
+    """
+    Chỉ mục dựng một lần cho mỗi bảng rfm (mỗi bộ dữ liệu, hoặc mỗi K nếu có cột Cluster):
+        - mỗi chỉ số R / F / M: giá trị đã sắp xếp + vị trí dòng tương ứng
+          -> truy vấn khoảng, phân vị, top-N bằng searchsorted, O(log n + số dòng trả về)
+        - Customer ID: bảng băm (pd.Index) -> tra cứu O(1) mỗi khách hàng
+        - Cluster (nếu có): mỗi chỉ số được xếp theo (Cluster, giá trị), offsets[c] là
+          đoạn [start, end) của cụm c -> truy vấn trong một cụm không quét cụm khác
+    Mọi truy vấn trả về vị trí dòng (theo thứ tự của rfm đã reset_index), dùng với
+    `rfm.iloc[...]` hoặc `PagedTable(..., row_mask=index.mask(positions))`.
+    """
+
+    def __init__(self, rfm: pd.DataFrame, features=RFM_FEATURES, id_col: str = "Customer ID",
+                 cluster_col: str | None = "Cluster"):
+        self.rfm = rfm.reset_index(drop=True)
+        self.features = list(features)
+        self._values = {col: self.rfm[col].to_numpy() for col in self.features}
+        self._order = {}
+        self._sorted = {}
+        for col in self.features:
+            order = np.argsort(self._values[col], kind="stable")
+            self._order[col] = order
+            self._sorted[col] = self._values[col][order]
+        self._ids = pd.Index(self.rfm[id_col].to_numpy())
+
+        self.clusters = None
+        if cluster_col is not None and cluster_col in self.rfm.columns:
+            labels = self.rfm[cluster_col].to_numpy()
+            self.clusters = sorted(pd.unique(labels).tolist())
+            self._cluster_order = {}
+            self._cluster_sorted = {}
+            for col in self.features:
+                order = np.lexsort((self._values[col], labels))
+                self._cluster_order[col] = order
+                self._cluster_sorted[col] = self._values[col][order]
+            sorted_labels = labels[self._cluster_order[self.features[0]]]
+            starts = np.searchsorted(sorted_labels, self.clusters, side="left")
+            ends = np.searchsorted(sorted_labels, self.clusters, side="right")
+            self.offsets = {c: (int(s), int(e)) for c, s, e in zip(self.clusters, starts, ends)}
+
+    def __len__(self) -> int:
+        return len(self.rfm)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = list(self._order.values()) + list(self._sorted.values())
+        if self.clusters is not None:
+            arrays += list(self._cluster_order.values()) + list(self._cluster_sorted.values())
+        return sum(a.nbytes for a in arrays)
+
+    def _segment(self, col: str, cluster=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (giá trị đã sắp xếp, vị trí dòng) của `col` trên toàn bảng hoặc trong một cụm.
+        """
+        if col not in self._sorted:
+            raise KeyError(f"Cột không có trong chỉ mục: {col!r}")
+        if cluster is None:
+            return self._sorted[col], self._order[col]
+        if self.clusters is None:
+            raise ValueError("Chỉ mục không có cột Cluster")
+        start, end = self.offsets.get(cluster, (0, 0))
+        return self._cluster_sorted[col][start:end], self._cluster_order[col][start:end]
+
+    def _range_slice(self, values: np.ndarray, low=None, high=None) -> slice:
+        start = 0 if low is None else int(np.searchsorted(values, low, side="left"))
+        end = len(values) if high is None else int(np.searchsorted(values, high, side="right"))
+        return slice(start, max(start, end))
+
+    def count(self, col: str, low=None, high=None, cluster=None) -> int:
+        """
+        Số dòng có low <= col <= high (None = không chặn), O(log n).
+        """
+        values, _ = self._segment(col, cluster)
+        s = self._range_slice(values, low, high)
+        return s.stop - s.start
+
+    def range(self, col: str, low=None, high=None, cluster=None) -> np.ndarray:
+        """
+        Vị trí các dòng có low <= col <= high, xếp tăng dần theo col.
+        """
+        values, order = self._segment(col, cluster)
+        return order[self._range_slice(values, low, high)]
+
+    def query(self, cluster=None, **ranges) -> np.ndarray:
+        """
+        Giao của nhiều khoảng, vd. `query(Monetary=(100, None), Recency=(None, 90))`.
+        Khoảng hẹp nhất (đếm bằng searchsorted) được lấy từ chỉ mục, các khoảng còn lại
+        chỉ kiểm tra trên các dòng đó. Trả về vị trí theo thứ tự dòng của rfm.
+        """
+        ranges = {col: bounds for col, bounds in ranges.items() if bounds != (None, None)}
+        if not ranges:
+            if cluster is None:
+                return np.arange(len(self.rfm))
+            return np.sort(self._segment(self.features[0], cluster)[1])
+        counts = {col: self.count(col, *bounds, cluster=cluster) for col, bounds in ranges.items()}
+        driver = min(counts, key=counts.get)
+        if cluster is None and counts[driver] > len(self.rfm) // _SCAN_FRACTION:
+            # Khoảng quá rộng: quét mask trên cả mảng rẻ hơn sắp xếp lại vị trí
+            return np.flatnonzero(self._in_ranges(self._values, ranges))
+        positions = self.range(driver, *ranges[driver], cluster=cluster)
+        others = {col: bounds for col, bounds in ranges.items() if col != driver}
+        if others:
+            positions = positions[self._in_ranges({col: self._values[col][positions] for col in others}, others)]
+        return np.sort(positions)
+
+    @staticmethod
+    def _in_ranges(values: dict, ranges: dict) -> np.ndarray:
+        """
+        Mask low <= values[col] <= high cho mọi khoảng trong `ranges`.
+        """
+        keep = np.ones(len(next(iter(values.values()))), dtype=bool)
+        for col, (low, high) in ranges.items():
+            if low is not None:
+                keep &= values[col] >= low
+            if high is not None:
+                keep &= values[col] <= high
+        return keep
+
+    def quantile(self, col: str, q: float, cluster=None) -> float:
+        """
+        Phân vị q của col (nội suy tuyến tính như `pd.Series.quantile`), O(1) trên mảng đã sắp xếp.
+        """
+        values, _ = self._segment(col, cluster)
+        if len(values) == 0:
+            return float("nan")
+        pos = (len(values) - 1) * q
+        lo = int(np.floor(pos))
+        hi = min(lo + 1, len(values) - 1)
+        # Nội suy giữa hai giá trị kề nhau bằng đúng công thức của numpy/pandas
+        return float(np.quantile(values[lo:hi + 1].astype("float64"), pos - lo))
+
+    def band(self, col: str, band: str, quantiles=ACTION_QUANTILES, cluster=None) -> np.ndarray:
+        """
+        Vị trí các dòng thuộc dải "low" (<= phân vị thấp), "mid" hoặc "high" (>= phân vị cao)
+        của col, cùng ngưỡng với `segments.action_thresholds` (phân vị tính trên toàn bảng).
+        """
+        low_q, high_q = (self.quantile(col, q) for q in quantiles)
+        values, order = self._segment(col, cluster)
+        if band == "low":
+            return order[:np.searchsorted(values, low_q, side="right")]
+        if band == "high":
+            return order[np.searchsorted(values, high_q, side="left"):]
+        if band == "mid":
+            return order[np.searchsorted(values, low_q, side="right"):np.searchsorted(values, high_q, side="left")]
+        raise ValueError(f"band phải là 'low', 'mid' hoặc 'high', nhận được {band!r}")
+
+    def top_n(self, col: str, n: int, cluster=None, ascending: bool = False) -> np.ndarray:
+        """
+        Vị trí n dòng có col lớn nhất (hoặc nhỏ nhất nếu ascending) trên toàn bảng / trong cụm, O(n).
+        Bằng nhau thì dòng xuất hiện trước trong rfm đứng trước.
+        """
+        values, order = self._segment(col, cluster)
+        n = min(max(int(n), 0), len(order))
+        if ascending:
+            return order[:n]
+        if n == 0:
+            return order[:0]
+        # Đoạn cuối (kể cả các giá trị bằng ngưỡng) xếp lại: giảm dần theo giá trị, rồi theo vị trí dòng
+        start = int(np.searchsorted(values, values[len(values) - n], side="left"))
+        tail = order[start:]
+        return tail[np.lexsort((tail, -values[start:]))][:n]
+
+    def lookup(self, customer_ids) -> np.ndarray:
+        """
+        Vị trí dòng của từng Customer ID (-1 nếu không có), qua bảng băm.
+        Với Customer ID kiểu số nguyên, giá trị không phải số nguyên hợp lệ (chuỗi không phải số,
+        số lẻ, NaN / inf, ngoài khoảng int64) cũng cho -1 thay vì lỗi.
+        """
+        ids = np.atleast_1d(np.asarray(customer_ids))
+        if self._ids.dtype.kind not in "iu" or ids.dtype.kind in "iu":
+            return self._ids.get_indexer(ids)
+        values = pd.to_numeric(pd.Series(ids, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+        valid = np.isfinite(values) & (values == np.round(values)) & (np.abs(values) < 2.0**63)
+        positions = np.full(len(ids), -1, dtype=np.intp)
+        positions[valid] = self._ids.get_indexer(values[valid].astype(np.int64))
+        return positions
+
+    def cluster_size(self, cluster) -> int:
+        start, end = self.offsets[cluster]
+        return end - start
+
+    def mask(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Mask boolean theo thứ tự dòng của rfm (cho `PagedTable` / `render_paged_table`).
+        """
+        mask = np.zeros(len(self.rfm), dtype=bool)
+        mask[positions] = True
+        return mask
@@ -0,0 +1,149 @@
+# rolling_rfm.py
+
+import numpy as np
+import pandas as pd
+
+from profiling import instrumented
+from segments import RFM_FEATURES
+
+
+# =========================
+# RFM theo nhiều mốc thời gian + ma trận chuyển cụm
+# =========================
+
+def month_snapshots(df_clean: pd.DataFrame, freq: str = "MS") -> pd.DatetimeIndex:
+    """
+    Các mốc snapshot: đầu mỗi kỳ `freq` (mặc định đầu tháng) sau giao dịch đầu tiên,
+    cộng mốc cuối = ngày cuối + 1 ngày (giống snapshot mặc định của `compute_rfm`).
+    """
+    first, last = df_clean["InvoiceDate"].min(), df_clean["InvoiceDate"].max()
+    final = last + pd.Timedelta(days=1)
+    snapshots = pd.date_range(start=first, end=final, freq=freq, normalize=True)
+    snapshots = snapshots[(snapshots > first) & (snapshots < final)]
+    return snapshots.append(pd.DatetimeIndex([final])).rename("Snapshot")
+
+
+@instrumented
+def compute_rolling_rfm(df_clean: pd.DataFrame, snapshot_dates=None) -> pd.DataFrame:
+    """
+    R, F, M của mọi khách hàng tại mọi mốc trong `snapshot_dates` (mặc định `month_snapshots`)
+    trong một lần sắp xếp + cộng dồn, thay vì gọi `compute_rfm` trên bản lọc cho từng mốc.
+    Tại mốc s chỉ tính các giao dịch có InvoiceDate < s, nên mỗi dòng bằng đúng
+    `compute_rfm(df_clean[df_clean.InvoiceDate < s], snapshot_date=s)`; khách hàng chưa
+    mua gì trước s không có dòng ở mốc đó.
+    Các bước:
+        - gộp dòng hàng theo (khách hàng, ngày, hoá đơn), đánh dấu lần đầu mỗi hoá đơn xuất hiện
+        - gán mỗi dòng vào mốc đầu tiên sau nó, cộng theo (khách hàng, mốc)
+        - cộng dồn theo khách hàng (Frequency, Monetary), ngày mua cuối = ngày lớn nhất đến mốc đó
+        - lặp mỗi dòng (khách hàng, mốc) cho các mốc tới trước lần mua kế tiếp
+    Trả về bảng dài Snapshot, Customer ID, Recency, Frequency, Monetary, xếp theo
+    (Customer ID, Snapshot); số dòng = tổng số mốc mà mỗi khách hàng đã xuất hiện.
+    """
+    if snapshot_dates is None:
+        snapshot_dates = month_snapshots(df_clean)
+    snapshots = pd.DatetimeIndex(snapshot_dates).sort_values().unique()
+    dates = df_clean["InvoiceDate"].to_numpy()
+    snap_values = snapshots.to_numpy().astype(dates.dtype)
+
+    # (khách hàng, ngày, hoá đơn): một dòng, tổng tiền; hoá đơn chỉ được đếm ở lần xuất hiện đầu tiên
+    events = (
+        pd.DataFrame({
+            "Customer ID": df_clean["Customer ID"].to_numpy(),
+            "InvoiceDate": dates,
+            "Invoice": df_clean["Invoice"].to_numpy(),
+            "TotalPrice": df_clean["TotalPrice"].to_numpy(dtype="float64"),
+        })
+        .groupby(["Customer ID", "InvoiceDate", "Invoice"], sort=True)["TotalPrice"]
+        .sum()
+        .reset_index()
+    )
+    events["NewInvoice"] = ~events.duplicated(["Customer ID", "Invoice"])
+    events["Bucket"] = np.searchsorted(snap_values, events["InvoiceDate"].to_numpy(), side="right")
+    events = events[events["Bucket"] < len(snap_values)]
+
+    # (khách hàng, mốc đầu tiên có hiệu lực): tổng trong kỳ rồi cộng dồn theo khách hàng
+    steps = events.groupby(["Customer ID", "Bucket"], sort=True).agg(
+        LastPurchase=("InvoiceDate", "max"),
+        Frequency=("NewInvoice", "sum"),
+        Monetary=("TotalPrice", "sum"),
+    ).reset_index()
+    by_customer = steps.groupby("Customer ID", sort=False)
+    steps["Frequency"] = by_customer["Frequency"].cumsum()
+    steps["Monetary"] = by_customer["Monetary"].cumsum()
+
+    # Mỗi bước có hiệu lực từ mốc của nó tới trước bước kế tiếp của cùng khách hàng
+    customers = steps["Customer ID"].to_numpy()
+    buckets = steps["Bucket"].to_numpy()
+    next_bucket = np.append(buckets[1:], len(snap_values))
+    next_bucket[np.append(customers[1:] != customers[:-1], True)] = len(snap_values)
+    repeats = next_bucket - buckets
+    rows = np.repeat(np.arange(len(steps)), repeats)
+    snapshot_idx = buckets[rows] + (np.arange(len(rows)) - np.repeat(np.cumsum(repeats) - repeats, repeats))
+
+    last_purchase = steps["LastPurchase"].to_numpy()[rows]
+    recency = (snap_values[snapshot_idx] - last_purchase) // np.timedelta64(1, "D")
+    return pd.DataFrame({
+        "Snapshot": snapshots[snapshot_idx],
+        "Customer ID": customers[rows],
+        "Recency": recency.astype("int64"),
+        "Frequency": steps["Frequency"].to_numpy()[rows].astype("int64"),
+        "Monetary": steps["Monetary"].to_numpy()[rows],
+    })
+
+
+def assign_snapshot_segments(rolling: pd.DataFrame, scorer) -> pd.DataFrame:
+    """
+    Gán cụm + hạng cho mọi (khách hàng, mốc) bằng một model cố định
+    (`scoring.SegmentScorer`: cùng scaler + tâm cụm cho mọi mốc, nên nhãn so sánh được giữa các mốc).
+    """
+    labels = scorer.predict(rolling[RFM_FEATURES].to_numpy(dtype=np.float64))
+    assigned = rolling.copy()
+    assigned["Cluster"] = labels
+    assigned["Rank"] = scorer.ranks[labels]
+    return assigned
+
+
+def transition_matrix(
+    assigned: pd.DataFrame,
+    start=None,
+    end=None,
+    label_col: str = "Rank",
+    normalize: bool = False,
+) -> pd.DataFrame:
+    """
+    Ma trận chuyển nhóm: dòng = nhóm ở mốc trước, cột = nhóm ở mốc sau.
+    - Không truyền start / end: cộng mọi cặp mốc liên tiếp (chuyển nhóm theo từng kỳ).
+    - Có start và end: so trực tiếp hai mốc đó.
+    Khách hàng chưa xuất hiện ở mốc trước được tính vào dòng "Mới".
+    `normalize=True` chia theo tổng từng dòng (tỉ lệ chuyển).
+    Dựa vào thứ tự (Customer ID, Snapshot) của `compute_rolling_rfm`.
+    """
+    labels = sorted(pd.unique(assigned[label_col]).tolist())
+    customers = assigned["Customer ID"].to_numpy()
+    snapshots = assigned["Snapshot"].to_numpy()
+    values = assigned[label_col].to_numpy()
+    codes = np.searchsorted(labels, values)
+    n = len(labels)
+    new_row = n  # dòng cuối của ma trận: khách hàng mới
+
+    if start is None and end is None:
+        # Dòng trước cùng khách hàng là mốc liền trước (mỗi khách có đủ mọi mốc từ lần đầu xuất hiện);
+        # dòng đầu của khách hàng là khách mới, trừ khi đó là mốc đầu tiên (không có mốc trước để so)
+        prev_same = np.append(False, customers[1:] == customers[:-1])
+        src = np.where(prev_same, np.append(new_row, codes[:-1]), new_row)
+        keep = prev_same | (snapshots != snapshots.min())
+        src, dst = src[keep], codes[keep]
+    else:
+        start, end = np.datetime64(pd.Timestamp(start)), np.datetime64(pd.Timestamp(end))
+        before = pd.Series(codes[snapshots == start], index=customers[snapshots == start])
+        after = pd.Series(codes[snapshots == end], index=customers[snapshots == end])
+        src = before.reindex(after.index).fillna(new_row).to_numpy(dtype=np.int64)
+        dst = after.to_numpy()
+
+    counts = np.bincount(src * n + dst, minlength=(n + 1) * n).reshape(n + 1, n)
+    matrix = pd.DataFrame(counts, index=labels + ["Mới"], columns=labels)
+    matrix.index.name, matrix.columns.name = "Từ", "Đến"
+    if normalize:
+        totals = matrix.sum(axis=1).replace(0, np.nan)
+        matrix = matrix.div(totals, axis=0).fillna(0.0)
+    return matrix
@@ -0,0 +1,163 @@
+# sales_cube.py
+
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# Bảng tổng hợp sẵn cho tab Phân tích truyền thống
+# =========================
+
+# Độ chi tiết thời gian -> tần suất Period của pandas
+GRANULARITIES = {"day": "D", "week": "W", "month": "M"}
+
+
+def top_n_indices(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    Vị trí của n giá trị lớn nhất, xếp giảm dần (bằng nhau thì vị trí nhỏ trước).
+    Dùng argpartition O(len) rồi chỉ sắp xếp n phần tử được chọn.
+    """
+    n = min(max(int(n), 0), len(values))
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    if n < len(values):
+        candidates = np.argpartition(-values, n - 1)[:n]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+
+class SalesCube:
+    """
+    Doanh thu (TotalPrice) và số lượng (Quantity) đã cộng sẵn theo mã phân loại:
+        - ngày x quốc gia   -> chuỗi thời gian theo ngày / tuần / tháng (Period)
+        - sản phẩm x quốc gia -> top-N sản phẩm
+    Xây một lần cho mỗi bộ dữ liệu (O(số dòng), bằng np.bincount); mọi truy vấn sau
+    đó chỉ làm việc trên các mảng tổng hợp, không đụng tới bảng giao dịch.
+    Dòng không có Description vẫn được tính vào doanh thu theo thời gian / quốc gia
+    nhưng không thuộc sản phẩm nào (giống groupby("Description") bỏ NaN).
+    """
+
+    def __init__(
+        self,
+        first_day: np.datetime64,
+        products: pd.Index,
+        countries: pd.Index,
+        day_country_revenue: np.ndarray,
+        day_country_quantity: np.ndarray,
+        product_country_revenue: np.ndarray,
+        product_country_quantity: np.ndarray,
+    ):
+        self.first_day = first_day
+        self.products = products
+        self.countries = countries
+        self.day_country_revenue = day_country_revenue
+        self.day_country_quantity = day_country_quantity
+        self.product_country_revenue = product_country_revenue
+        self.product_country_quantity = product_country_quantity
+
+    @classmethod
+    def from_transactions(
+        cls,
+        df_clean: pd.DataFrame,
+        revenue_col: str = "TotalPrice",
+        quantity_col: str = "Quantity",
+    ) -> "SalesCube":
+        days = df_clean["InvoiceDate"].to_numpy().astype("datetime64[D]")
+        if len(days):
+            first_day = days.min()
+            day_idx = (days - first_day).astype(np.int64)
+            n_days = int(day_idx.max()) + 1
+        else:
+            first_day, day_idx, n_days = np.datetime64("NaT", "D"), np.empty(0, dtype=np.int64), 0
+
+        # Mã phân loại (chỉ gồm giá trị có mặt trong dữ liệu đã làm sạch)
+        country_codes, countries = pd.factorize(df_clean["Country"], sort=True, use_na_sentinel=False)
+        product_codes, products = pd.factorize(df_clean["Description"], sort=True)
+        n_countries, n_products = len(countries), len(products)
+
+        revenue = df_clean[revenue_col].to_numpy(dtype="float64")
+        quantity = df_clean[quantity_col].to_numpy(dtype="float64")
+
+        def cube_2d(row_codes, col_codes, n_rows, weights):
+            flat = row_codes * n_countries + col_codes
+            return np.bincount(flat, weights=weights, minlength=n_rows * n_countries).reshape(n_rows, n_countries)
+
+        has_product = product_codes >= 0
+        product_rows, product_countries = product_codes[has_product], country_codes[has_product]
+        return cls(
+            first_day=first_day,
+            products=pd.Index(products, name="Description"),
+            countries=pd.Index(countries, name="Country"),
+            day_country_revenue=cube_2d(day_idx, country_codes, n_days, revenue),
+            day_country_quantity=cube_2d(day_idx, country_codes, n_days, quantity),
+            product_country_revenue=cube_2d(product_rows, product_countries, n_products, revenue[has_product]),
+            product_country_quantity=cube_2d(product_rows, product_countries, n_products, quantity[has_product]),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (
+            self.day_country_revenue, self.day_country_quantity,
+            self.product_country_revenue, self.product_country_quantity,
+        ))
+
+    def _country_slice(self, matrix: np.ndarray, country) -> np.ndarray:
+        if country is None:
+            return matrix.sum(axis=1)
+        pos = self.countries.get_indexer([country])[0]
+        if pos < 0:
+            return np.zeros(len(matrix))
+        return matrix[:, pos]
+
+    def revenue_over_time(self, granularity: str = "month", country=None) -> pd.DataFrame:
+        """
+        Doanh thu + số lượng theo "day" / "week" / "month". Cột Period (pd.Period) và
+        PeriodStart (Timestamp đầu kỳ, tiện cho trục x của biểu đồ).
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity phải là một trong {tuple(GRANULARITIES)}, nhận được {granularity!r}")
+        revenue = self._country_slice(self.day_country_revenue, country)
+        quantity = self._country_slice(self.day_country_quantity, country)
+        if len(revenue):
+            days = pd.period_range(start=pd.Period(self.first_day, "D"), periods=len(revenue), freq="D")
+        else:
+            days = pd.PeriodIndex([], freq="D")
+        periods = days.asfreq(GRANULARITIES[granularity])
+
+        totals = (
+            pd.DataFrame({"Period": periods, "TotalPrice": revenue, "Quantity": quantity})
+            .groupby("Period", sort=True)
+            .sum()
+            .reset_index()
+        )
+        # Kỳ không có giao dịch ở giữa dải ngày vẫn được giữ (giá trị 0) để trục thời gian liên tục
+        totals["Quantity"] = totals["Quantity"].round().astype("int64")
+        totals["PeriodStart"] = totals["Period"].dt.start_time
+        return totals
+
+    def top_products(self, n: int = 5, by: str = "Quantity", country=None) -> pd.DataFrame:
+        """
+        Top-N sản phẩm theo "Quantity" hoặc "TotalPrice" (giảm dần), chọn bằng argpartition.
+        """
+        quantity = self._country_slice(self.product_country_quantity, country)
+        revenue = self._country_slice(self.product_country_revenue, country)
+        values = {"Quantity": quantity, "TotalPrice": revenue}[by]
+        idx = top_n_indices(values, n)
+        return pd.DataFrame({
+            "Description": self.products[idx].astype(str),
+            "Quantity": quantity[idx].round().astype("int64"),
+            "TotalPrice": revenue[idx],
+        })
+
+    def by_country(self) -> pd.DataFrame:
+        """
+        Doanh thu + số lượng theo quốc gia, giảm dần theo doanh thu.
+        """
+        revenue = self.day_country_revenue.sum(axis=0)
+        idx = top_n_indices(revenue, len(revenue))
+        return pd.DataFrame({
+            "Country": self.countries[idx].astype(str),
+            "TotalPrice": revenue[idx],
+            "Quantity": self.day_country_quantity.sum(axis=0)[idx].round().astype("int64"),
+        })
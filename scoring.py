@@ -0,0 +1,303 @@
+# scoring.py
+"""
+Gán phân khúc (cụm, hạng, hành động đề xuất) cho khách hàng mới / vừa cập nhật mà không
+cần chạy lại cả pipeline: nạp scaler + K-Means đã lưu kèm bảng xếp hạng cụm của tab AI.
+
+    python -m scoring build data/online_retail_II.csv --k 4 --out models/scorer.joblib
+    python -m scoring serve models/scorer.joblib --port 8765
+
+    curl -X POST localhost:8765/score -d '{"customers": [{"customer_id": 1, "recency": 10, "frequency": 5, "monetary": 900}]}'
+"""
+
+import argparse
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from segments import RFM_FEATURES, action_thresholds, build_cluster_info, compute_cluster_means
+from utils import clean_retail_data, compute_rfm
+
+
+# =========================
+# Scoring API (Python)
+# =========================
+
+# Phân khúc của cụm không có khách hàng nào khi huấn luyện (không có R-F-M trung bình để xếp hạng)
+UNKNOWN_RANK = -1
+UNKNOWN_SEGMENT = "Chưa xác định"
+
+class SegmentScorer:
+    """
+    Bộ chấm điểm chỉ đọc: scaler + K-Means đã huấn luyện, R-F-M trung bình từng cụm
+    (để xếp hạng như tab AI) và ngưỡng phân vị cho hành động đề xuất.
+    Dự đoán theo lô bằng numpy (chuẩn hoá + khoảng cách tới tâm cụm), cho cùng nhãn
+    với `kmeans_model.predict`. Dùng chung được giữa nhiều luồng.
+    """
+
+    def __init__(self, scaler, kmeans_model, cluster_means: pd.DataFrame, thresholds: dict,
+                 snapshot_date: pd.Timestamp | None = None, meta: dict | None = None):
+        self.scaler = scaler
+        self.kmeans_model = kmeans_model
+        self.cluster_means = cluster_means
+        self.thresholds = thresholds
+        self.snapshot_date = snapshot_date
+        self.meta = meta or {}
+
+        # Tra cứu theo nhãn cụm: hạng, tên nhóm, hành động (tính một lần).
+        # Cụm không có dòng trong cluster_means giữ phân khúc "chưa xác định", không mượn hạng của cụm khác
+        n_clusters = len(kmeans_model.cluster_centers_)
+        self.ranks = np.full(n_clusters, UNKNOWN_RANK, dtype=np.int64)
+        self.names = [UNKNOWN_SEGMENT] * n_clusters
+        self.actions = [[] for _ in range(n_clusters)]
+        for info in build_cluster_info(cluster_means, thresholds):
+            cid = int(info["Cluster"])
+            self.ranks[cid] = info["Hạng"]
+            self.names[cid] = info["Tên nhóm"]
+            self.actions[cid] = info["Actions"]
+
+        self._mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self._scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self._centers = np.asarray(kmeans_model.cluster_centers_, dtype=np.float64)
+        self._centers_sq = (self._centers ** 2).sum(axis=1)
+
+    @classmethod
+    def from_rfm(cls, rfm: pd.DataFrame, scaler, kmeans_model, snapshot_date=None, meta=None) -> "SegmentScorer":
+        """
+        Từ bảng rfm đã có cột Cluster (vd. `run_rfm_kmeans_pipeline(...)["rfm"]`).
+        """
+        return cls(
+            scaler,
+            kmeans_model,
+            compute_cluster_means(rfm),
+            action_thresholds(rfm),
+            snapshot_date=snapshot_date,
+            meta={"n_customers": int(len(rfm)), **(meta or {})},
+        )
+
+    @classmethod
+    def from_pipeline_result(cls, result: dict, meta=None) -> "SegmentScorer":
+        return cls.from_rfm(
+            result["rfm"], result["scaler"], result["kmeans_model"],
+            snapshot_date=result["snapshot_date"], meta=meta,
+        )
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        entry = {
+            "scaler": self.scaler,
+            "kmeans_model": self.kmeans_model,
+            "cluster_means": self.cluster_means,
+            "thresholds": self.thresholds,
+            "snapshot_date": self.snapshot_date,
+            "meta": {**self.meta, "saved_at": time.time()},
+        }
+        # Ghi ra file tạm rồi đổi tên để service đang chạy không đọc phải file ghi dở
+        joblib.dump(entry, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "SegmentScorer":
+        entry = joblib.load(path)
+        return cls(
+            entry["scaler"], entry["kmeans_model"], entry["cluster_means"], entry["thresholds"],
+            snapshot_date=entry["snapshot_date"], meta=entry["meta"],
+        )
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self._centers)
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Nhãn cụm cho mảng (n, 3) các giá trị R, F, M thô (chưa chuẩn hoá).
+        """
+        Z = (np.asarray(X, dtype=np.float64).reshape(-1, len(self._mean)) - self._mean) / self._scale
+        # ||z - c||^2 = ||z||^2 - 2 z.c + ||c||^2; ||z||^2 không ảnh hưởng argmin
+        return np.argmin(self._centers_sq - 2.0 * Z @ self._centers.T, axis=1)
+
+    def score(self, rfm: pd.DataFrame) -> pd.DataFrame:
+        """
+        Chấm điểm bảng có các cột Recency, Frequency, Monetary (Customer ID nếu có được giữ lại).
+        Trả về thêm các cột Cluster, Rank, Segment, Actions (cụm không có khách hàng nào khi
+        huấn luyện: Rank = UNKNOWN_RANK, Segment = UNKNOWN_SEGMENT, không có hành động).
+        """
+        labels = self.predict(rfm[RFM_FEATURES].to_numpy(dtype=np.float64))
+        keep = [c for c in ("Customer ID", *RFM_FEATURES) if c in rfm.columns]
+        scored = rfm[keep].reset_index(drop=True)
+        scored["Cluster"] = labels
+        scored["Rank"] = self.ranks[labels]
+        scored["Segment"] = [self.names[c] for c in labels]
+        scored["Actions"] = [self.actions[c] for c in labels]
+        return scored
+
+    def score_records(self, records: list[dict]) -> list[dict]:
+        """
+        Như `score` cho danh sách dict {"customer_id"?, "recency", "frequency", "monetary"}
+        (định dạng JSON của HTTP service).
+        """
+        X = np.array(
+            [(r["recency"], r["frequency"], r["monetary"]) for r in records], dtype=np.float64
+        ).reshape(-1, len(RFM_FEATURES))
+        labels = self.predict(X).tolist()
+        ranks = self.ranks.tolist()
+        return [
+            {
+                "customer_id": r.get("customer_id"),
+                "cluster": c,
+                "rank": ranks[c],
+                "segment": self.names[c],
+                "actions": self.actions[c],
+            }
+            for r, c in zip(records, labels)
+        ]
+
+    def score_transactions(self, df_raw: pd.DataFrame, snapshot_date: pd.Timestamp | None = None) -> pd.DataFrame:
+        """
+        Từ giao dịch thô (cùng cột với CSV Online Retail II): làm sạch → RFM → chấm điểm.
+        Recency tính tới `snapshot_date`; mặc định là mốc lúc huấn luyện, hoặc ngày sau
+        giao dịch mới nhất nếu dữ liệu mới hơn mốc đó.
+        """
+        df_clean = clean_retail_data(df_raw)
+        if snapshot_date is None:
+            latest = df_clean["InvoiceDate"].max() + pd.Timedelta(days=1) if len(df_clean) else None
+            candidates = [d for d in (self.snapshot_date, latest) if d is not None]
+            snapshot_date = max(candidates) if candidates else None
+        rfm, _ = compute_rfm(df_clean, snapshot_date=snapshot_date)
+        return self.score(rfm)
+
+    def info(self) -> dict:
+        return {
+            "n_clusters": self.n_clusters,
+            "snapshot_date": None if self.snapshot_date is None else str(self.snapshot_date),
+            "clusters": [
+                {"cluster": cid, "rank": int(self.ranks[cid]), "segment": self.names[cid], "actions": self.actions[cid]}
+                for cid in range(self.n_clusters)
+            ],
+            "meta": {k: v for k, v in self.meta.items() if isinstance(v, (str, int, float, bool))},
+        }
+
+
+# =========================
+# HTTP service (http.server, chạy nội bộ)
+# =========================
+
+class _ScoringHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health               -> thông tin model
+    POST /score                -> {"customers": [{"customer_id", "recency", "frequency", "monetary"}, ...]}
+    POST /score/transactions   -> {"transactions": [{"Invoice", "InvoiceDate", "Customer ID", "Quantity", "Price", ...}]}
+    """
+
+    # Giữ kết nối (keep-alive) để client gửi nhiều request liên tiếp
+    protocol_version = "HTTP/1.1"
+    # Header và body được ghi riêng: tắt Nagle để không chờ delayed ACK (~40ms mỗi request)
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", **self.server.scorer.info()})
+        else:
+            self._send_json(404, {"error": f"Không có đường dẫn {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/score":
+                results = self.server.scorer.score_records(payload["customers"])
+            elif self.path == "/score/transactions":
+                scored = self.server.scorer.score_transactions(pd.DataFrame(payload["transactions"]))
+                results = [
+                    {"customer_id": int(row["Customer ID"]), "cluster": int(row["Cluster"]), "rank": int(row["Rank"]),
+                     "segment": row["Segment"], "actions": row["Actions"]}
+                    for row in scored.to_dict(orient="records")
+                ]
+            else:
+                self._send_json(404, {"error": f"Không có đường dẫn {self.path}"})
+                return
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"Request không hợp lệ: {e!r}"})
+            return
+        self._send_json(200, {"results": results})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(scorer: SegmentScorer, host: str = "127.0.0.1", port: int = 8765, verbose: bool = False):
+    """
+    Tạo HTTP server (mỗi request một luồng); gọi `.serve_forever()` để chạy.
+    port=0 để hệ điều hành chọn cổng trống (xem `server.server_address`).
+    """
+    server = ThreadingHTTPServer((host, port), _ScoringHandler)
+    server.daemon_threads = True
+    server.scorer = scorer
+    server.verbose = verbose
+    return server
+
+
+def build_scorer(path_to_csv: str, n_clusters: int = 4, model_store_root: str | None = ".model_store") -> SegmentScorer:
+    """
+    Chạy pipeline một lần rồi tạo scorer. Dùng chung kho model với ứng dụng nên cùng
+    dữ liệu + K sẽ nạp lại đúng model đang hiển thị trong tab AI.
+    """
+    from model_store import ModelStore
+    from utils import run_rfm_kmeans_pipeline
+
+    store = None if model_store_root is None else ModelStore(model_store_root)
+    result = run_rfm_kmeans_pipeline(path_to_csv, n_clusters=n_clusters, columnar_cache=True, model_store=store)
+    return SegmentScorer.from_pipeline_result(
+        result, meta={"source": os.path.abspath(path_to_csv), "n_clusters": n_clusters, "model_source": result["model_source"]}
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Huấn luyện / nạp model và lưu scorer")
+    build.add_argument("path", help="CSV Online Retail II")
+    build.add_argument("--k", type=int, default=4, help="Số cụm")
+    build.add_argument("--out", default="models/scorer.joblib")
+    build.add_argument("--model-store", default=".model_store", help="Thư mục kho model ('' để không dùng)")
+
+    serve = sub.add_parser("serve", help="Chạy HTTP service chấm điểm")
+    serve.add_argument("model", help="File scorer (.joblib) tạo bởi lệnh build")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--verbose", action="store_true", help="Ghi log từng request")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        scorer = build_scorer(args.path, n_clusters=args.k, model_store_root=args.model_store or None)
+        scorer.save(args.out)
+        print(f"Đã lưu scorer ({scorer.n_clusters} cụm): {args.out}")
+        return
+
+    server = make_server(SegmentScorer.load(args.model), args.host, args.port, verbose=args.verbose)
+    print(f"Scoring service: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# segments.py
+
+import pandas as pd
+
+
+# =========================
+# Xếp hạng cụm + đề xuất hành động (dùng chung cho tab AI và scoring API)
+# =========================
+
+RFM_FEATURES = ["Recency", "Frequency", "Monetary"]
+
+# Phân vị dùng để chia mức thấp / cao của từng chỉ số khi đề xuất hành động
+ACTION_QUANTILES = (0.33, 0.66)
+
+
+def compute_cluster_means(rfm: pd.DataFrame) -> pd.DataFrame:
+    """
+    R-F-M trung bình theo cụm (làm tròn 2 chữ số), index = Cluster.
+    """
+    return (
+        rfm.groupby("Cluster")[RFM_FEATURES]
+        .mean()
+        .round(2)
+        .sort_index()
+    )
+
+
+def rank_clusters(means: pd.DataFrame) -> dict:
+    """
+    Xếp hạng cụm thành các hạng khách hàng (1 = tốt nhất) theo điểm
+    (1 - R chuẩn hoá) + F chuẩn hoá + M chuẩn hoá trên các giá trị trung bình cụm.
+    Trả về {cluster: hạng}.
+    """
+    r_min, r_max = means['Recency'].min(), means['Recency'].max()
+    f_min, f_max = means['Frequency'].min(), means['Frequency'].max()
+    m_min, m_max = means['Monetary'].min(), means['Monetary'].max()
+
+    def norm(val: float, vmin: float, vmax: float) -> float:
+        return 0.0 if vmax == vmin else (val - vmin) / (vmax - vmin)
+
+    rank_df = []
+    for cid, row in means.iterrows():
+        score = (1 - norm(row['Recency'], r_min, r_max)) + \
+                norm(row['Frequency'], f_min, f_max) + \
+                norm(row['Monetary'], m_min, m_max)
+        rank_df.append({'Cluster': cid, 'Score': score})
+    rank_df = pd.DataFrame(rank_df).sort_values('Score', ascending=False).reset_index(drop=True)
+    rank_df['Rank'] = rank_df.index + 1
+    return dict(zip(rank_df['Cluster'], rank_df['Rank']))
+
+
+def segment_name(rank: int) -> str:
+    return f"Khách hạng {rank}"
+
+
+def action_thresholds(rfm: pd.DataFrame, quantiles=ACTION_QUANTILES) -> dict:
+    """
+    Ngưỡng thấp / cao của từng chỉ số theo phân vị trên toàn bộ khách hàng:
+    {"Recency": {"low": ..., "high": ...}, "Frequency": {...}, "Monetary": {...}}.
+    """
+    low, high = quantiles
+    return {
+        col: {"low": float(rfm[col].quantile(low)), "high": float(rfm[col].quantile(high))}
+        for col in RFM_FEATURES
+    }
+
+
+def suggest_actions(r: float, f: float, m: float, thresholds: dict) -> list[str]:
+    r_q, f_q, m_q = thresholds["Recency"], thresholds["Frequency"], thresholds["Monetary"]
+    actions: list[str] = []
+    # Recency: lower is better
+    if r <= r_q["low"]:
+        actions.append("Upsell/cross-sell theo lịch sử sản phẩm vừa mua.")
+    elif r >= r_q["high"]:
+        actions.append("Kích hoạt lại bằng email/SMS kèm ưu đãi quay lại thời hạn ngắn.")
+    else:
+        actions.append("Nhắc nhớ nhẹ nhàng và gợi ý sản phẩm liên quan.")
+    # Frequency: higher is better
+    if f >= f_q["high"]:
+        actions.append("Tăng quyền lợi loyalty/tier; chương trình dành riêng.")
+    elif f <= f_q["low"]:
+        actions.append("Khuyến khích mua lại bằng voucher nhỏ hoặc freeship ngưỡng thấp.")
+    else:
+        actions.append("Bundle/combo để tăng tần suất.")
+    # Monetary: higher is better
+    if m >= m_q["high"]:
+        actions.append("Đề xuất sản phẩm cao cấp/độc quyền; chăm sóc ưu tiên.")
+    elif m <= m_q["low"]:
+        actions.append("Đề xuất sản phẩm giá hợp lý; tối ưu chi phí vận chuyển.")
+    else:
+        actions.append("Gợi ý nâng giá trị giỏ bằng phụ kiện/phụ trợ.")
+    return actions
+
+
+def build_cluster_info(means: pd.DataFrame, thresholds: dict) -> list[dict]:
+    """
+    Mỗi cụm: {"Cluster", "Hạng", "Tên nhóm", "Actions"} (hành động theo R-F-M trung bình của cụm).
+    """
+    ranks = rank_clusters(means)
+    info = []
+    for cid, row in means.iterrows():
+        rank = ranks[cid]
+        info.append({
+            "Cluster": cid,
+            "Hạng": rank,
+            "Tên nhóm": segment_name(rank),
+            "Actions": suggest_actions(row['Recency'], row['Frequency'], row['Monetary'], thresholds),
+        })
+    return info
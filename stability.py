@@ -0,0 +1,201 @@
+# stability.py
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+from profiling import instrumented, stage
+from utils import _limit_threads, _parallel_plan, _process_pool, train_kmeans
+
+
+# =========================
+# Độ ổn định của phân cụm: K-Means lặp lại trên mẫu bootstrap / subsample
+# =========================
+
+# Dữ liệu X của tiến trình con (gửi một lần qua initializer, mỗi lần lặp chỉ gửi seed)
+_WORKER_X = None
+
+
+def _init_worker(X_scaled) -> None:
+    global _WORKER_X
+    _WORKER_X = X_scaled
+
+
+def _fit_run(X_scaled, n_clusters: int, seed: int, n_fit: int, replace: bool, engine: str, n_threads: int):
+    """
+    Một lần lặp: lấy mẫu n_fit dòng (có / không hoàn lại) rồi K-Means với random_state=seed.
+    Trả về tâm cụm (K x số cột).
+    """
+    rng = np.random.default_rng(seed)
+    idx = rng.choice(len(X_scaled), size=n_fit, replace=replace)
+    with _limit_threads(n_threads):
+        model = train_kmeans(X_scaled[idx], n_clusters=n_clusters, random_state=seed, engine=engine)
+    return model.cluster_centers_
+
+
+def _fit_run_shared(*args):
+    return _fit_run(_WORKER_X, *args)
+
+
+@instrumented
+def bootstrap_centroids(
+    X_scaled,
+    n_clusters: int,
+    n_runs: int = 20,
+    sample_fraction: float = 0.8,
+    bootstrap: bool = False,
+    max_fit_size: int | None = 50_000,
+    engine: str = "kmeans",
+    random_state: int = 42,
+    n_jobs: int | None = None,
+) -> np.ndarray:
+    """
+    Tâm cụm của `n_runs` lần K-Means, mỗi lần trên một mẫu khác và một random_state khác
+    (nên đo cả ảnh hưởng của dữ liệu lẫn của khởi tạo). Mẫu mỗi lần:
+        - `bootstrap=False`: subsample `sample_fraction` số dòng, không hoàn lại
+        - `bootstrap=True`:  cùng số dòng với X, có hoàn lại (bỏ qua `sample_fraction`)
+    và không vượt quá `max_fit_size` dòng để bảng RFM lớn vẫn chạy trong vài giây.
+    Các lần lặp chạy song song trên `n_jobs` tiến trình; X_scaled chỉ gửi một lần cho mỗi
+    tiến trình. Trả về mảng (n_runs, K, số cột).
+    """
+    X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float64)
+    if bootstrap:
+        n_fit = len(X_scaled)
+    else:
+        n_fit = min(len(X_scaled), max(n_clusters, int(round(len(X_scaled) * sample_fraction))))
+    if max_fit_size:
+        n_fit = min(n_fit, max_fit_size)
+    seeds = np.random.default_rng(random_state).integers(0, 2**31 - 1, size=n_runs).tolist()
+
+    n_jobs, n_threads = _parallel_plan(n_runs, n_jobs)
+    task_args = [(n_clusters, seed, n_fit, bootstrap, engine, n_threads) for seed in seeds]
+
+    if n_jobs <= 1:
+        centroids = [_fit_run(X_scaled, *args) for args in task_args]
+    else:
+        with _process_pool(n_jobs, initializer=_init_worker, initargs=(X_scaled,)) as pool:
+            centroids = list(pool.map(_fit_run_shared, *zip(*task_args)))
+    return np.stack(centroids)
+
+
+def align_centroids(centroids: np.ndarray, reference: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Ghép tâm cụm của từng lần lặp với tâm cụm tham chiếu (bài toán phân công, tổng bình
+    phương khoảng cách nhỏ nhất - Hungarian). Trả về:
+        - perms  (n_runs, K): perms[r, j] = cụm tham chiếu tương ứng với cụm j của lần r
+        - shifts (n_runs, K): shifts[r, c] = khoảng cách từ tâm ghép với cụm c tới tâm tham chiếu c
+    """
+    cost = ((centroids[:, :, None, :] - reference[None, None, :, :]) ** 2).sum(axis=-1)
+    n_runs, k = cost.shape[:2]
+    perms = np.empty((n_runs, k), dtype=np.int64)
+    shifts = np.empty((n_runs, k), dtype=np.float64)
+    for r in range(n_runs):
+        rows, cols = linear_sum_assignment(cost[r])
+        perms[r, rows] = cols
+        shifts[r, cols] = np.sqrt(cost[r, rows, cols])
+    return perms, shifts
+
+
+def assign_aligned(X_scaled, centroids: np.ndarray, perms: np.ndarray) -> np.ndarray:
+    """
+    Nhãn (đã ghép về cụm tham chiếu) của mọi dòng trong X theo tâm cụm của mọi lần lặp,
+    tính một lần cho tất cả tâm: |x|^2 - 2 x.c + |c|^2. Trả về (len(X), n_runs).
+    """
+    n_runs, k, n_features = centroids.shape
+    flat = centroids.reshape(n_runs * k, n_features)
+    d2 = (
+        (X_scaled ** 2).sum(axis=1)[:, None]
+        - 2.0 * (X_scaled @ flat.T)
+        + (flat ** 2).sum(axis=1)[None, :]
+    )
+    nearest = d2.reshape(len(X_scaled), n_runs, k).argmin(axis=2)
+    return perms[np.arange(n_runs)[None, :], nearest]
+
+
+@instrumented
+def cluster_stability(
+    X_scaled,
+    labels,
+    centroids,
+    n_runs: int = 20,
+    sample_fraction: float = 0.8,
+    bootstrap: bool = False,
+    max_fit_size: int | None = 50_000,
+    engine: str = "kmeans",
+    random_state: int = 42,
+    n_jobs: int | None = None,
+    batch_size: int | None = None,
+) -> dict:
+    """
+    Phân tích độ ổn định của một kết quả K-Means (nhãn + tâm cụm tham chiếu, vd. `sweep[k]`):
+    chạy `bootstrap_centroids`, ghép nhãn từng lần về tham chiếu (`align_centroids`), rồi gán
+    lại toàn bộ khách hàng theo từng lần lặp (`assign_aligned`, theo batch `batch_size` dòng
+    để bộ nhớ ~ batch_size x n_runs x K).
+    Trả về dict:
+        - "clusters":   mỗi cụm một dòng: Customers, JaccardMean, JaccardMin, JaccardP10
+                        (Jaccard giữa cụm tham chiếu và cụm ghép của từng lần lặp, 1 = trùng hệt),
+                        CentroidShift (khoảng cách trung bình của tâm, theo đơn vị đã chuẩn hoá),
+                        StableShare (tỉ lệ khách hàng của cụm có confidence >= 0.9)
+        - "runs":       mỗi lần lặp một dòng: Agreement (tỉ lệ khách hàng giữ nguyên cụm), JaccardMean
+        - "confidence": (n,) tỉ lệ lần lặp gán khách hàng vào đúng cụm tham chiếu của họ
+        - "modal_label": (n,) cụm được gán nhiều nhất qua các lần lặp
+        - "n_runs"
+    """
+    X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.int64)
+    reference = np.asarray(centroids, dtype=np.float64)
+    k = len(reference)
+    n = len(X_scaled)
+
+    with stage("stability: fit", rows_in=n):
+        run_centroids = bootstrap_centroids(
+            X_scaled, k, n_runs=n_runs, sample_fraction=sample_fraction, bootstrap=bootstrap,
+            max_fit_size=max_fit_size, engine=engine, random_state=random_state, n_jobs=n_jobs,
+        )
+        perms, shifts = align_centroids(run_centroids, reference)
+
+    # Bảng chéo (lần lặp, cụm tham chiếu, cụm ghép) và số phiếu (khách hàng, cụm), cộng dồn theo batch
+    contingency = np.zeros(n_runs * k * k, dtype=np.int64)
+    confidence = np.empty(n, dtype=np.float64)
+    modal_label = np.empty(n, dtype=np.int64)
+    batch_size = batch_size or max(1_024, (1 << 22) // (n_runs * k))
+    run_offsets = (np.arange(n_runs) * k * k)[None, :]
+    with stage("stability: assign", rows_in=n):
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            aligned = assign_aligned(X_scaled[start:stop], run_centroids, perms)
+            ref = labels[start:stop, None]
+            contingency += np.bincount((run_offsets + ref * k + aligned).ravel(), minlength=n_runs * k * k)
+            rows = np.arange(stop - start)[:, None]
+            votes = np.bincount((rows * k + aligned).ravel(), minlength=(stop - start) * k).reshape(-1, k)
+            confidence[start:stop] = votes[rows[:, 0], labels[start:stop]] / n_runs
+            modal_label[start:stop] = votes.argmax(axis=1)
+
+    contingency = contingency.reshape(n_runs, k, k)
+    intersection = np.diagonal(contingency, axis1=1, axis2=2)
+    union = contingency.sum(axis=2) + contingency.sum(axis=1) - intersection
+    jaccard = np.divide(intersection, union, out=np.zeros(intersection.shape), where=union > 0)
+
+    customers = np.bincount(labels, minlength=k)
+    stable = np.bincount(labels, weights=(confidence >= 0.9).astype(np.float64), minlength=k)
+    clusters = pd.DataFrame({
+        "Cluster": np.arange(k),
+        "Customers": customers,
+        "JaccardMean": jaccard.mean(axis=0),
+        "JaccardMin": jaccard.min(axis=0),
+        "JaccardP10": np.quantile(jaccard, 0.1, axis=0),
+        "CentroidShift": shifts.mean(axis=0),
+        "StableShare": np.divide(stable, customers, out=np.zeros(k), where=customers > 0),
+    })
+    runs = pd.DataFrame({
+        "Run": np.arange(n_runs),
+        "Agreement": intersection.sum(axis=1) / n,
+        "JaccardMean": jaccard.mean(axis=1),
+    })
+    return {
+        "clusters": clusters,
+        "runs": runs,
+        "confidence": confidence,
+        "modal_label": modal_label,
+        "n_runs": n_runs,
+    }
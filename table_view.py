@@ -0,0 +1,156 @@
+# table_view.py
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+# =========================
+# Bảng phân trang phía server
+# =========================
+
+PAGE_SIZE_OPTIONS = (25, 50, 100, 250)
+
+
+class PagedTable:
+    """
+    Bảng lớn được sắp xếp / nhóm sẵn một lần để mỗi lần rerun chỉ cắt ra một trang.
+    - `group_col` (vd. "Cluster"): dữ liệu được xếp theo nhóm, mỗi nhóm là một đoạn
+      liên tiếp [start, end) nên lấy một nhóm không cần mask trên cả bảng.
+    - Thứ tự theo từng cột sắp xếp được tính lần đầu khi dùng rồi giữ lại.
+    - Tìm kiếm theo tiền tố của `search_col` (mặc định Customer ID).
+    """
+
+    def __init__(self, df: pd.DataFrame, group_col: str | None = None, search_col: str = "Customer ID"):
+        self.df = df.reset_index(drop=True)
+        self.group_col = group_col
+        self.search_col = search_col
+        self._orders: dict = {}
+        self._search_values = None
+
+        if group_col is None:
+            self._group_values = np.zeros(len(self.df), dtype=np.int8)
+            self.groups = [None]
+        else:
+            self._group_values = self.df[group_col].to_numpy()
+            self.groups = sorted(pd.unique(self._group_values).tolist())
+        sorted_groups = np.sort(self._group_values, kind="stable")
+        starts = np.searchsorted(sorted_groups, self.groups if group_col else [0], side="left")
+        ends = np.searchsorted(sorted_groups, self.groups if group_col else [0], side="right")
+        self._offsets = {g: (int(s), int(e)) for g, s, e in zip(self.groups, starts, ends)}
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def group_size(self, group=None) -> int:
+        start, end = self._offsets[group]
+        return end - start
+
+    def _order(self, sort_by: str) -> np.ndarray:
+        """
+        Vị trí các dòng xếp theo (nhóm, sort_by) tăng dần; tính một lần cho mỗi cột.
+        """
+        if sort_by not in self._orders:
+            self._orders[sort_by] = np.lexsort((self.df[sort_by].to_numpy(), self._group_values))
+        return self._orders[sort_by]
+
+    def _matches(self, positions: np.ndarray, search: str) -> np.ndarray:
+        if self._search_values is None:
+            self._search_values = self.df[self.search_col].astype(str).to_numpy(dtype=str)
+        return np.char.startswith(self._search_values[positions], search)
+
+    def positions(
+        self,
+        group=None,
+        sort_by: str = "Customer ID",
+        ascending: bool = True,
+        search: str = "",
+        row_mask: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        Vị trí (theo df đã reset_index) các dòng khớp điều kiện, theo đúng thứ tự hiển thị.
+        `row_mask`: mask boolean theo thứ tự dòng của df ban đầu (vd. bộ lọc của người dùng).
+        """
+        start, end = self._offsets[group]
+        positions = self._order(sort_by)[start:end]
+        if not ascending:
+            positions = positions[::-1]
+        if row_mask is not None:
+            positions = positions[np.asarray(row_mask)[positions]]
+        search = search.strip()
+        if search:
+            positions = positions[self._matches(positions, search)]
+        return positions
+
+    def page(
+        self,
+        group=None,
+        sort_by: str = "Customer ID",
+        ascending: bool = True,
+        search: str = "",
+        page: int = 1,
+        page_size: int = 50,
+        row_mask: np.ndarray | None = None,
+        columns=None,
+    ) -> tuple[pd.DataFrame, int]:
+        """
+        Trả về (DataFrame của trang `page` (đánh số từ 1), tổng số dòng khớp).
+        """
+        positions = self.positions(group, sort_by, ascending, search, row_mask)
+        total = len(positions)
+        first = (max(page, 1) - 1) * page_size
+        rows = self.df.iloc[positions[first:first + page_size]]
+        if columns is not None:
+            rows = rows[list(columns)]
+        return rows.reset_index(drop=True), total
+
+
+def render_paged_table(
+    table: PagedTable,
+    key: str,
+    group=None,
+    sort_columns=None,
+    columns=None,
+    row_mask: np.ndarray | None = None,
+    default_sort: str = "Customer ID",
+) -> int:
+    """
+    Vẽ bảng có phân trang, sắp xếp và tìm kiếm phía server: chỉ trang đang xem
+    được gửi xuống trình duyệt. Trả về tổng số dòng khớp.
+    """
+    sort_columns = list(sort_columns or table.df.columns)
+    col_search, col_sort, col_dir, col_size = st.columns([3, 2, 1, 1])
+    with col_search:
+        search = st.text_input("Tìm Customer ID", value="", key=f"{key}_search", persist_state="session")
+    with col_sort:
+        sort_by = st.selectbox(
+            "Sắp xếp theo",
+            sort_columns,
+            index=sort_columns.index(default_sort) if default_sort in sort_columns else 0,
+            key=f"{key}_sort", persist_state="session",
+        )
+    with col_dir:
+        descending = st.checkbox("Giảm dần", value=False, key=f"{key}_desc", persist_state="session")
+    with col_size:
+        page_size = st.selectbox(
+            "Số dòng/trang", PAGE_SIZE_OPTIONS, index=1, key=f"{key}_size", persist_state="session"
+        )
+
+    positions = table.positions(group, sort_by, not descending, search, row_mask)
+    total = len(positions)
+    n_pages = max(1, math.ceil(total / page_size))
+
+    # Giữ số trang hợp lệ khi bộ lọc/tìm kiếm làm số trang giảm
+    page_key = f"{key}_page"
+    st.session_state[page_key] = min(max(int(st.session_state.get(page_key, 1)), 1), n_pages)
+    page = st.number_input("Trang", min_value=1, max_value=n_pages, step=1, key=page_key, persist_state="session")
+
+    first = (int(page) - 1) * page_size
+    rows = table.df.iloc[positions[first:first + page_size]]
+    if columns is not None:
+        rows = rows[list(columns)]
+    st.dataframe(rows.reset_index(drop=True), use_container_width=True, hide_index=True)
+    st.caption(f"Trang {int(page)}/{n_pages} · {total:,} dòng")
+    return total
@@ -0,0 +1,17 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def retail_csv(tmp_path_factory):
+    # CSV giả lập nhỏ (cùng schema với Online Retail II)
+    from benchmarks.synthetic import write_synthetic_csv
+
+    return write_synthetic_csv(str(tmp_path_factory.mktemp("data") / "retail.csv"), n_rows=20_000, seed=0)
@@ -0,0 +1,45 @@
+# tests/test_app.py
+
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from conftest import ROOT
+
+
+def _run_ai(at: AppTest) -> None:
+    # AppTest không giữ tab đang mở giữa các lần chạy: chọn lại tab AI trước mỗi lần
+    at.session_state["active_tab"] = "Phân tích AI"
+    at.run()
+
+
+@pytest.fixture
+def ai_app(retail_csv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # .model_store của app nằm trong thư mục tạm
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=300)
+    _run_ai(at)
+    at.text_input(key="csv_path_ai").input(retail_csv)
+    _run_ai(at)
+    assert not at.exception
+    return at
+
+
+@pytest.mark.parametrize("customer_id", ["1e30", "-1e30", "inf", "nan", "abc", "12.5"])
+def test_lookup_rejects_invalid_customer_id(ai_app, customer_id):
+    ai_app.text_input(key="cluster_lookup_id").input(customer_id)
+    _run_ai(ai_app)
+    assert not ai_app.exception
+    assert not ai_app.error
+    assert any(customer_id in info.value for info in ai_app.info)
+
+
+def test_scatter_payload_size_only_in_profiler_mode(ai_app):
+    def scatter_caption():
+        return next(c.value for c in ai_app.caption if c.value.startswith("Chế độ vẽ"))
+
+    assert "KB dữ liệu biểu đồ" not in scatter_caption()
+    ai_app.sidebar.checkbox(key="profile_mode").check()
+    _run_ai(ai_app)
+    assert not ai_app.exception
+    assert "KB dữ liệu biểu đồ" in scatter_caption()
@@ -0,0 +1,41 @@
+# tests/test_backends.py
+
+import numpy as np
+import pytest
+
+from backends import compute_rfm_backend
+
+# Thư viện cần cho từng backend (pandas luôn có)
+BACKEND_MODULES = {"pandas": None, "polars": "polars", "duckdb": "duckdb"}
+
+
+@pytest.fixture(scope="module")
+def reference(retail_csv):
+    # Bản pandas cho từng bộ luật làm sạch
+    return {
+        drop_duplicates: compute_rfm_backend(retail_csv, "pandas", drop_duplicates=drop_duplicates)
+        for drop_duplicates in (True, False)
+    }
+
+
+@pytest.mark.parametrize("drop_duplicates", [True, False])
+@pytest.mark.parametrize("backend", list(BACKEND_MODULES))
+def test_backend_matches_pandas(retail_csv, reference, backend, drop_duplicates):
+    if BACKEND_MODULES[backend] is not None:
+        pytest.importorskip(BACKEND_MODULES[backend])
+    expected, expected_snapshot = reference[drop_duplicates]
+
+    rfm, snapshot = compute_rfm_backend(retail_csv, backend, drop_duplicates=drop_duplicates)
+
+    assert snapshot == expected_snapshot
+    assert list(rfm.columns) == list(expected.columns)
+    for col in ("Customer ID", "Recency", "Frequency"):
+        np.testing.assert_array_equal(rfm[col].to_numpy(), expected[col].to_numpy(), err_msg=col)
+    np.testing.assert_allclose(rfm["Monetary"].to_numpy(), expected["Monetary"].to_numpy(), rtol=1e-9)
+
+
+def test_drop_duplicates_changes_frequency_or_monetary(reference):
+    # Dữ liệu giả lập có dòng trùng: hai bộ luật phải cho kết quả khác nhau
+    deduped, _ = reference[True]
+    with_duplicates, _ = reference[False]
+    assert with_duplicates["Monetary"].sum() > deduped["Monetary"].sum()
@@ -0,0 +1,35 @@
+# tests/test_clean.py
+
+import pandas as pd
+
+from utils import RFM_COLUMNS, clean_retail_data, load_raw_data
+
+
+def test_compact_keeps_default_columns(retail_csv):
+    df_raw = load_raw_data(retail_csv)
+    full = clean_retail_data(df_raw)
+    compact = clean_retail_data(df_raw, compact=True)
+
+    assert list(compact.columns) == RFM_COLUMNS + ["TotalPrice"]
+    assert compact.index.equals(full.index)
+    assert (compact["InvoiceDate"] == full["InvoiceDate"]).all()
+
+
+def test_compact_respects_columns_without_invoice_date(retail_csv):
+    df_raw = load_raw_data(retail_csv)
+    full = clean_retail_data(df_raw)
+    compact = clean_retail_data(df_raw, compact=True, columns=["Customer ID", "Invoice"])
+
+    assert list(compact.columns) == ["Customer ID", "Invoice", "TotalPrice"]
+    assert compact.index.equals(full.index)
+    pd.testing.assert_series_equal(
+        compact["TotalPrice"], full["TotalPrice"].astype("float32"), check_names=False
+    )
+
+
+def test_compact_without_invoice_date_in_input(retail_csv):
+    df_raw = load_raw_data(retail_csv).drop(columns="InvoiceDate")
+    compact = clean_retail_data(df_raw, compact=True, columns=["Customer ID", "Quantity"])
+
+    assert list(compact.columns) == ["Customer ID", "Quantity", "TotalPrice"]
+    assert len(compact) == len(clean_retail_data(df_raw))
@@ -0,0 +1,32 @@
+# tests/test_dataset_store.py
+
+import time
+from concurrent.futures import Future
+
+from dataset_store import DatasetStore
+
+
+def test_pending_precompute_blocks_idle_eviction():
+    store = DatasetStore(idle_seconds=10, reap_interval=None)
+    store.put(("rfm", "abc"), 1)
+    future = Future()
+    store.hold_until("abc", future)
+
+    later = time.monotonic() + 60
+    assert store.evict_idle(later) == []
+    assert ("rfm", "abc") in store
+
+    # Xong: thời gian chờ loại tính lại từ lúc future xong
+    future.set_result(None)
+    assert store.evict_idle(time.monotonic() + 5) == []
+    assert store.evict_idle(time.monotonic() + 60) == ["abc"]
+
+
+def test_hold_on_finished_future_does_not_block():
+    store = DatasetStore(idle_seconds=10, reap_interval=None)
+    store.put(("rfm", "abc"), 1)
+    future = Future()
+    future.set_result(None)
+    store.hold_until("abc", future)
+
+    assert store.evict_idle(time.monotonic() + 60) == ["abc"]
@@ -0,0 +1,39 @@
+# tests/test_model_store.py
+
+import os
+
+import pandas as pd
+import pytest
+
+from model_store import ModelStore
+
+
+@pytest.fixture
+def rfm():
+    return pd.DataFrame({
+        "Customer ID": range(1, 41),
+        "Recency": [i % 7 * 10 for i in range(40)],
+        "Frequency": [i % 5 + 1 for i in range(40)],
+        "Monetary": [float(i * 13 % 97) for i in range(40)],
+    })
+
+
+@pytest.mark.parametrize("content", [b"", b"not a joblib file", b"\x80\x04\x95garbage"])
+def test_corrupt_entry_is_a_miss_and_removed(tmp_path, rfm, content):
+    store = ModelStore(str(tmp_path))
+    first = store.fit_or_load(rfm, n_clusters=3)
+    assert first["source"] == "fit"
+    (key,) = [m["key"] for m in store.entries()]
+    with open(store._model_path(key), "wb") as f:
+        f.write(content)
+
+    assert store.get(key) is None
+    assert not os.path.exists(store._model_path(key))
+    assert not os.path.exists(store._meta_path(key))
+    # Lần sau huấn luyện lại rồi lưu bản mới
+    assert store.fit_or_load(rfm, n_clusters=3)["source"] == "fit"
+    assert store.fit_or_load(rfm, n_clusters=3)["source"] == "store"
+
+
+def test_missing_entry_is_a_miss(tmp_path):
+    assert ModelStore(str(tmp_path)).get("0" * 32) is None
@@ -0,0 +1,34 @@
+# tests/test_pipeline.py
+
+import pytest
+
+from model_store import ModelStore
+from utils import run_rfm_kmeans_pipeline
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"chunksize": 1_000, "backend": "polars"},
+        {"use_cache": True, "chunksize": 1_000},
+        {"use_cache": True, "backend": "polars"},
+        {"columnar_cache": True, "chunksize": 1_000},
+        {"partition_by": "Country", "chunksize": 1_000},
+        {"partition_by": "Country", "backend": "duckdb"},
+        {"partition_by": "Country", "model_store": "store"},
+    ],
+)
+def test_incompatible_options_raise(retail_csv, tmp_path, options):
+    if options.get("model_store") == "store":
+        options = {**options, "model_store": ModelStore(tmp_path)}
+    with pytest.raises(ValueError):
+        run_rfm_kmeans_pipeline(retail_csv, **options)
+
+
+def test_chunked_matches_in_memory(retail_csv):
+    in_memory = run_rfm_kmeans_pipeline(retail_csv, n_clusters=3)
+    chunked = run_rfm_kmeans_pipeline(retail_csv, n_clusters=3, chunksize=5_000)
+    assert chunked["df_clean"] is None
+    assert chunked["rfm"][["Customer ID", "Recency", "Frequency"]].equals(
+        in_memory["rfm"][["Customer ID", "Recency", "Frequency"]]
+    )
@@ -0,0 +1,32 @@
+# tests/test_profiling.py
+
+import threading
+import tracemalloc
+
+import numpy as np
+
+from profiling import profile_stages, stage
+
+
+def test_overlapping_profilers_keep_tracemalloc_running():
+    inside = threading.Event()
+    release = threading.Event()
+
+    def other_session():
+        with profile_stages(trace_memory=True):
+            inside.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=other_session)
+    thread.start()
+    inside.wait(10)
+    with profile_stages(trace_memory=True) as prof:
+        # Phiên kia xong giữa chừng: không được tắt tracemalloc của phiên này
+        release.set()
+        thread.join()
+        assert tracemalloc.is_tracing()
+        with stage("alloc"):
+            block = np.ones(4 * 1024**2 // 8)
+        del block
+    assert not tracemalloc.is_tracing()
+    assert prof.records[0]["peak_mb"] >= 3.5
@@ -0,0 +1,21 @@
+# tests/test_rfm_state.py
+
+import numpy as np
+import pandas as pd
+
+from utils import RFMState, clean_retail_data, compute_rfm, load_raw_data
+
+
+def test_many_small_batches_match_compute_rfm(retail_csv):
+    df_raw = load_raw_data(retail_csv)
+    # Cắt theo ranh giới hoá đơn để không hoá đơn nào bị tách qua hai lô
+    starts = np.flatnonzero(df_raw["Invoice"].ne(df_raw["Invoice"].shift()).to_numpy())
+    bounds = list(starts[::50]) + [len(df_raw)]
+
+    state = RFMState()
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        state.update(df_raw.iloc[lo:hi])
+    expected, snapshot = compute_rfm(clean_retail_data(df_raw))
+
+    assert state.snapshot_date == snapshot
+    pd.testing.assert_frame_equal(state.to_rfm(), expected, check_dtype=False)
@@ -0,0 +1,33 @@
+# tests/test_scoring.py
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+
+from scoring import UNKNOWN_RANK, UNKNOWN_SEGMENT, SegmentScorer
+
+
+def test_cluster_without_members_is_unknown_segment():
+    rng = np.random.default_rng(0)
+    rfm = pd.DataFrame({
+        "Customer ID": np.arange(60),
+        "Recency": rng.integers(1, 300, 60),
+        "Frequency": rng.integers(1, 20, 60),
+        "Monetary": rng.uniform(10, 5_000, 60),
+    })
+    X = rfm[["Recency", "Frequency", "Monetary"]].to_numpy(dtype=np.float64)
+    scaler = StandardScaler().fit(X)
+    model = KMeans(n_clusters=3, n_init=1, random_state=0).fit(scaler.transform(X))
+    # Giả lập cụm 2 không có khách hàng nào: mọi dòng thuộc cụm 0 hoặc 1
+    rfm["Cluster"] = np.where(model.labels_ == 2, 0, model.labels_)
+
+    scorer = SegmentScorer.from_rfm(rfm, scaler, model)
+
+    assert scorer.ranks[2] == UNKNOWN_RANK
+    assert scorer.names[2] == UNKNOWN_SEGMENT
+    assert scorer.actions[2] == []
+    assert sorted(scorer.ranks[:2]) == [1, 2]
+    center = scaler.inverse_transform(model.cluster_centers_[[2]])
+    scored = scorer.score(pd.DataFrame(center, columns=["Recency", "Frequency", "Monetary"]))
+    assert scored.loc[0, "Segment"] == UNKNOWN_SEGMENT
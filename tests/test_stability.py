@@ -0,0 +1,27 @@
+# tests/test_stability.py
+
+import numpy as np
+import pytest
+
+import stability
+
+
+@pytest.mark.parametrize(
+    "bootstrap, max_fit_size, expected",
+    [(False, None, 800), (True, None, 1_000), (True, 600, 600), (False, 600, 600)],
+)
+def test_sample_size_per_run(monkeypatch, bootstrap, max_fit_size, expected):
+    seen = []
+
+    def fake_fit(X_scaled, n_clusters, seed, n_fit, replace, engine, n_threads):
+        seen.append((n_fit, replace))
+        return np.zeros((n_clusters, X_scaled.shape[1]))
+
+    monkeypatch.setattr(stability, "_fit_run", fake_fit)
+    X = np.random.default_rng(0).normal(size=(1_000, 3))
+
+    stability.bootstrap_centroids(
+        X, 3, n_runs=2, sample_fraction=0.8, bootstrap=bootstrap, max_fit_size=max_fit_size, n_jobs=1
+    )
+
+    assert seen == [(expected, bootstrap)] * 2
@@ -0,0 +1,19 @@
+# tests/test_sweep.py
+
+import numpy as np
+
+import utils
+
+
+def test_small_sweep_runs_without_process_pool(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("bảng nhỏ không được khởi động tiến trình con")
+
+    monkeypatch.setattr(utils, "_process_pool", no_pool)
+    X = np.random.default_rng(0).normal(size=(2_000, 3))
+
+    sweep = utils.sweep_kmeans(X, k_values=[2, 3], n_jobs=2)
+
+    assert sorted(sweep) == [2, 3]
+    for k, result in sweep.items():
+        np.testing.assert_array_equal(result["labels"], utils.train_kmeans(X, n_clusters=k).labels_)
@@ -1,157 +1,1223 @@
-# utils.py
-
-import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-
-
-# =========================
-# 1. Load & Clean dữ liệu
-# =========================
-
-def load_raw_data(path: str) -> pd.DataFrame:
-    """
-    Đọc file CSV Online Retail II từ Kaggle.
-    """
-    df = pd.read_csv(path)
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
-    return df
-
-
-def clean_retail_data(
-    df: pd.DataFrame,
-    drop_missing_customer: bool = True,
-    filter_positive_quantity: bool = True,
-    filter_positive_price: bool = True,
-    drop_duplicates: bool = True
-) -> pd.DataFrame:
-    """
-    Làm sạch dữ liệu cho bài toán RFM + K-Means.
-    - Bỏ Customer ID bị thiếu.
-    - Chỉ giữ Quantity > 0 (loại đơn trả hàng/hủy).
-    - (Tuỳ chọn) Chỉ giữ Price > 0.
-    - Xoá trùng hoàn toàn (nếu có).
-    - Tạo TotalPrice = Quantity * Price.
-    """
-    df_clean = df.copy()
-
-    if not np.issubdtype(df_clean["InvoiceDate"].dtype, np.datetime64):
-        df_clean["InvoiceDate"] = pd.to_datetime(df_clean["InvoiceDate"])
-
-    if drop_missing_customer:
-        df_clean = df_clean[df_clean["Customer ID"].notna()].copy()
-
-    if filter_positive_quantity:
-        df_clean = df_clean[df_clean["Quantity"] > 0].copy()
-
-    if filter_positive_price:
-        df_clean = df_clean[df_clean["Price"] > 0].copy()
-
-    if drop_duplicates:
-        df_clean = df_clean.drop_duplicates().copy()
-
-    df_clean["Customer ID"] = df_clean["Customer ID"].astype(int)
-    df_clean["TotalPrice"] = df_clean["Quantity"] * df_clean["Price"]
-
-    return df_clean
-
-
-# =========================
-# 2. RFM
-# =========================
-
-def compute_rfm(df_clean: pd.DataFrame, snapshot_date: pd.Timestamp | None = None):
-    """
-    Tính Recency, Frequency, Monetary cho mỗi khách hàng.
-    """
-    if snapshot_date is None:
-        snapshot_date = df_clean["InvoiceDate"].max() + pd.Timedelta(days=1)
-
-    rfm = (
-        df_clean
-        .groupby("Customer ID")
-        .agg(
-            Recency=("InvoiceDate", lambda x: (snapshot_date - x.max()).days),
-            Frequency=("Invoice", "nunique"),  # đếm số hóa đơn, không đếm số dòng
-            Monetary=("TotalPrice", "sum"),
-        )
-        .reset_index()
-    )
-
-    return rfm, snapshot_date
-
-
-# =========================
-# 3. Chuẩn hóa & K-Means
-# =========================
-
-def scale_rfm(rfm: pd.DataFrame, features=("Recency", "Frequency", "Monetary")):
-    """
-    Chuẩn hóa các cột R, F, M bằng StandardScaler.
-    """
-    scaler = StandardScaler()
-    X = rfm[list(features)].values
-    X_scaled = scaler.fit_transform(X)
-    return X_scaled, scaler
-
-
-def train_kmeans(X_scaled, n_clusters: int = 4, random_state: int = 42):
-    """
-    Huấn luyện K-Means trên dữ liệu RFM đã chuẩn hóa.
-    """
-    model = KMeans(
-        n_clusters=n_clusters,
-        random_state=random_state,
-        n_init=10
-    )
-    model.fit(X_scaled)
-    return model
-
-
-# =========================
-# 4. Pipeline tiện dụng
-# =========================
-
-def run_rfm_kmeans_pipeline(
-    path_to_csv: str,
-    n_clusters: int = 4,
-):
-    """
-    Chạy full pipeline:
-        - load_raw_data
-        - clean_retail_data
-        - compute_rfm
-        - scale_rfm
-        - train_kmeans
-    Trả về dict chứa các thành phần để Người 2 & 3 có thể dùng tiếp.
-    """
-    df_raw = load_raw_data(path_to_csv)
-    df_clean = clean_retail_data(df_raw)
-
-    rfm, snapshot_date = compute_rfm(df_clean)
-    X_scaled, scaler = scale_rfm(rfm)
-    kmeans_model = train_kmeans(X_scaled, n_clusters=n_clusters)
-
-    # Gán nhãn cụm vào RFM
-    rfm = rfm.copy()
-    rfm["Cluster"] = kmeans_model.labels_
-
-    return {
-        "df_raw": df_raw,
-        "df_clean": df_clean,
-        "rfm": rfm,
-        "snapshot_date": snapshot_date,
-        "scaler": scaler,
-        "kmeans_model": kmeans_model,
-    }
-
-    """
-    Khi chạy chỉ cần chạy đoạn sau:
-    
-    from utils import run_rfm_kmeans_pipeline
-
-    result = run_rfm_kmeans_pipeline("data/online_retail_II.csv", n_clusters=4)  
-
-    rfm = result["rfm"]   # có cột Cluster
-    """
\ No newline at end of file
+# utils.py
+
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+from threadpoolctl import threadpool_limits
+
+from profiling import StageProfiler, instrumented, profile_stages, stage
+
+
+# =========================
+# 1. Load & Clean dữ liệu
+# =========================
+
+# Schema cố định của Online Retail II (Kaggle) cho chế độ đọc columnar.
+# Customer ID trong CSV có dạng "13085.0" nên đọc float64 rồi chuyển sang Int64 (nullable).
+RETAIL_CSV_DTYPES = {
+    "Invoice": str,
+    "StockCode": "category",
+    "Description": "category",
+    "Quantity": "int64",
+    "Price": "float64",
+    "Customer ID": "float64",
+    "Country": "category",
+}
+INVOICE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Các cột cần cho RFM (dùng cho column projection)
+RFM_COLUMNS = ["Invoice", "InvoiceDate", "Customer ID", "Quantity", "Price"]
+
+try:
+    import pyarrow  # noqa: F401
+    _HAS_PYARROW = True
+except ImportError:
+    _HAS_PYARROW = False
+
+
+@instrumented
+def load_raw_data(path, columns=None, columnar_cache: bool = False) -> pd.DataFrame:
+    """
+    Đọc file CSV Online Retail II từ Kaggle.
+    `path` có thể là đường dẫn hoặc file-like (vd. file upload của Streamlit).
+    - `columns`: chỉ đọc các cột cần thiết (column projection).
+    - `columnar_cache=True`: đọc CSV đúng một lần với schema cố định (category, Int64,
+      InvoiceDate theo format đã biết), ghi file Parquet đi kèm `<path>.parquet`
+      và các lần sau đọc thẳng từ Parquet. Cần pyarrow; file-like thì chỉ đọc theo schema.
+    Lưu ý: chọn bớt cột trước khi `clean_retail_data` sẽ làm `drop_duplicates`
+    chỉ so sánh trên các cột đã chọn.
+    """
+    if not columnar_cache:
+        df = pd.read_csv(path, usecols=columns)
+        if "InvoiceDate" in df.columns:
+            df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
+        return df
+
+    sidecar = _parquet_sidecar_path(path)
+    if sidecar is not None and _is_sidecar_fresh(path, sidecar):
+        return pd.read_parquet(sidecar, columns=columns)
+
+    df = read_retail_csv_typed(path)
+    if sidecar is not None:
+        try:
+            df.to_parquet(sidecar, index=False)
+        except OSError:
+            # Thư mục chỉ đọc: vẫn trả dữ liệu, lần sau đọc lại CSV
+            pass
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def read_retail_csv_typed(path, columns=None, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Đọc CSV Online Retail II với schema cố định thay vì để pandas tự suy kiểu.
+    Nếu truyền `chunksize` thì trả về iterator các DataFrame đã ép kiểu.
+    """
+    usecols = None if columns is None else list(columns)
+    dtypes = {
+        col: dtype for col, dtype in RETAIL_CSV_DTYPES.items()
+        if usecols is None or col in usecols
+    }
+    reader = pd.read_csv(path, usecols=usecols, dtype=dtypes, **read_csv_kwargs)
+    if read_csv_kwargs.get("chunksize") is not None:
+        return (_apply_retail_schema(chunk) for chunk in reader)
+    return _apply_retail_schema(reader)
+
+
+def _apply_retail_schema(df: pd.DataFrame) -> pd.DataFrame:
+    if "Customer ID" in df.columns:
+        df["Customer ID"] = df["Customer ID"].astype("Int64")
+    if "InvoiceDate" in df.columns:
+        df["InvoiceDate"] = _parse_invoice_date(df["InvoiceDate"])
+    return df
+
+
+def _parse_invoice_date(s: pd.Series) -> pd.Series:
+    try:
+        return pd.to_datetime(s, format=INVOICE_DATE_FORMAT)
+    except (ValueError, TypeError):
+        # File export khác định dạng (vd. "12/1/2009 7:45") -> để pandas tự suy
+        return pd.to_datetime(s)
+
+
+def _parquet_sidecar_path(path) -> str | None:
+    if not _HAS_PYARROW or not isinstance(path, (str, os.PathLike)):
+        return None
+    return f"{os.fspath(path)}.parquet"
+
+
+def _is_sidecar_fresh(path, sidecar: str) -> bool:
+    return os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path)
+
+
+# Kiểu dữ liệu gọn cho chế độ compact của clean_retail_data
+COMPACT_DTYPES = {
+    "Invoice": "category",
+    "StockCode": "category",
+    "Description": "category",
+    "Country": "category",
+    "Quantity": "int32",
+    "Price": "float32",
+    "Customer ID": "int32",
+}
+
+
+@instrumented
+def clean_retail_data(
+    df: pd.DataFrame,
+    drop_missing_customer: bool = True,
+    filter_positive_quantity: bool = True,
+    filter_positive_price: bool = True,
+    drop_duplicates: bool = True,
+    compact: bool = False,
+    columns=None,
+) -> pd.DataFrame:
+    """
+    Làm sạch dữ liệu cho bài toán RFM + K-Means.
+    - Bỏ Customer ID bị thiếu.
+    - Chỉ giữ Quantity > 0 (loại đơn trả hàng/hủy).
+    - (Tuỳ chọn) Chỉ giữ Price > 0.
+    - Xoá trùng hoàn toàn (nếu có).
+    - Tạo TotalPrice = Quantity * Price.
+    Mọi điều kiện được gộp thành một mask, kết quả chỉ được tạo (copy) một lần.
+    `compact=True`: chỉ giữ các cột trong `columns` (mặc định RFM_COLUMNS, cột không có trong
+    df bị bỏ qua) theo đúng thứ tự đó, cộng thêm TotalPrice, và ép về kiểu gọn
+    (Customer ID int32, Price/TotalPrice float32, chuỗi -> category).
+    Customer ID, Quantity và Price luôn cần có trong df (để lọc và tính TotalPrice).
+    """
+    overrides = {}
+    date_converted = False
+    if "InvoiceDate" in df.columns:
+        invoice_date = df["InvoiceDate"]
+        date_converted = not pd.api.types.is_datetime64_any_dtype(invoice_date)
+        if date_converted:
+            invoice_date = overrides["InvoiceDate"] = pd.to_datetime(invoice_date)
+
+    mask = np.ones(len(df), dtype=bool)
+    if drop_missing_customer:
+        mask &= df["Customer ID"].notna().to_numpy()
+    if filter_positive_quantity:
+        mask &= (df["Quantity"] > 0).to_numpy()
+    if filter_positive_price:
+        mask &= (df["Price"] > 0).to_numpy()
+
+    rows = np.flatnonzero(mask)
+    if drop_duplicates:
+        rows = rows[~_duplicated_rows(df, rows, overrides)]
+
+    if compact:
+        keep = [c for c in (RFM_COLUMNS if columns is None else columns) if c in df.columns]
+        df_clean = pd.DataFrame(
+            {
+                col: invoice_date.take(rows) if col == "InvoiceDate" else _compact_column(df[col].take(rows), col)
+                for col in keep
+            },
+            index=df.index[rows],
+        )
+        quantity = df["Quantity"].to_numpy()[rows]
+        price = df["Price"].to_numpy()[rows]
+        df_clean["TotalPrice"] = (quantity * price).astype("float32")
+        return df_clean
+
+    df_clean = df.take(rows)
+    if date_converted:
+        df_clean["InvoiceDate"] = invoice_date.take(rows)
+    df_clean["Customer ID"] = df_clean["Customer ID"].astype(int)
+    df_clean["TotalPrice"] = df_clean["Quantity"] * df_clean["Price"]
+
+    return df_clean
+
+
+def _duplicated_rows(df: pd.DataFrame, rows: np.ndarray, overrides: dict) -> np.ndarray:
+    """
+    Như `df.take(rows).duplicated()` nhưng không tạo bản sao của cả bảng:
+    mã hoá từng cột (factorize) rồi gộp dần thành một mã nhóm cho mỗi dòng.
+    """
+    group_ids = np.zeros(len(rows), dtype=np.int64)
+    n_groups = 1
+    for col in df.columns:
+        values = overrides.get(col, df[col]).take(rows)
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        if n_groups * len(uniques) >= 2**62:
+            # Sắp tràn int64: nén mã nhóm về 0..(số nhóm thực tế - 1)
+            group_ids, uniq_ids = pd.factorize(group_ids)
+            n_groups = len(uniq_ids)
+        group_ids = group_ids * len(uniques) + codes
+        n_groups *= max(len(uniques), 1)
+    return pd.Series(group_ids).duplicated().to_numpy()
+
+
+def _compact_column(s: pd.Series, col: str) -> pd.Series:
+    dtype = COMPACT_DTYPES.get(col)
+    if dtype is None:
+        return s
+    if col == "Customer ID" and s.dtype.kind == "f":
+        # float -> int32 phải qua int64 trước để astype không báo lỗi làm tròn
+        s = s.astype("int64")
+    return s.astype(dtype)
+
+
+# =========================
+# 2. RFM
+# =========================
+
+def build_invoice_table(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """
+    Gộp các dòng hàng thành một dòng cho mỗi (Customer ID, Invoice):
+    InvoiceDate = thời điểm muộn nhất, TotalPrice = tổng tiền của hoá đơn.
+    Bảng này nhỏ hơn nhiều so với df_clean và dùng lại được cho `compute_rfm`.
+    """
+    return (
+        df_clean
+        .groupby(["Customer ID", "Invoice"], sort=False, observed=True)
+        .agg(
+            InvoiceDate=("InvoiceDate", "max"),
+            TotalPrice=("TotalPrice", "sum"),
+        )
+        .reset_index()
+    )
+
+
+@instrumented
+def compute_rfm(
+    df_clean: pd.DataFrame | None = None,
+    snapshot_date: pd.Timestamp | None = None,
+    invoices: pd.DataFrame | None = None,
+):
+    """
+    Tính Recency, Frequency, Monetary cho mỗi khách hàng.
+    Chỉ dùng các phép groupby có sẵn (max / nunique / sum), Recency tính một lần
+    trên cả cột ngày thay vì lambda cho từng khách hàng.
+    Nếu truyền `invoices` (từ `build_invoice_table`) thì Frequency chỉ là số dòng
+    của mỗi khách hàng, không cần nunique trên từng dòng hàng.
+    """
+    if invoices is not None:
+        grouped = invoices.groupby("Customer ID")
+        frequency = ("Invoice", "size")
+        source = invoices
+    elif df_clean is not None:
+        grouped = df_clean.groupby("Customer ID")
+        frequency = ("Invoice", "nunique")  # đếm số hóa đơn, không đếm số dòng
+        source = df_clean
+    else:
+        raise ValueError("Cần truyền df_clean hoặc invoices")
+
+    if snapshot_date is None:
+        snapshot_date = source["InvoiceDate"].max() + pd.Timedelta(days=1)
+
+    partials = grouped.agg(
+        LastPurchase=("InvoiceDate", "max"),
+        Frequency=frequency,
+        Monetary=("TotalPrice", "sum"),
+    )
+    return rfm_from_partials(partials, snapshot_date)
+
+
+def partial_rfm(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tổng hợp từng phần theo khách hàng (index = Customer ID):
+    LastPurchase (max), Frequency (số hoá đơn), Monetary (tổng).
+    Các phần này gộp được với nhau bằng `merge_partial_rfm`.
+    """
+    return df_clean.groupby("Customer ID").agg(
+        LastPurchase=("InvoiceDate", "max"),
+        Frequency=("Invoice", "nunique"),
+        Monetary=("TotalPrice", "sum"),
+    )
+
+
+def merge_partial_rfm(*parts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Gộp nhiều bảng tổng hợp từng phần: max ngày mua cuối, cộng Frequency và Monetary.
+    Frequency chỉ đúng khi mỗi hoá đơn nằm trọn trong một phần.
+    """
+    parts = [p for p in parts if p is not None and len(p)]
+    if not parts:
+        return pd.DataFrame(
+            {
+                "LastPurchase": pd.Series(dtype="datetime64[ns]"),
+                "Frequency": pd.Series(dtype="int64"),
+                "Monetary": pd.Series(dtype="float64"),
+            },
+            index=pd.Index([], name="Customer ID", dtype="int64"),
+        )
+    if len(parts) == 1:
+        return parts[0]
+    return pd.concat(parts).groupby(level=0).agg(
+        {"LastPurchase": "max", "Frequency": "sum", "Monetary": "sum"}
+    )
+
+
+def rfm_from_partials(partials: pd.DataFrame, snapshot_date: pd.Timestamp | None = None):
+    """
+    Chuyển bảng tổng hợp từng phần thành bảng rfm (Customer ID, Recency, Frequency, Monetary).
+    """
+    if snapshot_date is None:
+        snapshot_date = partials["LastPurchase"].max() + pd.Timedelta(days=1)
+
+    rfm = partials[["Frequency", "Monetary"]].copy()
+    rfm.insert(0, "Recency", (snapshot_date - partials["LastPurchase"]).dt.days)
+    rfm = rfm.reset_index()
+
+    return rfm, snapshot_date
+
+
+def iter_invoice_blocks(path, chunksize: int = 200_000):
+    """
+    Đọc CSV theo từng chunk và trả về các khối dòng sao cho mỗi hoá đơn nằm trọn
+    trong một khối: các dòng của hoá đơn cuối chunk được giữ lại và nối vào chunk sau.
+    Giả định các dòng của cùng một hoá đơn nằm liền nhau (đúng với file export Online Retail II).
+    """
+    carry = None
+    for chunk in read_retail_csv_typed(path, chunksize=chunksize):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        is_tail = chunk["Invoice"].eq(chunk["Invoice"].iat[-1]).to_numpy()
+        carry = chunk[is_tail]
+        if not is_tail.all():
+            yield chunk[~is_tail]
+    if carry is not None and len(carry):
+        yield carry
+
+
+@instrumented
+def compute_rfm_chunked(
+    path,
+    chunksize: int = 200_000,
+    snapshot_date: pd.Timestamp | None = None,
+    **clean_kwargs,
+):
+    """
+    Tính rfm cho file lớn hơn RAM: đọc từng chunk, làm sạch theo đúng luật của
+    `clean_retail_data`, rồi gộp dần vào bảng tổng hợp theo khách hàng.
+    Bộ nhớ đỉnh ~ chunksize dòng + số khách hàng, không phụ thuộc số dòng của file.
+    Kết quả giống `compute_rfm(clean_retail_data(load_raw_data(path)))`
+    (vì mỗi hoá đơn nằm trọn trong một khối nên drop_duplicates và nunique vẫn chính xác).
+    """
+    state = compute_partial_rfm_chunked(path, chunksize=chunksize, **clean_kwargs)
+    return rfm_from_partials(state, snapshot_date)
+
+
+def compute_partial_rfm_chunked(path, chunksize: int = 200_000, **clean_kwargs) -> pd.DataFrame:
+    """
+    Như `compute_rfm_chunked` nhưng trả về bảng tổng hợp từng phần (xem `partial_rfm`).
+    """
+    state = None
+    pending: list[pd.DataFrame] = []
+    pending_rows = 0
+    for block in iter_invoice_blocks(path, chunksize=chunksize):
+        block_clean = clean_retail_data(block, **clean_kwargs)
+        if block_clean.empty:
+            continue
+        part = partial_rfm(block_clean)
+        pending.append(part)
+        pending_rows += len(part)
+        # Gộp khi phần chờ lớn cỡ state hiện tại -> tổng chi phí gộp vẫn tuyến tính
+        if pending_rows >= max(chunksize, 0 if state is None else len(state)):
+            state = merge_partial_rfm(state, *pending)
+            pending, pending_rows = [], 0
+    return merge_partial_rfm(state, *pending)
+
+
+class RFMState:
+    """
+    Trạng thái RFM theo khách hàng, cập nhật dần theo từng lô giao dịch mới
+    thay vì chạy lại toàn bộ lịch sử.
+    - `partials`: bảng như `partial_rfm` (index = Customer ID, tăng dần như `compute_rfm`).
+    - `snapshot_date`: ngày mốc tính Recency (ngày mua cuối cùng + 1 ngày).
+    Giả định một hoá đơn không bị tách qua hai lô, và các lô không trùng dòng với nhau
+    (trùng lặp chỉ được loại trong nội bộ mỗi lô).
+    """
+
+    def __init__(self, partials: pd.DataFrame | None = None, snapshot_date: pd.Timestamp | None = None):
+        self._partials = merge_partial_rfm(partials).sort_index()
+        # Các lô đã tổng hợp nhưng chưa gộp vào `_partials` (gộp dồn, xem `update`)
+        self._pending: list[pd.DataFrame] = []
+        self._pending_rows = 0
+        if snapshot_date is None and len(self._partials):
+            snapshot_date = self._partials["LastPurchase"].max() + pd.Timedelta(days=1)
+        self.snapshot_date = snapshot_date
+
+    @property
+    def partials(self) -> pd.DataFrame:
+        if self._pending:
+            self._merge_pending()
+        return self._partials
+
+    def __len__(self) -> int:
+        return len(self.partials)
+
+    def _merge_pending(self) -> None:
+        self._partials = merge_partial_rfm(self._partials, *self._pending)
+        self._pending, self._pending_rows = [], 0
+
+    @classmethod
+    def from_transactions(cls, df_raw: pd.DataFrame, **clean_kwargs) -> "RFMState":
+        """
+        Tạo trạng thái từ dữ liệu thô (đã nằm trong bộ nhớ).
+        """
+        return cls(partial_rfm(clean_retail_data(df_raw, **clean_kwargs)))
+
+    @classmethod
+    def from_csv(cls, path, chunksize: int = 200_000, **clean_kwargs) -> "RFMState":
+        """
+        Tạo trạng thái từ file CSV lịch sử, đọc theo từng chunk.
+        """
+        return cls(compute_partial_rfm_chunked(path, chunksize=chunksize, **clean_kwargs))
+
+    def update(self, df_batch: pd.DataFrame, **clean_kwargs) -> "RFMState":
+        """
+        Gộp một lô giao dịch thô mới: làm sạch theo luật `clean_retail_data`, tổng hợp theo
+        khách hàng rồi đưa vào hàng chờ; dời snapshot_date về sau.
+        Hàng chờ chỉ được gộp vào trạng thái khi lớn cỡ trạng thái (hoặc khi đọc `partials`),
+        nên tổng chi phí của nhiều lô nhỏ tỉ lệ với tổng số dòng, không theo (số lô x số khách hàng).
+        """
+        batch_clean = clean_retail_data(df_batch, **clean_kwargs)
+        if batch_clean.empty:
+            return self
+        part = partial_rfm(batch_clean)
+        self._pending.append(part)
+        self._pending_rows += len(part)
+        if self._pending_rows >= len(self._partials):
+            self._merge_pending()
+
+        batch_snapshot = part["LastPurchase"].max() + pd.Timedelta(days=1)
+        if self.snapshot_date is None or batch_snapshot > self.snapshot_date:
+            self.snapshot_date = batch_snapshot
+        return self
+
+    def to_rfm(self) -> pd.DataFrame:
+        """
+        Bảng rfm (Customer ID, Recency, Frequency, Monetary) tại snapshot_date hiện tại.
+        """
+        rfm, _ = rfm_from_partials(self.partials, self.snapshot_date)
+        return rfm
+
+    def assign_clusters(self, scaler, kmeans_model, features=("Recency", "Frequency", "Monetary")) -> pd.DataFrame:
+        """
+        Gán cụm bằng `scaler` / `kmeans_model` đã huấn luyện, không huấn luyện lại.
+        """
+        rfm = self.to_rfm()
+        rfm["Cluster"] = kmeans_model.predict(scaler.transform(rfm[list(features)].values))
+        return rfm
+
+    def save(self, path) -> None:
+        """
+        Lưu trạng thái dạng mảng numpy nén (.npz): gọn và không cần thư viện ngoài.
+        """
+        p = self.partials
+        snapshot = np.datetime64("NaT") if self.snapshot_date is None else self.snapshot_date
+        np.savez_compressed(
+            path,
+            customer_id=p.index.to_numpy(dtype="int64"),
+            last_purchase=p["LastPurchase"].to_numpy(dtype="datetime64[ns]").view("int64"),
+            frequency=p["Frequency"].to_numpy(dtype="int64"),
+            monetary=p["Monetary"].to_numpy(dtype="float64"),
+            snapshot_date=np.array([np.datetime64(snapshot, "ns")]).view("int64"),
+        )
+
+    @classmethod
+    def load(cls, path) -> "RFMState":
+        with np.load(path) as data:
+            partials = pd.DataFrame(
+                {
+                    "LastPurchase": data["last_purchase"].view("datetime64[ns]"),
+                    "Frequency": data["frequency"],
+                    "Monetary": data["monetary"],
+                },
+                index=pd.Index(data["customer_id"], name="Customer ID"),
+            )
+            snapshot = pd.Timestamp(data["snapshot_date"].view("datetime64[ns]")[0])
+        return cls(partials, None if pd.isna(snapshot) else snapshot)
+
+
+# =========================
+# 3. Chuẩn hóa & K-Means
+# =========================
+
+@instrumented
+def scale_rfm(rfm: pd.DataFrame, features=("Recency", "Frequency", "Monetary")):
+    """
+    Chuẩn hóa các cột R, F, M bằng StandardScaler.
+    """
+    scaler = StandardScaler()
+    X = rfm[list(features)].values
+    X_scaled = scaler.fit_transform(X)
+    return X_scaled, scaler
+
+
+KMEANS_ENGINES = ("kmeans", "minibatch", "sample")
+
+
+@instrumented
+def train_kmeans(
+    X_scaled,
+    n_clusters: int = 4,
+    random_state: int = 42,
+    engine: str = "kmeans",
+    sample_size: int = 50_000,
+    batch_size: int = 100_000,
+    init=None,
+):
+    """
+    Huấn luyện K-Means trên dữ liệu RFM đã chuẩn hóa.
+    engine:
+        - "kmeans":    KMeans đầy đủ, n_init=10 (mặc định, chính xác nhất)
+        - "minibatch": MiniBatchKMeans, nhanh hơn nhiều khi có hàng triệu khách hàng
+        - "sample":    KMeans trên mẫu phân tầng `sample_size` điểm, rồi gán nhãn cho
+                       toàn bộ bằng predict theo từng batch `batch_size`
+    (MiniBatchKMeans dùng batch min(batch_size, 4096)).
+    Với mọi engine, `labels_` và `inertia_` của model trả về tính trên toàn bộ X_scaled.
+    `init`: mảng tâm cụm ban đầu (K x số cột) để warm-start, khi đó chỉ chạy 1 lần khởi tạo.
+    """
+    init_kwargs = {} if init is None else {"init": np.asarray(init), "n_init": 1}
+    if engine == "kmeans":
+        model = KMeans(**{
+            "n_clusters": n_clusters,
+            "random_state": random_state,
+            "n_init": 10,
+            **init_kwargs,
+        })
+        model.fit(X_scaled)
+    elif engine == "minibatch":
+        model = MiniBatchKMeans(**{
+            "n_clusters": n_clusters,
+            "random_state": random_state,
+            "batch_size": min(batch_size, 4096),
+            "n_init": 3,
+            **init_kwargs,
+        })
+        model.fit(X_scaled)
+    elif engine == "sample":
+        X_scaled = np.asarray(X_scaled)
+        idx = stratified_sample_indices(X_scaled, sample_size, random_state=random_state)
+        model = KMeans(**{
+            "n_clusters": n_clusters,
+            "random_state": random_state,
+            "n_init": 10,
+            **init_kwargs,
+        })
+        model.fit(X_scaled[idx])
+        if len(idx) < len(X_scaled):
+            model.labels_, model.inertia_ = assign_in_batches(model, X_scaled, batch_size=batch_size)
+    else:
+        raise ValueError(f"engine phải là một trong {KMEANS_ENGINES}, nhận được {engine!r}")
+    return model
+
+
+def stratified_sample_indices(X, sample_size: int, n_bins: int = 4, random_state: int = 42) -> np.ndarray:
+    """
+    Chọn mẫu phân tầng theo các khoảng phân vị của từng cột (n_bins^số cột tầng),
+    mỗi tầng lấy theo tỉ lệ và ít nhất 1 điểm -> giữ được các nhóm nhỏ/ngoại lai.
+    """
+    n = len(X)
+    if sample_size >= n:
+        return np.arange(n)
+
+    strata = np.zeros(n, dtype=np.int64)
+    for j in range(X.shape[1]):
+        edges = np.quantile(X[:, j], np.linspace(0, 1, n_bins + 1)[1:-1])
+        strata = strata * n_bins + np.searchsorted(edges, X[:, j], side="right")
+
+    # Xáo ngẫu nhiên rồi xếp theo tầng: thứ hạng trong tầng là ngẫu nhiên
+    rng = np.random.default_rng(random_state)
+    order = rng.permutation(n)
+    order = order[np.argsort(strata[order], kind="stable")]
+    _, start, counts = np.unique(strata[order], return_index=True, return_counts=True)
+    quota = np.maximum(1, np.round(counts * sample_size / n).astype(np.int64))
+    rank = np.arange(n) - np.repeat(start, counts)
+    return np.sort(order[rank < np.repeat(quota, counts)])
+
+
+def assign_in_batches(model, X, batch_size: int = 100_000):
+    """
+    Gán cụm gần nhất cho X theo từng batch (bộ nhớ ~ batch_size x K).
+    Trả về (labels, inertia) trên toàn bộ X.
+    """
+    labels = np.empty(len(X), dtype=np.int32)
+    inertia = 0.0
+    for start in range(0, len(X), batch_size):
+        dist = model.transform(X[start:start + batch_size])
+        nearest = dist.argmin(axis=1)
+        labels[start:start + batch_size] = nearest
+        inertia += float((dist[np.arange(len(nearest)), nearest] ** 2).sum())
+    return labels, inertia
+
+
+def compare_kmeans_engines(
+    X_scaled,
+    n_clusters: int = 4,
+    engines=KMEANS_ENGINES,
+    random_state: int = 42,
+    **engine_kwargs,
+) -> pd.DataFrame:
+    """
+    So sánh các engine với KMeans đầy đủ: thời gian fit, inertia (tỉ lệ so với bản
+    chính xác, càng gần 1 càng tốt) và độ khớp nhãn (Adjusted Rand Index, 1 = giống hệt).
+    """
+    rows = []
+    reference = None
+    for engine in ("kmeans",) + tuple(e for e in engines if e != "kmeans"):
+        start = time.perf_counter()
+        model = train_kmeans(X_scaled, n_clusters=n_clusters, random_state=random_state, engine=engine, **engine_kwargs)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = model
+        rows.append({
+            "Engine": engine,
+            "FitSeconds": round(elapsed, 3),
+            "Inertia": float(model.inertia_),
+            "InertiaRatio": float(model.inertia_) / float(reference.inertia_),
+            "LabelAgreementARI": adjusted_rand_score(reference.labels_, model.labels_),
+        })
+    return pd.DataFrame(rows)
+
+
+# Khoảng K mặc định của thanh trượt trong tab AI
+DEFAULT_K_RANGE = range(2, 7)
+
+
+# =========================
+# Chạy song song trên nhiều tiến trình (sweep_kmeans, partitioned, stability)
+# =========================
+
+def _parallel_plan(n_tasks: int, n_jobs: int | None = None) -> tuple[int, int]:
+    """
+    Số tiến trình (không quá số việc; mặc định số CPU) và số thread BLAS/OpenMP cho mỗi
+    tiến trình, sao cho tổng số thread không vượt số CPU. Trả về (n_jobs, n_threads).
+    """
+    n_cpu = os.cpu_count() or 1
+    n_jobs = min(n_tasks, n_cpu if n_jobs is None else n_jobs)
+    return n_jobs, max(1, n_cpu // max(n_jobs, 1))
+
+
+def _limit_threads(n_threads: int):
+    # Giới hạn số thread BLAS/OpenMP để các tiến trình chạy song song không tranh CPU
+    return threadpool_limits(limits=n_threads)
+
+
+def _process_pool(n_jobs: int, **kwargs) -> ProcessPoolExecutor:
+    """
+    Pool tiến trình khởi tạo kiểu "spawn": tiến trình con không kế thừa các thread đang chạy
+    của tiến trình cha (Streamlit, thread tính trước, pool BLAS), nên không bị treo vì fork
+    giữa lúc một thread đang giữ lock.
+    """
+    return ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn"), **kwargs)
+
+
+def _fit_k(
+    X_scaled,
+    n_clusters: int,
+    random_state: int,
+    silhouette_sample_size: int | None,
+    n_threads: int,
+    engine: str,
+    init=None,
+):
+    with _limit_threads(n_threads):
+        model = train_kmeans(X_scaled, n_clusters=n_clusters, random_state=random_state, engine=engine, init=init)
+        silhouette = sampled_silhouette(X_scaled, model.labels_, silhouette_sample_size, random_state)
+    return sweep_entry(model, silhouette)
+
+
+def sampled_silhouette(X_scaled, labels, sample_size: int | None = 10_000, random_state: int = 42) -> float:
+    """
+    Silhouette score trên tối đa `sample_size` điểm (NaN nếu chỉ có 1 cụm hoặc
+    mỗi điểm là một cụm).
+    """
+    if not 2 <= len(np.unique(labels)) < len(labels):
+        return float("nan")
+    sample_size = sample_size if sample_size and len(labels) > sample_size else None
+    return float(silhouette_score(X_scaled, labels, sample_size=sample_size, random_state=random_state))
+
+
+def sweep_entry(model, silhouette: float) -> dict:
+    """
+    Một phần tử kết quả của `sweep_kmeans` cho một K.
+    """
+    return {
+        "k": int(model.n_clusters),
+        "model": model,
+        "labels": model.labels_,
+        "centroids": model.cluster_centers_,
+        "inertia": float(model.inertia_),
+        "silhouette": silhouette,
+    }
+
+
+@instrumented
+def sweep_kmeans(
+    X_scaled,
+    k_values=DEFAULT_K_RANGE,
+    random_state: int = 42,
+    n_jobs: int | None = None,
+    silhouette_sample_size: int | None = 10_000,
+    engine: str = "kmeans",
+    inits: dict | None = None,
+    min_parallel_rows: int = 200_000,
+) -> dict:
+    """
+    Huấn luyện K-Means cho mọi K trong `k_values` song song trên nhiều tiến trình.
+    Trả về dict {K: {"model", "labels", "centroids", "inertia", "silhouette"}};
+    nhãn giống hệt `train_kmeans` với cùng K và random_state, nên đổi K chỉ là tra cứu.
+    Silhouette tính trên mẫu `silhouette_sample_size` điểm để không tốn O(n^2).
+    `inits`: {K: tâm cụm ban đầu} để warm-start một số K (xem `train_kmeans`).
+    Dưới `min_parallel_rows` dòng, các K chạy tuần tự trong tiến trình hiện tại (BLAS dùng mọi
+    CPU): mỗi tiến trình spawn phải import lại sklearn / pandas (~1s), đắt hơn cả lượt quét.
+    """
+    inits = inits or {}
+    k_values = sorted(set(int(k) for k in k_values))
+    if len(X_scaled) < min_parallel_rows:
+        n_jobs = 1
+    n_jobs, n_threads = _parallel_plan(len(k_values), n_jobs)
+
+    if n_jobs <= 1:
+        results = [
+            _fit_k(X_scaled, k, random_state, silhouette_sample_size, n_threads, engine, inits.get(k))
+            for k in k_values
+        ]
+    else:
+        with _process_pool(n_jobs) as pool:
+            futures = [
+                pool.submit(_fit_k, X_scaled, k, random_state, silhouette_sample_size, n_threads, engine, inits.get(k))
+                for k in k_values
+            ]
+            results = [f.result() for f in futures]
+    return {r["k"]: r for r in results}
+
+
+def sweep_summary(sweep: dict) -> pd.DataFrame:
+    """
+    Bảng K / Inertia / Silhouette để vẽ biểu đồ Elbow & Silhouette.
+    """
+    return pd.DataFrame(
+        [{"K": k, "Inertia": r["inertia"], "Silhouette": r["silhouette"]} for k, r in sorted(sweep.items())]
+    )
+
+
+# =========================
+# 4. Cache load → clean → RFM
+# =========================
+
+class LRUCache:
+    """
+    Cache trong bộ nhớ có giới hạn số phần tử, loại phần tử lâu không dùng nhất (LRU).
+    Dùng chung cho mọi session/tab của Streamlit nên có khoá để an toàn đa luồng;
+    mỗi key chỉ được tính đúng một lần kể cả khi nhiều session gọi cùng lúc.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        if maxsize < 1:
+            raise ValueError("maxsize phải >= 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Trả về giá trị đã cache, nếu chưa có thì gọi `compute()` và lưu lại.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Một thread khác có thể vừa tính xong trong lúc chờ khoá
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key]
+                self.misses += 1
+            try:
+                value = compute()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return value
+
+    def values(self) -> list:
+        with self._lock:
+            return list(self._data.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Cache mặc định của các hàm `*_cached` khi không truyền `cache=` (script, pipeline với use_cache).
+# App Streamlit dùng kho dùng chung `dataset_store.DatasetStore` thay cho cache này.
+_STAGE_CACHE = LRUCache(maxsize=8)
+
+_CLEAN_FLAG_DEFAULTS = {
+    "drop_missing_customer": True,
+    "filter_positive_quantity": True,
+    "filter_positive_price": True,
+    "drop_duplicates": True,
+    "compact": False,
+    "columns": None,
+}
+
+
+def get_stage_cache() -> LRUCache:
+    """
+    Trả về cache dùng chung của các bước load → clean → RFM.
+    """
+    return _STAGE_CACHE
+
+
+def fingerprint_source(source) -> str:
+    """
+    Tạo fingerprint cho nguồn dữ liệu:
+    - Đường dẫn: đường dẫn tuyệt đối + mtime + kích thước file (không cần đọc file).
+    - bytes / file upload / file-like: hash nội dung.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (str, os.PathLike)):
+        st = os.stat(source)
+        h.update(f"path:{os.path.abspath(source)}:{st.st_mtime_ns}:{st.st_size}".encode())
+    else:
+        h.update(b"bytes:")
+        h.update(_read_source_bytes(source))
+    return h.hexdigest()
+
+
+def content_fingerprint(source, chunk_size: int = 8 << 20) -> str:
+    """
+    Fingerprint theo nội dung cho mọi loại nguồn: đường dẫn được hash nội dung file
+    (đọc từng khối `chunk_size` byte), nên cùng một file dù tải lên hay đọc từ đường dẫn
+    nào cũng cho cùng giá trị (bằng `fingerprint_source` của file tải lên).
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        return fingerprint_source(source)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(b"bytes:")
+    with open(source, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint_rfm(rfm: pd.DataFrame, features=("Recency", "Frequency", "Monetary")) -> str:
+    """
+    Fingerprint nội dung bảng RFM (Customer ID + các cột đặc trưng, theo đúng thứ tự dòng).
+    """
+    cols = [c for c in ("Customer ID", *features) if c in rfm.columns]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(",".join(cols).encode())
+    h.update(pd.util.hash_pandas_object(rfm[cols], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _read_source_bytes(source) -> bytes:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        # UploadedFile của Streamlit và BytesIO đều có getvalue()
+        return source.getvalue()
+    pos = source.tell()
+    source.seek(0)
+    data = source.read()
+    source.seek(pos)
+    return data
+
+
+def _as_readable(source):
+    """
+    Chuẩn hoá nguồn để đọc lại được nhiều lần (file upload đã đọc sẽ ở cuối file).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    return io.BytesIO(_read_source_bytes(source))
+
+
+def _clean_flags(**clean_kwargs) -> tuple:
+    unknown = set(clean_kwargs) - set(_CLEAN_FLAG_DEFAULTS)
+    if unknown:
+        raise TypeError(f"Tham số làm sạch không hợp lệ: {sorted(unknown)}")
+    flags = {**_CLEAN_FLAG_DEFAULTS, **clean_kwargs}
+    if flags["columns"] is not None:
+        flags["columns"] = tuple(flags["columns"])
+    return tuple(sorted(flags.items()))
+
+
+@instrumented
+def load_raw_data_cached(
+    source,
+    cache: LRUCache | None = None,
+    fingerprint: str | None = None,
+    columnar_cache: bool = False,
+) -> pd.DataFrame:
+    """
+    `load_raw_data` có cache theo fingerprint của nguồn.
+    Lưu ý: DataFrame trả về được dùng chung, không sửa tại chỗ (in-place).
+    """
+    cache = _STAGE_CACHE if cache is None else cache
+    fingerprint = fingerprint or fingerprint_source(source)
+    return cache.get_or_compute(
+        ("raw", fingerprint, columnar_cache),
+        lambda: load_raw_data(_as_readable(source), columnar_cache=columnar_cache),
+    )
+
+
+@instrumented
+def clean_retail_data_cached(
+    source,
+    cache: LRUCache | None = None,
+    fingerprint: str | None = None,
+    columnar_cache: bool = False,
+    **clean_kwargs,
+) -> pd.DataFrame:
+    """
+    `load_raw_data` + `clean_retail_data` có cache theo fingerprint và các cờ làm sạch.
+    """
+    cache = _STAGE_CACHE if cache is None else cache
+    fingerprint = fingerprint or fingerprint_source(source)
+    flags = _clean_flags(**clean_kwargs)
+    return cache.get_or_compute(
+        ("clean", fingerprint, columnar_cache, flags),
+        lambda: clean_retail_data(
+            load_raw_data_cached(
+                source, cache=cache, fingerprint=fingerprint, columnar_cache=columnar_cache
+            ),
+            **dict(flags),
+        ),
+    )
+
+
+@instrumented
+def compute_rfm_cached(
+    source,
+    cache: LRUCache | None = None,
+    fingerprint: str | None = None,
+    columnar_cache: bool = False,
+    backend: str = "pandas",
+    **clean_kwargs,
+):
+    """
+    load → clean → `compute_rfm` có cache. Trả về (rfm, snapshot_date) như `compute_rfm`.
+    `backend` ("polars" / "duckdb", xem backends.compute_rfm_backend) tính RFM thẳng từ
+    file mà không tạo df_clean; chỉ dùng khi nguồn là đường dẫn và không bật compact/columns.
+    Kết quả giống nhau giữa các backend nên dùng chung một mục cache.
+    """
+    cache = _STAGE_CACHE if cache is None else cache
+    fingerprint = fingerprint or fingerprint_source(source)
+    flags = _clean_flags(**clean_kwargs)
+    flag_values = dict(flags)
+
+    def compute():
+        if (
+            backend != "pandas"
+            and isinstance(source, (str, os.PathLike))
+            and not flag_values["compact"]
+            and flag_values["columns"] is None
+        ):
+            from backends import compute_rfm_backend
+
+            rule_flags = {k: v for k, v in flag_values.items() if k not in ("compact", "columns")}
+            return compute_rfm_backend(source, backend=backend, columnar=columnar_cache, **rule_flags)
+        return compute_rfm(
+            clean_retail_data_cached(
+                source, cache=cache, fingerprint=fingerprint,
+                columnar_cache=columnar_cache, **flag_values,
+            )
+        )
+
+    return cache.get_or_compute(("rfm", fingerprint, columnar_cache, flags), compute)
+
+
+@instrumented
+def kmeans_sweep_cached(
+    source,
+    k_values=DEFAULT_K_RANGE,
+    random_state: int = 42,
+    engine: str = "kmeans",
+    model_store=None,
+    cache: LRUCache | None = None,
+    fingerprint: str | None = None,
+    columnar_cache: bool = False,
+    backend: str = "pandas",
+    **clean_kwargs,
+) -> dict:
+    """
+    RFM (có cache, tính bằng `backend`) → `scale_rfm` → `sweep_kmeans`, kết quả cũng được cache.
+    Trả về dict {"X_scaled", "scaler", "sweep"}.
+    Nếu truyền `model_store` (xem model_store.ModelStore), các K đã lưu trên đĩa được
+    nạp lại thay vì huấn luyện, các K còn thiếu được huấn luyện rồi lưu vào store.
+    """
+    cache = _STAGE_CACHE if cache is None else cache
+    fingerprint = fingerprint or fingerprint_source(source)
+    flags = _clean_flags(**clean_kwargs)
+    k_values = tuple(sorted(set(int(k) for k in k_values)))
+
+    def compute():
+        rfm, _ = compute_rfm_cached(
+            source, cache=cache, fingerprint=fingerprint,
+            columnar_cache=columnar_cache, backend=backend, **dict(flags),
+        )
+        X_scaled, scaler = scale_rfm(rfm)
+        if model_store is None:
+            sweep = sweep_kmeans(X_scaled, k_values=k_values, random_state=random_state, engine=engine)
+        else:
+            sweep = model_store.load_or_sweep(
+                rfm, X_scaled, scaler, k_values=k_values, random_state=random_state, engine=engine
+            )
+        return {"X_scaled": X_scaled, "scaler": scaler, "sweep": sweep}
+
+    return cache.get_or_compute(
+        ("kmeans_sweep", fingerprint, columnar_cache, flags, k_values, random_state, engine),
+        compute,
+    )
+
+
+# =========================
+# 5. Pipeline tiện dụng
+# =========================
+
+def run_rfm_kmeans_pipeline(
+    path_to_csv: str,
+    n_clusters: int = 4,
+    use_cache: bool = False,
+    columnar_cache: bool = False,
+    chunksize: int | None = None,
+    engine: str = "kmeans",
+    model_store=None,
+    profile: bool = False,
+    backend: str = "pandas",
+    partition_by: str | None = None,
+    n_jobs: int | None = None,
+):
+    """
+    Chạy full pipeline load → clean → RFM → chuẩn hoá → K-Means.
+    Trả về dict: df_raw, df_clean, rfm (có cột Cluster), snapshot_date, scaler, kmeans_model,
+    model_source và perf (số đo từng bước, xem `profiling.StageProfiler`; `profile=True`
+    bật thêm tracemalloc + cProfile).
+    RFM tính theo một trong các cách: mặc định (pandas, `use_cache` / `columnar_cache` tuỳ chọn),
+    `chunksize` (file lớn hơn RAM) hoặc `backend` "polars" / "duckdb"; hai cách sau trả về
+    df_raw, df_clean là None. `model_store` nạp / warm-start model đã lưu (xem model_store.ModelStore).
+    `partition_by` (vd. "Country"): phân cụm riêng từng phân vùng trên `n_jobs` tiến trình
+    (xem partitioned.segment_partitions), thêm "partitions", "partition_clusters", "partition_models".
+    Tổ hợp tuỳ chọn không dùng được cùng nhau gây ValueError (xem `_check_pipeline_options`).
+    """
+    _check_pipeline_options(use_cache, columnar_cache, chunksize, model_store, backend, partition_by)
+    profiler = StageProfiler(trace_memory=profile, profile_calls=profile)
+    with profile_stages(profiler), profiler.stage("run_rfm_kmeans_pipeline") as record:
+        result = _run_pipeline_stages(
+            path_to_csv, n_clusters=n_clusters, use_cache=use_cache, columnar_cache=columnar_cache,
+            chunksize=chunksize, engine=engine, model_store=model_store, backend=backend,
+            partition_by=partition_by, n_jobs=n_jobs,
+        )
+        record["rows_out"] = len(result["rfm"])
+    result["perf"] = profiler.records
+    return result
+
+    """
+    Khi chạy chỉ cần chạy đoạn sau:
+    
+    from utils import run_rfm_kmeans_pipeline
+
+    result = run_rfm_kmeans_pipeline("data/online_retail_II.csv", n_clusters=4)  
+
+    rfm = result["rfm"]   # có cột Cluster
+    result["perf"]        # số đo từng bước
+    """
+
+
+def _check_pipeline_options(use_cache, columnar_cache, chunksize, model_store, backend, partition_by) -> None:
+    """
+    Báo lỗi (ValueError) với các tổ hợp tuỳ chọn mà pipeline sẽ phải bỏ qua một trong hai.
+    """
+    if chunksize is not None and backend != "pandas":
+        raise ValueError("chunksize chỉ dùng với backend='pandas'")
+    if use_cache and (chunksize is not None or backend != "pandas"):
+        raise ValueError("use_cache chỉ dùng với backend='pandas' và không có chunksize")
+    if columnar_cache and chunksize is not None:
+        raise ValueError("columnar_cache không dùng cùng chunksize (compute_rfm_chunked đọc thẳng CSV)")
+    if partition_by is not None:
+        if chunksize is not None or backend != "pandas":
+            raise ValueError("partition_by cần df_clean đầy đủ: không dùng cùng chunksize hoặc backend khác pandas")
+        if model_store is not None:
+            raise ValueError("model_store không dùng cùng partition_by (mỗi phân vùng có model riêng)")
+
+
+def _run_pipeline_stages(
+    path_to_csv, *, n_clusters, use_cache, columnar_cache, chunksize, engine, model_store, backend,
+    partition_by=None, n_jobs=None,
+) -> dict:
+    if partition_by is not None:
+        return _run_partitioned_stages(
+            path_to_csv, n_clusters=n_clusters, use_cache=use_cache, columnar_cache=columnar_cache,
+            engine=engine, partition_by=partition_by, n_jobs=n_jobs,
+        )
+    if chunksize is not None:
+        df_raw = df_clean = None
+        rfm, snapshot_date = compute_rfm_chunked(path_to_csv, chunksize=chunksize)
+    elif backend != "pandas":
+        from backends import compute_rfm_backend
+
+        df_raw = df_clean = None
+        rfm, snapshot_date = compute_rfm_backend(path_to_csv, backend=backend, columnar=columnar_cache)
+    elif use_cache:
+        fingerprint = fingerprint_source(path_to_csv)
+        cache_opts = {"fingerprint": fingerprint, "columnar_cache": columnar_cache}
+        df_raw = load_raw_data_cached(path_to_csv, **cache_opts)
+        df_clean = clean_retail_data_cached(path_to_csv, **cache_opts)
+        rfm, snapshot_date = compute_rfm_cached(path_to_csv, **cache_opts)
+    else:
+        df_raw = load_raw_data(path_to_csv, columnar_cache=columnar_cache)
+        df_clean = clean_retail_data(df_raw)
+        rfm, snapshot_date = compute_rfm(df_clean)
+
+    if model_store is None:
+        X_scaled, scaler = scale_rfm(rfm)
+        kmeans_model = train_kmeans(X_scaled, n_clusters=n_clusters, engine=engine)
+        model_source = "fit"
+    else:
+        with stage("model_store.fit_or_load", rows_in=len(rfm)):
+            fitted = model_store.fit_or_load(rfm, n_clusters=n_clusters, engine=engine)
+        scaler, kmeans_model, model_source = fitted["scaler"], fitted["kmeans_model"], fitted["source"]
+
+    # Gán nhãn cụm vào RFM
+    rfm = rfm.copy()
+    rfm["Cluster"] = kmeans_model.labels_
+
+    return {
+        "df_raw": df_raw,
+        "df_clean": df_clean,
+        "rfm": rfm,
+        "snapshot_date": snapshot_date,
+        "scaler": scaler,
+        "kmeans_model": kmeans_model,
+        "model_source": model_source,
+    }
+
+
+def _run_partitioned_stages(
+    path_to_csv, *, n_clusters, use_cache, columnar_cache, engine, partition_by, n_jobs
+) -> dict:
+    from partitioned import segment_partitions
+
+    if use_cache:
+        cache_opts = {"fingerprint": fingerprint_source(path_to_csv), "columnar_cache": columnar_cache}
+        df_raw = load_raw_data_cached(path_to_csv, **cache_opts)
+        df_clean = clean_retail_data_cached(path_to_csv, **cache_opts)
+    else:
+        df_raw = load_raw_data(path_to_csv, columnar_cache=columnar_cache)
+        df_clean = clean_retail_data(df_raw)
+
+    segmented = segment_partitions(df_clean, key=partition_by, n_clusters=n_clusters, engine=engine, n_jobs=n_jobs)
+    return {
+        "df_raw": df_raw,
+        "df_clean": df_clean,
+        "rfm": segmented["rfm"],
+        "snapshot_date": segmented["snapshot_date"],
+        "scaler": None,
+        "kmeans_model": None,
+        "model_source": "fit",
+        "partitions": segmented["partitions"],
+        "partition_clusters": segmented["clusters"],
+        "partition_models": segmented["models"],
+    }